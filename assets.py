@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Static Asset Management
+
+Fingerprinted static URLs
+-------------------------
+
+`flask assets manifest` hashes every file under `static/` and writes a
+manifest mapping each path to a fingerprinted variant of it,
+
+    `themes/css/bootstrap.united.min.css`
+    -> `themes/css/bootstrap.united.min.3f2a9c1b7e4d.css`
+
+Once the manifest is loaded, `url_for('static', filename=...)` emits the
+fingerprinted path, and requests for fingerprinted paths are served with
+far-future `Cache-Control` headers. Paths absent from the manifest (or all
+paths, if no manifest has been built) are served as usual.
+
+Bundles
+-------
+
+`flask assets build` concatenates the stylesheets and scripts used by
+`header.html` and `footer.html` into `static/bundles/`,
+
+    * `<theme>.css` for every theme (theme stylesheet first),
+    * `app.js`, and `app.<theme>.js` for themes which ship a script,
+
+and then rebuilds the manifest. Templates use the bundles instead of the
+individual files when `ASSETS_BUNDLE` is enabled.
+
+Precompression and Offloading
+-----------------------------
+
+`flask assets compress` writes `.gz` (and, if the optional `brotli` package
+is installed, `.br`) siblings for compressible files under `static/`.
+The static route serves the smallest variant accepted by the client.
+
+A variant carries the modification time of its source, and is used only
+while the source has the same modification time; `flask assets manifest`
+and `flask assets build` remove variants of modified files.
+
+`flask assets benchmark` compares the worker CPU time spent serving the
+static files of a page, uncompressed, precompressed and offloaded.
+
+With `ASSETS_SENDFILE` set to `"x-sendfile"` (Apache, lighttpd) or
+`"x-accel-redirect"` (nginx), the chosen file is handed off to the front
+server instead of being streamed by the worker.
+
+FontAwesome
+-----------
+
+`flask assets fontawesome` builds a trimmed FontAwesome stylesheet and
+webfonts with only the icons used in `templates/` (see `fontawesome.py`),
+which are used instead of `fontawesome/css/all.css` when
+`FONTAWESOME_SUBSET` is enabled.
+"""
+
+###############################################################################
+
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import logging
+import mimetypes
+
+import click
+from flask import current_app, request, send_from_directory, abort
+from flask.cli import AppGroup, with_appcontext
+from werkzeug.security import safe_join
+
+from fontawesome import (
+    FONTAWESOME_CSS,
+    FONTAWESOME_SUBSET_CSS,
+    subset_fontawesome,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+ONE_YEAR = 365 * 24 * 60 * 60
+HASH_LENGTH = 12
+CHUNK_SIZE = 64 * 1024
+
+BUNDLE_DIR = "bundles"
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".json", ".map", ".svg", ".html", ".txt", ".xml",
+    ".eot", ".ttf", ".otf",
+}
+COMPRESSION_MIN_SIZE = 1024
+
+# Preference order of precompressed variants
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+ENCODING_SUFFIXES = tuple(suffix for _, suffix in ENCODINGS)
+
+# Placeholder for the theme stylesheet / script in bundle definitions
+THEME = None
+
+CSS_BUNDLE = [
+    THEME,
+    "custom/css/sticky-footer.css",
+    "plugins/css/bootstrap-select.min.css",
+    "plugins/css/animate.min.css",
+    FONTAWESOME_CSS,
+    "plugins/css/bootstrap4-toggle.min.css",
+    "plugins/bootstrap-table/bootstrap-table.min.css",
+    "plugins/bootstrap-table/extensions/sticky-header/"
+    "bootstrap-table-sticky-header.css",
+    "plugins/bootstrap-table/extensions/page-jump-to/"
+    "bootstrap-table-page-jump-to.css",
+]
+
+JS_BUNDLE = [
+    "js/jquery.js",
+    "js/popper.min.js",
+    "bootstrap/js/bootstrap.min.js",
+    THEME,
+    "plugins/js/bs-custom-file-input.min.js",
+    "plugins/js/bootstrap4-toggle.min.js",
+    "plugins/bootstrap-table/bootstrap-table.min.js",
+    "plugins/bootstrap-table/extensions/sticky-header/"
+    "bootstrap-table-sticky-header.min.js",
+    "plugins/bootstrap-table/extensions/key-events/"
+    "bootstrap-table-key-events.min.js",
+    "plugins/js/bootstrap-select.min.js",
+    "plugins/js/bootstrap-notify.min.js",
+]
+
+CSS_URL_PATTERN = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+CSS_IMPORT_PATTERN = re.compile(
+    r"@import\s+(?:url\([^)]*\)|\"[^\"]*\"|'[^']*')[^;]*;"
+)
+CSS_COMMENT_PATTERN = re.compile(r"/\*(?!!).*?\*/", re.DOTALL)
+CSS_SPACE_PATTERN = re.compile(r"\s+")
+CSS_PUNCTUATION_PATTERN = re.compile(r"\s*([{};])\s*")
+
+###############################################################################
+
+
+def file_digest(path):
+    """Compute hex digest of the contents of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(filename, digest):
+    """Insert a digest before the last extension of a filename"""
+    head, tail = os.path.split(filename)
+    stem, ext = os.path.splitext(tail)
+    hashed = f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+    return f"{head}/{hashed}" if head else hashed
+
+
+def iter_static_files(static_dir):
+    """Yield paths of all files under `static_dir`, relative to it"""
+    for root, dirs, files in os.walk(static_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(ENCODING_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, "/")
+
+
+def minified_variant(static_dir, filename):
+    """Prefer the `.min` variant of a file, if one exists alongside it"""
+    stem, ext = os.path.splitext(filename)
+    if stem.endswith(".min"):
+        return filename
+    minified = f"{stem}.min{ext}"
+    if os.path.isfile(os.path.join(static_dir, minified)):
+        return minified
+    return filename
+
+
+def rebase_css_urls(css, source, target_dir):
+    """Rewrite relative `url()` references of `source` for `target_dir`"""
+    source_dir = os.path.dirname(source)
+
+    def rebase(match):
+        quote, url = match.groups()
+        url = url.strip()
+        if url.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return match.group(0)
+        path, suffix = url, ""
+        query = re.search(r"[?#]", url)
+        if query:
+            path, suffix = url[: query.start()], url[query.start():]
+        path = os.path.normpath(os.path.join(source_dir, path))
+        path = os.path.relpath(path, target_dir).replace(os.sep, "/")
+        return f"url({quote}{path}{suffix}{quote})"
+
+    return CSS_URL_PATTERN.sub(rebase, css)
+
+
+def minify_css(css):
+    """Conservative CSS minifier (comments and redundant whitespace)"""
+    css = CSS_COMMENT_PATTERN.sub("", css)
+    css = CSS_SPACE_PATTERN.sub(" ", css)
+    css = CSS_PUNCTUATION_PATTERN.sub(r"\1", css)
+    return css.strip()
+
+
+def is_current(path, suffix):
+    """Whether the precompressed variant of a file matches the file"""
+    try:
+        source = os.stat(path)
+        variant = os.stat(path + suffix)
+    except FileNotFoundError:
+        return False
+    return variant.st_mtime_ns == source.st_mtime_ns
+
+
+def compress_file(path):
+    """Write precompressed siblings of a file, return suffixes written"""
+    source = os.stat(path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, mode=brotli.MODE_TEXT)
+
+    written = []
+    for suffix, compressed in variants.items():
+        if len(compressed) >= len(data):
+            remove_variant(path, suffix)
+            continue
+        with open(path + suffix, "wb") as f:
+            f.write(compressed)
+        # marks the variant as that of this version of the file
+        os.utime(path + suffix, ns=(source.st_atime_ns, source.st_mtime_ns))
+        written.append(suffix)
+    return written
+
+
+def remove_variant(path, suffix):
+    try:
+        os.remove(path + suffix)
+    except FileNotFoundError:
+        pass
+
+
+def compress_static_files(static_dir):
+    """Precompress compressible files under `static_dir` (unless current)"""
+    results = {}
+    for filename in iter_static_files(static_dir):
+        path = os.path.join(static_dir, filename)
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in COMPRESSIBLE_EXTENSIONS:
+            continue
+        if os.path.getsize(path) < COMPRESSION_MIN_SIZE:
+            continue
+        if all(
+            is_current(path, suffix)
+            for encoding, suffix in ENCODINGS
+            if encoding != "br" or brotli is not None
+        ):
+            continue
+        results[filename] = compress_file(path)
+    return results
+
+
+def remove_stale_variants(static_dir):
+    """Remove precompressed variants of modified (or removed) files"""
+    removed = []
+    for root, dirs, files in os.walk(static_dir):
+        for name in files:
+            if not name.endswith(ENCODING_SUFFIXES):
+                continue
+            stem, suffix = os.path.splitext(os.path.join(root, name))
+            if not is_current(stem, suffix):
+                os.remove(stem + suffix)
+                removed.append(
+                    os.path.relpath(stem + suffix, static_dir)
+                    .replace(os.sep, "/")
+                )
+    return removed
+
+
+def benchmark_static(app, filenames, repeat=20):
+    """Worker CPU time (ms) and bytes sent per load of `filenames`
+
+    Measured in-process through the test client, for the static files
+    served uncompressed, precompressed, and offloaded to the front server.
+    """
+    manifest = app.extensions["assets"]
+    modes = [
+        ("uncompressed", "identity", None),
+        ("precompressed", "br, gzip", None),
+        ("x-accel-redirect", "br, gzip", "x-accel-redirect"),
+    ]
+    client = app.test_client()
+    sendfile = manifest.sendfile
+    results = {}
+    try:
+        for name, accept_encoding, mode_sendfile in modes:
+            manifest.sendfile = mode_sendfile
+            sent = 0
+            start_time = time.process_time()
+            for _ in range(repeat):
+                for filename in filenames:
+                    response = client.get(
+                        f"{app.static_url_path}/{filename}",
+                        headers={"Accept-Encoding": accept_encoding},
+                    )
+                    sent += len(response.get_data())
+            duration = time.process_time() - start_time
+            results[name] = {
+                "cpu": duration * 1000 / repeat,
+                "bytes": sent / repeat,
+            }
+    finally:
+        manifest.sendfile = sendfile
+    return results
+
+
+###############################################################################
+
+
+class AssetBundles:
+    """Concatenated, minified per-theme stylesheets and scripts"""
+
+    def __init__(self, app=None, theme_registry=None):
+        self.enabled = False
+        self.fontawesome_css = FONTAWESOME_CSS
+        self.theme_registry = theme_registry
+        if app is not None:
+            self.init_app(app, theme_registry)
+
+    def init_app(self, app, theme_registry=None):
+        app.config.setdefault("ASSETS_BUNDLE", False)
+        app.config.setdefault("FONTAWESOME_SUBSET", False)
+        app.config.setdefault("FONTAWESOME_ICONS", [])
+        app.extensions["asset_bundles"] = self
+
+        self.enabled = app.config["ASSETS_BUNDLE"]
+        if app.config["FONTAWESOME_SUBSET"]:
+            self.fontawesome_css = FONTAWESOME_SUBSET_CSS
+        if theme_registry is not None:
+            self.theme_registry = theme_registry
+
+        if self.enabled and not os.path.isdir(
+            os.path.join(app.static_folder, BUNDLE_DIR)
+        ):
+            LOGGER.warning(
+                "ASSETS_BUNDLE is enabled, but no bundles have been built. "
+                "Build them using: flask assets build"
+            )
+
+    # ----------------------------------------------------------------------- #
+
+    def css(self, theme):
+        """Static path of the stylesheet for a theme"""
+        if not self.enabled:
+            return self.theme_registry.css(theme)
+        if theme not in self.theme_registry:
+            theme = "default"
+        return f"{BUNDLE_DIR}/{theme}.css"
+
+    def js(self, theme):
+        """Static path of the script bundle for a theme"""
+        if self.theme_registry.js(theme):
+            return f"{BUNDLE_DIR}/app.{theme}.js"
+        return f"{BUNDLE_DIR}/app.js"
+
+    # ----------------------------------------------------------------------- #
+
+    def bundle_css(self, static_dir, theme_css):
+        chunks = []
+        imports = []
+        for filename in CSS_BUNDLE:
+            if filename == FONTAWESOME_CSS:
+                filename = self.fontawesome_css
+            filename = minified_variant(static_dir, filename or theme_css)
+            path = os.path.join(static_dir, filename)
+            with open(path, encoding="utf-8") as f:
+                css = f.read()
+            css = rebase_css_urls(css, filename, BUNDLE_DIR)
+            imports.extend(CSS_IMPORT_PATTERN.findall(css))
+            chunks.append(minify_css(CSS_IMPORT_PATTERN.sub("", css)))
+        return "\n".join(imports + chunks) + "\n"
+
+    @staticmethod
+    def bundle_js(static_dir, theme_js=None):
+        chunks = []
+        for filename in JS_BUNDLE:
+            if filename is THEME:
+                if theme_js is None:
+                    continue
+                filename = theme_js
+            filename = minified_variant(static_dir, filename)
+            path = os.path.join(static_dir, filename)
+            with open(path, encoding="utf-8") as f:
+                chunks.append(f.read().strip())
+        return ";\n".join(chunks) + ";\n"
+
+    def page_files(self, static_dir, theme="default"):
+        """Static files of a page (without bundles), with the sutra index"""
+        filenames = []
+        for filename in CSS_BUNDLE:
+            if filename == FONTAWESOME_CSS:
+                filename = self.fontawesome_css
+            filenames.append(
+                minified_variant(
+                    static_dir, filename or self.theme_registry.css(theme)
+                )
+            )
+        for filename in JS_BUNDLE:
+            if filename is THEME:
+                filename = self.theme_registry.js(theme)
+                if not filename:
+                    continue
+            filenames.append(minified_variant(static_dir, filename))
+        return filenames + ["data/index.js"]
+
+    def build(self, static_dir):
+        """Write all bundles, return the list of bundle paths written"""
+        bundle_dir = os.path.join(static_dir, BUNDLE_DIR)
+        os.makedirs(bundle_dir, exist_ok=True)
+
+        bundles = {}
+        for theme in ["default"] + self.theme_registry.names:
+            bundles[f"{theme}.css"] = self.bundle_css(
+                static_dir, self.theme_registry.css(theme)
+            )
+        bundles["app.js"] = self.bundle_js(static_dir)
+        for theme in self.theme_registry.names_js:
+            theme_js = self.theme_registry.js(theme)
+            if theme_js:
+                bundles[f"app.{theme}.js"] = self.bundle_js(
+                    static_dir, theme_js
+                )
+
+        for name, content in bundles.items():
+            with open(
+                os.path.join(bundle_dir, name), "w", encoding="utf-8"
+            ) as f:
+                f.write(content)
+        return [f"{BUNDLE_DIR}/{name}" for name in bundles]
+
+
+###############################################################################
+
+
+class AssetManifest:
+    """Mapping of static paths to their fingerprinted variants"""
+
+    def __init__(self, app=None):
+        self.assets = {}
+        self.originals = {}
+        self.encodings = {}
+        self.manifest_file = None
+        self.sendfile = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ASSETS_MANIFEST_FILE", None)
+        app.config.setdefault("ASSETS_CACHE_MAX_AGE", ONE_YEAR)
+        app.config.setdefault("ASSETS_SENDFILE", None)
+        app.config.setdefault("ASSETS_ACCEL_REDIRECT_PREFIX", "/static/")
+        app.extensions["assets"] = self
+
+        self.manifest_file = app.config["ASSETS_MANIFEST_FILE"]
+        self.sendfile = app.config["ASSETS_SENDFILE"]
+        if self.sendfile not in [None, "x-sendfile", "x-accel-redirect"]:
+            raise ValueError(f"Invalid ASSETS_SENDFILE: {self.sendfile}")
+        if self.sendfile == "x-sendfile":
+            app.config["USE_X_SENDFILE"] = True
+        self.load()
+
+        app.url_defaults(self.inject_fingerprint)
+        app.view_functions["static"] = self.send_static_file
+        app.cli.add_command(assets_cli)
+
+    # ----------------------------------------------------------------------- #
+
+    def load(self, manifest_file=None):
+        manifest_file = manifest_file or self.manifest_file
+        assets = {}
+        if manifest_file and os.path.isfile(manifest_file):
+            with open(manifest_file, encoding="utf-8") as f:
+                assets = json.load(f)
+            LOGGER.info(f"Loaded {len(assets)} assets from {manifest_file}")
+        self.assets = assets
+        self.originals = {v: k for k, v in assets.items()}
+        self.encodings = {}
+        return assets
+
+    @staticmethod
+    def build(static_dir, manifest_file):
+        assets = {
+            filename: fingerprint(
+                filename, file_digest(os.path.join(static_dir, filename))
+            )
+            for filename in iter_static_files(static_dir)
+        }
+        manifest_dir = os.path.dirname(manifest_file)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        with open(manifest_file, "w", encoding="utf-8") as f:
+            json.dump(assets, f, indent=1, sort_keys=True)
+        return assets
+
+    # ----------------------------------------------------------------------- #
+
+    def url_path(self, filename):
+        return self.assets.get(filename, filename)
+
+    def resolve(self, filename):
+        """Return the original path of a fingerprinted path (or None)"""
+        return self.originals.get(filename)
+
+    def inject_fingerprint(self, endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = self.url_path(values["filename"])
+
+    def available_encodings(self, static_dir, filename):
+        """Current precompressed variants of a file
+
+        Cached per process, as long as the file is not modified.
+        """
+        path = safe_join(static_dir, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        if mtime is None:
+            return []
+
+        cached = self.encodings.get(filename)
+        if cached is None or cached[0] != mtime:
+            cached = (
+                mtime,
+                [
+                    (encoding, suffix)
+                    for encoding, suffix in ENCODINGS
+                    if is_current(path, suffix)
+                ],
+            )
+            self.encodings[filename] = cached
+        return cached[1]
+
+    def serve(self, filename):
+        """Serve a static file, precompressed and/or offloaded if possible"""
+        static_dir = current_app.static_folder
+        mimetype = (
+            mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        )
+
+        available = self.available_encodings(static_dir, filename)
+        content_encoding = None
+        served_filename = filename
+        for encoding, suffix in available:
+            if request.accept_encodings[encoding]:
+                content_encoding = encoding
+                served_filename = filename + suffix
+                break
+
+        if self.sendfile == "x-accel-redirect":
+            path = safe_join(static_dir, served_filename)
+            if path is None or not os.path.isfile(path):
+                abort(404)
+            prefix = current_app.config["ASSETS_ACCEL_REDIRECT_PREFIX"]
+            response = current_app.response_class(mimetype=mimetype)
+            response.headers["X-Accel-Redirect"] = (
+                prefix.rstrip("/") + "/" + served_filename
+            )
+        else:
+            response = send_from_directory(
+                static_dir,
+                served_filename,
+                mimetype=mimetype,
+                max_age=current_app.get_send_file_max_age(filename),
+            )
+
+        if content_encoding is not None:
+            response.headers["Content-Encoding"] = content_encoding
+        if available:
+            response.vary.add("Accept-Encoding")
+        return response
+
+    def send_static_file(self, filename):
+        original = self.resolve(filename)
+        if original is None:
+            return self.serve(filename)
+
+        response = self.serve(original)
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config[
+            "ASSETS_CACHE_MAX_AGE"
+        ]
+        response.cache_control.immutable = True
+        return response
+
+
+###############################################################################
+# Command Line Interface
+
+assets_cli = AppGroup("assets", help="Manage static assets.")
+
+
+@assets_cli.command("manifest")
+@with_appcontext
+def build_manifest():
+    """Fingerprint static files and write the asset manifest."""
+    manifest = current_app.extensions["assets"]
+    manifest_file = manifest.manifest_file
+    if not manifest_file:
+        raise click.UsageError("ASSETS_MANIFEST_FILE is not configured.")
+
+    assets = manifest.build(current_app.static_folder, manifest_file)
+    manifest.load()
+    click.echo(f"Fingerprinted {len(assets)} files into {manifest_file}")
+
+    removed = remove_stale_variants(current_app.static_folder)
+    if removed:
+        click.echo(f"Removed {len(removed)} outdated precompressed variants")
+
+
+@assets_cli.command("fontawesome")
+@click.option(
+    "--icon", "icons", multiple=True, help="Additional icon to include."
+)
+@with_appcontext
+def build_fontawesome(icons):
+    """Subset FontAwesome to the icons used in templates."""
+    icons = list(current_app.config["FONTAWESOME_ICONS"]) + list(icons)
+    try:
+        used = subset_fontawesome(
+            current_app.static_folder,
+            [os.path.join(current_app.root_path, current_app.template_folder)],
+            extra_icons=icons,
+        )
+    except (RuntimeError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Subset FontAwesome to {len(used)} icons: {', '.join(used)}")
+
+
+@assets_cli.command("compress")
+@with_appcontext
+def compress_assets():
+    """Write precompressed (.gz, .br) variants of static files."""
+    if brotli is None:
+        click.echo("'brotli' is not installed, skipping .br variants.")
+    results = compress_static_files(current_app.static_folder)
+    written = sum(len(suffixes) for suffixes in results.values())
+    click.echo(f"Wrote {written} precompressed variants")
+
+
+@assets_cli.command("benchmark")
+@click.option(
+    "--repeat", default=20, show_default=True, help="Page loads per mode."
+)
+@with_appcontext
+def benchmark_assets(repeat):
+    """Compare worker CPU time of serving the static files of a page."""
+    bundles = current_app.extensions["asset_bundles"]
+    filenames = bundles.page_files(current_app.static_folder)
+    click.echo(f"{len(filenames)} static files per page load")
+    results = benchmark_static(current_app, filenames, repeat=repeat)
+    click.echo(f"{'mode':<18} {'cpu ms/page':>12} {'KB/page':>10}")
+    for name, result in results.items():
+        click.echo(
+            f"{name:<18} {result['cpu']:>12.2f} "
+            f"{result['bytes'] / 1024:>10.1f}"
+        )
+
+
+@assets_cli.command("build")
+@click.option(
+    "--no-manifest", is_flag=True, help="Do not rebuild the asset manifest."
+)
+@click.option(
+    "--no-compress", is_flag=True, help="Do not precompress static files."
+)
+@click.pass_context
+@with_appcontext
+def build_assets(ctx, no_manifest, no_compress):
+    """Build CSS/JS bundles, precompressed variants and the manifest."""
+    bundles = current_app.extensions["asset_bundles"]
+    bundles.theme_registry.refresh()
+    written = bundles.build(current_app.static_folder)
+    click.echo(f"Built {len(written)} bundles")
+
+    if not no_compress:
+        ctx.invoke(compress_assets)
+    else:
+        removed = remove_stale_variants(current_app.static_folder)
+        if removed:
+            click.echo(
+                f"Removed {len(removed)} outdated precompressed variants"
+            )
+
+    manifest = current_app.extensions["assets"]
+    if manifest.manifest_file and not no_manifest:
+        ctx.invoke(build_manifest)
+
+
+###############################################################################
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite Profile
+
+Per-connection PRAGMAs for SQLite (e.g., WAL journal, `synchronous`,
+`mmap_size`, `cache_size`, `busy_timeout`), pooled connections, a
+background WAL checkpoint task and database statistics for the admin
+panel. Pooled connections are not shared with child processes forked
+after they were opened.
+
+```
+$ flask database stats
+$ flask database checkpoint
+$ flask database benchmark --processes 4 --duration 5
+```
+
+`benchmark` runs concurrent readers and writers (in separate processes)
+against a scratch database for each configured profile.
+"""
+
+###############################################################################
+
+import os
+import re
+import time
+import random
+import sqlite3
+import logging
+import tempfile
+import threading
+import multiprocessing
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+PRAGMA_NAME_PATTERN = re.compile(r"^[a-z_]+$")
+PRAGMA_VALUE_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# PRAGMAs reported in statistics
+STAT_PRAGMAS = [
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+    "busy_timeout",
+    "page_size",
+    "page_count",
+    "freelist_count",
+]
+
+CHECKPOINT_MODES = ["PASSIVE", "FULL", "RESTART", "TRUNCATE"]
+
+###############################################################################
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid PRAGMA '{name}'")
+        if not PRAGMA_VALUE_PATTERN.match(str(value)):
+            raise ValueError(f"Invalid value '{value}' for PRAGMA '{name}'")
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def engine_options(pragmas):
+    """Engine options for SQLite with a profile (reuse connections)"""
+    if not pragmas:
+        return {}
+    return {
+        "poolclass": QueuePool,
+        "connect_args": {"check_same_thread": False},
+    }
+
+
+###############################################################################
+
+
+class SQLiteProfile:
+    """Apply a PRAGMA profile to SQLite connections, checkpoint the WAL"""
+
+    def __init__(self, app=None, db=None, pragmas=None,
+                 checkpoint_interval=0, checkpoint_mode="TRUNCATE"):
+        self.pragmas = dict(pragmas or {})
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_mode = checkpoint_mode
+        self.last_checkpoint = None
+        self.enabled = False
+        self.app = None
+        self.db = None
+        self.engine = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        if self.checkpoint_mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Invalid checkpoint mode {self.checkpoint_mode}")
+
+        self.app = app
+        self.db = db
+        app.extensions["sqlite_profile"] = self
+        app.cli.add_command(database_cli)
+
+        with app.app_context():
+            engine = db.engine
+        self.engine = engine
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.after_fork)
+        if engine.dialect.name != "sqlite":
+            return
+
+        self.enabled = True
+        event.listen(engine, "connect", self.on_connect)
+        if self.checkpoint_interval:
+            app.before_request(self.start)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, self.pragmas)
+
+    def after_fork(self):
+        # connections opened before a fork (e.g., `gunicorn --preload`) are
+        # left to the parent, the child opens its own
+        self.engine.dispose(close=False)
+
+    # ----------------------------------------------------------------------- #
+
+    def start(self):
+        """Start the checkpoint thread (once per process)"""
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.run, name="sqlite-checkpoint", daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.checkpoint_interval)
+            try:
+                with self.app.app_context():
+                    self.checkpoint()
+            except Exception:
+                LOGGER.exception("WAL checkpoint failed.")
+
+    def checkpoint(self, mode=None):
+        """Run a WAL checkpoint, return (busy, log pages, checkpointed)"""
+        mode = mode or self.checkpoint_mode
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Invalid checkpoint mode {mode}")
+        with self.db.engine.connect() as connection:
+            result = connection.exec_driver_sql(
+                f"PRAGMA wal_checkpoint({mode})"
+            ).fetchone()
+        self.last_checkpoint = {
+            "time": time.time(),
+            "mode": mode,
+            "busy": bool(result[0]),
+            "log_pages": result[1],
+            "checkpointed_pages": result[2],
+        }
+        return tuple(result)
+
+    # ----------------------------------------------------------------------- #
+
+    def stats(self):
+        """Database file, WAL size and page statistics"""
+        engine = self.db.engine
+        path = engine.url.database
+        stats = {
+            "file": path,
+            "size": os.path.getsize(path) if os.path.exists(path) else 0,
+            "wal_size": (
+                os.path.getsize(f"{path}-wal")
+                if os.path.exists(f"{path}-wal") else 0
+            ),
+            "pool": engine.pool.status(),
+            "last_checkpoint": self.last_checkpoint,
+        }
+        with engine.connect() as connection:
+            for pragma in STAT_PRAGMAS:
+                stats[pragma] = connection.exec_driver_sql(
+                    f"PRAGMA {pragma}"
+                ).scalar()
+        return stats
+
+
+###############################################################################
+# Benchmark
+
+
+def _benchmark_worker(path, pragmas, duration, write_ratio, rows, seed):
+    random.seed(seed)
+    connection = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(connection, pragmas)
+
+    reads = writes = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start_time = time.perf_counter()
+        try:
+            if random.random() < write_ratio:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute(
+                    "UPDATE bench SET value = value + 1 WHERE id = ?",
+                    (random.randint(1, rows),),
+                )
+                connection.execute("COMMIT")
+                writes += 1
+            else:
+                connection.execute(
+                    "SELECT value FROM bench WHERE id = ?",
+                    (random.randint(1, rows),),
+                ).fetchone()
+                reads += 1
+        except sqlite3.OperationalError:
+            # "database is locked"
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            errors += 1
+        latencies.append(time.perf_counter() - start_time)
+
+    connection.close()
+    return reads, writes, errors, latencies
+
+
+def run_benchmark(pragmas, processes, duration, write_ratio, rows=10000):
+    """Concurrent read/write benchmark on a scratch database"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "benchmark.db")
+        connection = sqlite3.connect(path)
+        apply_pragmas(connection, pragmas)
+        connection.execute(
+            "CREATE TABLE bench (id INTEGER PRIMARY KEY, value INTEGER)"
+        )
+        connection.executemany(
+            "INSERT INTO bench (id, value) VALUES (?, 0)",
+            ((i,) for i in range(1, rows + 1)),
+        )
+        connection.commit()
+        connection.close()
+
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(
+                _benchmark_worker,
+                [
+                    (path, pragmas, duration, write_ratio, rows, seed)
+                    for seed in range(processes)
+                ],
+            )
+
+    reads = sum(result[0] for result in results)
+    writes = sum(result[1] for result in results)
+    errors = sum(result[2] for result in results)
+    latencies = sorted(
+        latency for result in results for latency in result[3]
+    )
+    return {
+        "reads": reads / duration,
+        "writes": writes / duration,
+        "errors": errors,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p99": (
+            latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+        ),
+    }
+
+
+###############################################################################
+# Command Line Interface
+
+database_cli = AppGroup("database", help="SQLite database maintenance.")
+
+
+def get_profile():
+    profile = current_app.extensions.get("sqlite_profile")
+    if profile is None or not profile.enabled:
+        raise click.ClickException("Not using an SQLite database.")
+    return profile
+
+
+@database_cli.command("stats")
+@with_appcontext
+def show_stats():
+    """Show database file, WAL and page statistics."""
+    for key, value in get_profile().stats().items():
+        click.echo(f"{key}: {value}")
+
+
+@database_cli.command("checkpoint")
+@click.option("--mode", type=click.Choice(CHECKPOINT_MODES))
+@with_appcontext
+def run_checkpoint(mode):
+    """Checkpoint the WAL into the database file."""
+    busy, log_pages, checkpointed = get_profile().checkpoint(mode)
+    click.echo(
+        f"busy: {bool(busy)}, WAL pages: {log_pages}, "
+        f"checkpointed: {checkpointed}"
+    )
+
+
+@database_cli.command("benchmark")
+@click.option("--processes", type=int, default=4, show_default=True)
+@click.option("--duration", type=float, default=5, show_default=True)
+@click.option(
+    "--write-ratio", type=float, default=0.1, show_default=True,
+    help="Fraction of operations which are writes.",
+)
+@click.option(
+    "--profile", "profiles", multiple=True,
+    help="Profile(s) to compare (default: all).",
+)
+@with_appcontext
+def benchmark(processes, duration, write_ratio, profiles):
+    """Compare SQLite profiles under concurrent reads and writes."""
+    all_profiles = current_app.config["SQLITE_PROFILES"]
+    profiles = profiles or list(all_profiles)
+    unknown = [name for name in profiles if name not in all_profiles]
+    if unknown:
+        raise click.ClickException(f"Unknown profiles: {', '.join(unknown)}")
+
+    click.echo(
+        f"{processes} processes, {duration:.0f}s, "
+        f"{write_ratio:.0%} writes"
+    )
+    click.echo(
+        f"{'profile':>12} {'reads/s':>10} {'writes/s':>10} "
+        f"{'locked':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}"
+    )
+    for name in profiles:
+        result = run_benchmark(
+            all_profiles[name], processes, duration, write_ratio
+        )
+        click.echo(
+            f"{name:>12} {result['reads']:>10.0f} {result['writes']:>10.0f} "
+            f"{result['errors']:>8} {result['p50']:>9.3f} "
+            f"{result['p99']:>9.3f}"
+        )
+
+
+###############################################################################
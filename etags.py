@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conditional GET for Rendered Pages
+
+Views decorated with `conditional()` are sent with a (weak) ETag, and
+requests carrying it in `If-None-Match` get a `304 Not Modified` without
+running the view (or rendering its template).
+
+```
+@webapp.route("/")
+@auth_required()
+@page_etags.conditional()
+def show_home():
+    ...
+```
+
+The ETag is derived from,
+
+* the version of the templates (and of `files`, e.g., the asset manifest),
+  rechecked at most every `check_interval` seconds
+* the application state registered through `state()` (e.g., themes)
+* the URL
+* the current user (id, username, email, `settings` and roles) and the
+  CSRF token of the session
+* values returned by the `key` functions of the view
+
+Pages with flashed messages (pending, or flashed by the view) are neither
+answered with 304 (rendering consumes the messages) nor stored by the
+browser. A view can also opt out of a request through `condition`.
+"""
+
+###############################################################################
+
+import os
+import json
+import time
+import hashlib
+import datetime
+import functools
+import threading
+
+from flask import current_app, g, make_response, request, session
+from flask import message_flashed
+from flask_security import current_user
+
+###############################################################################
+
+CACHE_CONTROL = "private, no-cache"
+
+###############################################################################
+
+
+class PageETags:
+    """ETags of rendered pages, and 304 responses to matching requests"""
+
+    def __init__(self, app=None, files=(), check_interval=5, enabled=True):
+        self.files = list(files)
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self.directories = []
+        self.state_functions = []
+        self.version = None
+        self._last_check = 0
+        self._lock = threading.Lock()
+        # views run, and 304 responses sent instead
+        self.rendered = 0
+        self.not_modified = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directories = list(getattr(app.jinja_loader, "searchpath", []))
+        app.extensions["page_etags"] = self
+        message_flashed.connect_via(app)(self.on_message_flashed)
+
+    def state(self, fn):
+        """Decorator registering a function returning application state"""
+        self.state_functions.append(fn)
+        return fn
+
+    # ----------------------------------------------------------------------- #
+
+    def _file_stats(self):
+        stats = []
+        for directory in self.directories:
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    stats.append(os.path.join(root, filename))
+        stats.extend(self.files)
+
+        result = []
+        for path in sorted(stats):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            result.append((path, stat.st_mtime_ns, stat.st_size))
+        return result
+
+    def check(self):
+        """Version of the templates and files (rescanned if due)"""
+        now = time.monotonic()
+        if (
+            self.version is not None
+            and now - self._last_check < self.check_interval
+        ):
+            return self.version
+        with self._lock:
+            if (
+                self.version is None
+                or now - self._last_check >= self.check_interval
+            ):
+                self.version = hashlib.sha256(
+                    repr(self._file_stats()).encode()
+                ).hexdigest()
+                self._last_check = now
+        return self.version
+
+    def on_message_flashed(self, sender, **extra):
+        g.page_etags_flashed = True
+
+    # ----------------------------------------------------------------------- #
+
+    def user_state(self):
+        if not current_user.is_authenticated:
+            return None
+        user = current_user._get_current_object()
+        identity = getattr(user, "identity", None)
+        if identity is not None:
+            roles = identity.roles
+        else:
+            roles = [role.name for role in user.roles]
+        return (
+            user.fs_uniquifier,
+            user.username,
+            user.email,
+            json.dumps(user.settings, sort_keys=True, default=str),
+            sorted(roles),
+        )
+
+    def etag(self, key_functions=()):
+        csrf_field = current_app.config.get("WTF_CSRF_FIELD_NAME")
+        parts = [
+            self.check(),
+            [fn() for fn in self.state_functions],
+            request.full_path,
+            self.user_state(),
+            session.get(csrf_field or "csrf_token"),
+            # copyright year in the footer
+            datetime.datetime.utcnow().year,
+            [fn() for fn in key_functions],
+        ]
+        return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+    def conditional(self, *key_functions, condition=None):
+        """Decorator: ETag and 304 responses for a view
+
+        `key_functions` return further values the page depends on;
+        `condition` returns False for requests to be answered normally.
+        """
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if (
+                    not self.enabled
+                    or request.method not in ["GET", "HEAD"]
+                    or (condition is not None and not condition())
+                ):
+                    return view(*args, **kwargs)
+
+                flashed = bool(session.get("_flashes"))
+                if request.if_none_match and not flashed:
+                    etag = self.etag(key_functions)
+                    if request.if_none_match.contains_weak(etag):
+                        self.not_modified += 1
+                        response = current_app.response_class(status=304)
+                        response.set_etag(etag, weak=True)
+                        response.headers["Cache-Control"] = CACHE_CONTROL
+                        return response
+
+                self.rendered += 1
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if flashed or g.get("page_etags_flashed"):
+                    # not to be shown again
+                    response.headers["Cache-Control"] = "no-store"
+                    return response
+                # after the view, which may have changed the session
+                response.set_etag(self.etag(key_functions), weak=True)
+                response.headers["Cache-Control"] = CACHE_CONTROL
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+###############################################################################
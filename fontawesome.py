@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FontAwesome Subsetting
+
+Scan templates for `fa-<icon>` classes and build a trimmed copy of
+`static/fontawesome/css/all.css` together with webfonts containing only
+the glyphs of those icons,
+
+    static/fontawesome/subset/css/all.css
+    static/fontawesome/subset/webfonts/fa-{brands,regular,solid}-*.woff[2]
+
+Subsetting requires `fonttools` (and `brotli` for WOFF2 output), which are
+needed only on the machine building the assets.
+"""
+
+###############################################################################
+
+import os
+import re
+import json
+
+###############################################################################
+
+FONTAWESOME_DIR = "fontawesome"
+SUBSET_DIR = "subset"
+
+FONTAWESOME_CSS = f"{FONTAWESOME_DIR}/css/all.css"
+FONTAWESOME_SUBSET_CSS = f"{FONTAWESOME_DIR}/{SUBSET_DIR}/css/all.css"
+
+WEBFONTS = {
+    "brands": "fa-brands-400",
+    "regular": "fa-regular-400",
+    "solid": "fa-solid-900",
+}
+
+ICON_CLASS_PATTERN = re.compile(r"\bfa-([a-z0-9]+(?:-[a-z0-9]+)*)")
+ICON_RULE_PATTERN = re.compile(
+    r"\.fa-([a-z0-9-]+):before \{\s*content: \"\\[0-9a-f]+\"; \}\n*"
+)
+FONT_SRC_PATTERN = re.compile(
+    r"(src: url\(\"\.\./webfonts/(fa-[a-z]+-[0-9]+)\.eot\"\);\s*)?"
+    r"src: url\(\"\.\./webfonts/(fa-[a-z]+-[0-9]+)\.eot\?#iefix\"\)[^;]*;"
+)
+
+TEMPLATE_EXTENSIONS = (".html", ".txt", ".js")
+
+###############################################################################
+
+
+def load_icons(static_dir):
+    """Load FontAwesome icon metadata (name -> unicode, styles)"""
+    path = os.path.join(
+        static_dir, FONTAWESOME_DIR, "metadata", "icons.json"
+    )
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scan_icons(directories, icons):
+    """Find names of icons referenced in files under `directories`"""
+    used = set()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if not name.endswith(TEMPLATE_EXTENSIONS):
+                    continue
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    content = f.read()
+                used.update(
+                    icon
+                    for icon in ICON_CLASS_PATTERN.findall(content)
+                    if icon in icons
+                )
+    return used
+
+
+def subset_css(css, used, formats):
+    """Drop unused icon rules and point @font-face to the subset fonts"""
+
+    def keep_icon(match):
+        return match.group(0) if match.group(1) in used else ""
+
+    def font_src(match):
+        font = match.group(3)
+        sources = [
+            f'url("../webfonts/{font}.{ext}") format("{fmt}")'
+            for ext, fmt in formats
+        ]
+        return "src: " + ", ".join(sources) + ";"
+
+    css = ICON_RULE_PATTERN.sub(keep_icon, css)
+    return FONT_SRC_PATTERN.sub(font_src, css)
+
+
+def subset_fontawesome(static_dir, scan_dirs, extra_icons=()):
+    """Build subset CSS and webfonts, return the names of icons kept"""
+    try:
+        from fontTools import subset
+    except ImportError:
+        raise RuntimeError(
+            "FontAwesome subsetting requires 'fonttools' "
+            "(pip install fonttools brotli)."
+        )
+
+    try:
+        import brotli  # noqa: F401
+        formats = [("woff2", "woff2"), ("woff", "woff")]
+    except ImportError:
+        formats = [("woff", "woff")]
+
+    icons = load_icons(static_dir)
+    unknown = [icon for icon in extra_icons if icon not in icons]
+    if unknown:
+        raise ValueError(f"Unknown FontAwesome icons: {', '.join(unknown)}")
+    used = scan_icons(scan_dirs, icons) | set(extra_icons)
+
+    source_dir = os.path.join(static_dir, FONTAWESOME_DIR)
+    target_dir = os.path.join(source_dir, SUBSET_DIR)
+    os.makedirs(os.path.join(target_dir, "css"), exist_ok=True)
+    os.makedirs(os.path.join(target_dir, "webfonts"), exist_ok=True)
+
+    for style, font in WEBFONTS.items():
+        unicodes = [
+            int(icons[icon]["unicode"], 16)
+            for icon in used
+            if style in icons[icon]["styles"]
+        ]
+        for extension, flavor in formats:
+            options = subset.Options()
+            options.flavor = flavor
+            options.layout_features = ["*"]
+            source = os.path.join(source_dir, "webfonts", f"{font}.ttf")
+            target = os.path.join(
+                target_dir, "webfonts", f"{font}.{extension}"
+            )
+
+            font_object = subset.load_font(source, options)
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=unicodes)
+            subsetter.subset(font_object)
+            subset.save_font(font_object, target, options)
+
+    source_css = os.path.join(static_dir, FONTAWESOME_CSS)
+    target_css = os.path.join(static_dir, FONTAWESOME_SUBSET_CSS)
+    with open(source_css, encoding="utf-8") as f:
+        css = f.read()
+    with open(target_css, "w", encoding="utf-8") as f:
+        f.write(subset_css(css, used, formats))
+
+    return sorted(used)
+
+
+###############################################################################
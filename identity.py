@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Identity Cache
+
+In-process cache of logged-in users' role names, highest role level and
+permission bitmask (see `roles.RoleHierarchy`), keyed by `fs_uniquifier`,
+with a TTL.
+
+The cache replaces the Flask-Security user loader and identity handler.
+On a miss, the user is loaded together with its roles in a single query;
+on a hit, only the user row is loaded and `has_role()`, `has_permission()`,
+`level` and `permissions_required` are answered from the cache, without
+loading `User.roles`.
+
+Entries are invalidated when a user changes through the datastore
+(`user_changed`), when the role hierarchy is rebuilt, on logout, and
+explicitly through `invalidate()`.
+"""
+
+###############################################################################
+
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask_login import user_logged_out
+from flask_principal import identity_loaded, RoleNeed, UserNeed
+from flask_security import current_user
+from flask_security.core import FsPermNeed, _on_identity_loaded
+from flask_security.utils import set_request_attr
+
+from models_sqla import user_changed, role_changed
+
+###############################################################################
+
+CachedIdentity = namedtuple(
+    "CachedIdentity",
+    [
+        "user_id",
+        "roles",
+        "level",
+        "permissions",
+        "permission_mask",
+        "hierarchy",
+        "expires",
+    ],
+)
+
+###############################################################################
+
+
+class IdentityCache:
+    """TTL cache of user roles and permissions"""
+
+    def __init__(self, app=None, datastore=None, role_registry=None,
+                 ttl=300, size=10000):
+        self.ttl = ttl
+        self.size = size
+        self.datastore = None
+        self.role_registry = None
+        self.entries = OrderedDict()
+        self.keys = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, datastore, role_registry)
+
+    def init_app(self, app, datastore, role_registry):
+        self.datastore = datastore
+        self.role_registry = role_registry
+        app.extensions["identity_cache"] = self
+
+        security = app.extensions["security"]
+        security.login_manager.user_loader(self.load_user)
+
+        identity_loaded.disconnect(_on_identity_loaded, sender=app)
+        identity_loaded.connect_via(app)(self.on_identity_loaded)
+        user_logged_out.connect_via(app)(self.on_logged_out)
+        user_changed.connect(self.on_user_changed, weak=False)
+        role_changed.connect(self.on_role_changed, weak=False)
+
+    # ----------------------------------------------------------------------- #
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+        if entry.hierarchy is not self.role_registry.hierarchy:
+            return None
+        return entry
+
+    def put(self, key, user):
+        hierarchy = self.role_registry.hierarchy
+        roles = frozenset(role.name for role in user.roles)
+        permission_mask = hierarchy.roles_permission_mask(roles)
+        entry = CachedIdentity(
+            user_id=user.id,
+            roles=roles,
+            level=hierarchy.level(roles),
+            permissions=frozenset(
+                permission
+                for permission, bit in hierarchy.permission_bits.items()
+                if permission_mask & bit
+            ),
+            permission_mask=permission_mask,
+            hierarchy=hierarchy,
+            expires=time.monotonic() + self.ttl,
+        )
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = entry
+            self.keys[entry.user_id] = key
+            while len(self.entries) > self.size:
+                self._remove(next(iter(self.entries)))
+        return entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.keys.get(entry.user_id) == key:
+            del self.keys[entry.user_id]
+
+    def invalidate(self, user_ids=None):
+        """Drop entries of users with `user_ids` (all entries, if None)"""
+        with self.lock:
+            if user_ids is None:
+                self.entries.clear()
+                self.keys.clear()
+                return
+            for user_id in user_ids:
+                key = self.keys.get(user_id)
+                if key is not None:
+                    self._remove(key)
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # ----------------------------------------------------------------------- #
+
+    def load_user(self, user_id):
+        """Flask-Login user loader (`user_id` is the `fs_uniquifier`)"""
+        user_model = self.datastore.user_model
+        key = str(user_id)
+        entry = self.get(key)
+
+        if entry is None:
+            query = self.datastore.query_with_roles()
+        else:
+            query = user_model.query
+        users = query.filter(user_model.fs_uniquifier == key).all()
+        user = users[0] if users else None
+        if user is None or not user.active:
+            return None
+
+        if entry is None:
+            entry = self.put(key, user)
+        user.identity = entry
+        set_request_attr("fs_authn_via", "session")
+        return user
+
+    def on_identity_loaded(self, sender, identity):
+        identity.user = current_user
+        if not hasattr(current_user, "fs_uniquifier"):
+            return
+
+        user = current_user._get_current_object()
+        identity.provides.add(UserNeed(user.fs_uniquifier))
+        cached = user.identity
+        if cached is None:
+            # user loaded by other means (e.g. auth token)
+            cached = self.put(user.fs_uniquifier, user)
+            user.identity = cached
+        for role in cached.roles:
+            identity.provides.add(RoleNeed(role))
+        for permission in cached.permissions:
+            identity.provides.add(FsPermNeed(permission))
+
+    def on_logged_out(self, sender, user=None, **extra):
+        if user is not None and getattr(user, "id", None) is not None:
+            self.invalidate([user.id])
+
+    def on_user_changed(self, sender, user=None, **extra):
+        self.invalidate([user.id])
+
+    def on_role_changed(self, sender, **extra):
+        self.invalidate()
+
+
+###############################################################################
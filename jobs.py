@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Background Jobs
+
+Slow actions (e.g., `git pull`, PythonAnywhere API calls) are run by a
+thread pool instead of the request thread. Jobs are recorded in the `job`
+table, so that any process can report their status and output.
+
+```
+job_id = job_runner.submit("application_update", user_id=current_user.id)
+```
+
+Job functions are registered by name, take the submitted keyword
+arguments, and return their output (text). A job which raises an exception
+fails, with the exception as its output.
+
+Jobs of a process which exits before they finish remain `queued` or
+`running`.
+"""
+
+###############################################################################
+
+import os
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models_sqla import Job
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+FINISHED = [SUCCEEDED, FAILED]
+
+###############################################################################
+
+
+class JobRunner:
+    """Run registered functions in a thread pool, track them in `job`"""
+
+    def __init__(self, app=None, db=None, workers=2, retention_days=30):
+        self.workers = workers
+        self.retention_days = retention_days
+        self.functions = {}
+        self.app = None
+        self.db = None
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        app.extensions["job_runner"] = self
+
+    def register(self, name):
+        """Decorator registering a job function as `name`"""
+
+        def decorator(fn):
+            self.functions[name] = fn
+            return fn
+
+        return decorator
+
+    # ----------------------------------------------------------------------- #
+
+    def get_executor(self):
+        """Thread pool of this process"""
+        if self.executor is not None and self.pid == os.getpid():
+            return self.executor
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="job"
+                )
+        return self.executor
+
+    def submit(self, name, user_id=None, **kwargs):
+        """Queue job `name`, return its id"""
+        if name not in self.functions:
+            raise ValueError(f"Unknown job '{name}'")
+
+        now = datetime.datetime.utcnow()
+        session = self.db.session
+        if self.retention_days:
+            session.query(Job).filter(
+                Job.created_at
+                < now - datetime.timedelta(days=self.retention_days)
+            ).delete(synchronize_session=False)
+        job = Job(name=name, status=QUEUED, user_id=user_id, created_at=now)
+        session.add(job)
+        session.commit()
+
+        self.get_executor().submit(self.run, job.id, name, kwargs)
+        return job.id
+
+    def run(self, job_id, name, kwargs):
+        with self.app.app_context():
+            self.update(
+                job_id,
+                status=RUNNING,
+                started_at=datetime.datetime.utcnow(),
+            )
+            try:
+                output = self.functions[name](**kwargs)
+                status = SUCCEEDED
+            except Exception as e:
+                LOGGER.exception("Job %s (%s) failed.", job_id, name)
+                output = f"{type(e).__name__}: {e}"
+                status = FAILED
+            self.update(
+                job_id,
+                status=status,
+                output=output,
+                finished_at=datetime.datetime.utcnow(),
+            )
+
+    def update(self, job_id, **values):
+        session = self.db.session
+        session.query(Job).filter(Job.id == job_id).update(
+            values, synchronize_session=False
+        )
+        session.commit()
+
+    # ----------------------------------------------------------------------- #
+
+    def get(self, job_id):
+        """Job `job_id` as a dict (None if there is no such job)"""
+        job = self.db.session.get(Job, job_id)
+        if job is None:
+            return None
+        return {
+            "id": job.id,
+            "name": job.name,
+            "status": job.status,
+            "finished": job.status in FINISHED,
+            "output": job.output,
+            **{
+                key: value.isoformat() if value else None
+                for key, value in [
+                    ("created_at", job.created_at),
+                    ("started_at", job.started_at),
+                    ("finished_at", job.finished_at),
+                ]
+            },
+        }
+
+
+###############################################################################
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Logging
+
+Log records are put on a queue by the logging thread (e.g., a request
+thread), and written by a single listener thread per process, so that a
+log call does not wait for file I/O.
+
+The log file is rotated by size (`max_bytes`) or by time (`when`, e.g.,
+"midnight"), keeping `backup_count` old files. Writes and rotation are
+serialised across processes (e.g., gunicorn workers) by a lock file, and
+a process reopens the log file if another process has rotated it.
+
+Records can be written as text, or as JSON lines with the request id
+(`X-Request-ID`), user id and time elapsed in the request.
+"""
+
+###############################################################################
+
+import os
+import re
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+###############################################################################
+
+ACCESS_LOGGER = logging.getLogger("access")
+
+TEXT_FORMAT = "[%(asctime)s] %(name)s %(levelname)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REQUEST_ID_PATTERN = re.compile(r"^[\w.-]{1,64}$")
+
+# Request fields added to records logged during a request
+CONTEXT_FIELDS = ["request_id", "user_id", "elapsed"]
+# Fields of access log records
+ACCESS_FIELDS = ["method", "path", "status", "duration"]
+
+###############################################################################
+
+
+class RequestContextFilter(logging.Filter):
+    """Add request id, user id and elapsed time (ms) to records"""
+
+    def filter(self, record):
+        if has_request_context():
+            # user loaded for the request, if any (does not load one)
+            user = g.get("_login_user")
+            start_time = g.get("request_start_time")
+            record.request_id = g.get("request_id")
+            record.user_id = getattr(user, "id", None)
+            record.elapsed = (
+                (time.perf_counter() - start_time) * 1000
+                if start_time is not None else None
+            )
+        else:
+            for field in CONTEXT_FIELDS:
+                setattr(record, field, None)
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as JSON lines"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS + ACCESS_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler keeping the exception apart from the message"""
+
+    def prepare(self, record):
+        # as QueueHandler.prepare (the record must be picklable and must
+        # not refer to objects which may change), without formatting
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+
+###############################################################################
+# Rotation across processes
+
+
+class InterProcessMixin:
+    """Serialise writes and rotation across processes with a lock file"""
+
+    def _open_lock(self):
+        self.lock_file = open(f"{self.baseFilename}.lock", "a")
+
+    @contextmanager
+    def interprocess_lock(self):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def reopen_if_rotated(self):
+        """Reopen the log file if it has been rotated by another process"""
+        if self.stream is None:
+            return
+        try:
+            path_stat = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            path_stat = None
+        stream_stat = os.fstat(self.stream.fileno())
+        if path_stat is None or (path_stat.st_dev, path_stat.st_ino) != (
+            stream_stat.st_dev, stream_stat.st_ino
+        ):
+            self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        with self.interprocess_lock():
+            self.reopen_if_rotated()
+            super().emit(record)
+
+    def close(self):
+        super().close()
+        self.lock_file.close()
+
+
+class RotatingFileHandler(
+    InterProcessMixin, logging.handlers.RotatingFileHandler
+):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._open_lock()
+
+
+class TimedRotatingFileHandler(
+    InterProcessMixin, logging.handlers.TimedRotatingFileHandler
+):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._open_lock()
+
+    def doRollover(self):
+        start_time = self.rolloverAt - self.interval
+        time_tuple = (
+            time.gmtime(start_time) if self.utc
+            else time.localtime(start_time)
+        )
+        rotated = self.rotation_filename(
+            f"{self.baseFilename}.{time.strftime(self.suffix, time_tuple)}"
+        )
+        if not os.path.exists(rotated):
+            super().doRollover()
+            return
+        # rotated by another process
+        if self.stream:
+            self.stream.close()
+        self.stream = self._open()
+        self.rolloverAt = self.computeRollover(int(time.time()))
+
+
+###############################################################################
+
+
+def configure_logging(log_file, level="INFO", json_format=False,
+                      max_bytes=10 * 1024 * 1024, backup_count=10,
+                      when=None):
+    """Log to `log_file` and stderr through a queue, return the listener"""
+    if when:
+        file_handler = TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+    handlers = [file_handler, logging.StreamHandler()]
+    formatter = (
+        JSONFormatter() if json_format
+        else logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+    )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = QueueHandler(queue.Queue(-1))
+    queue_handler.addFilter(RequestContextFilter())
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    def restart_listener():
+        # threads (and possibly held locks) do not survive a fork
+        queue_handler.queue = listener.queue = queue.Queue(-1)
+        listener._thread = None
+        listener.start()
+
+    listener.start()
+    atexit.register(listener.stop)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=restart_listener)
+    return listener
+
+
+###############################################################################
+
+
+class RequestLogging:
+    """Assign request ids, optionally log every request (access log)"""
+
+    def __init__(self, app=None, access_log=False):
+        self.access_log = access_log
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["request_logging"] = self
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def start_request(self):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.request_start_time = time.perf_counter()
+
+    def finish_request(self, response):
+        request_id = g.get("request_id")
+        if request_id is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+        if self.access_log:
+            duration = (time.perf_counter() - g.request_start_time) * 1000
+            ACCESS_LOGGER.info(
+                "%s %s %s %.2f ms",
+                request.method,
+                request.full_path if request.query_string else request.path,
+                response.status_code,
+                duration,
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration": duration,
+                },
+            )
+        return response
+
+
+###############################################################################
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics
+
+Request counts, latency and response size histograms per endpoint (and per
+`action` of the action endpoint), and connection pool statistics, served
+in the Prometheus text format.
+
+Each process counts in memory and adds its counts to a shared SQLite
+database every `interval` seconds (and before serving metrics, and at
+exit), so that the totals are those of all the processes of the
+application (e.g., several gunicorn workers). Pool gauges are reported per
+process (`pid` label); those of processes which have not reported for a
+while are dropped.
+
+Prometheus scrape configuration (with a user having the metrics
+permission),
+
+```
+scrape_configs:
+  - job_name: "webapp"
+    metrics_path: "/metrics"
+    basic_auth:
+      username: "..."
+      password: "..."
+```
+"""
+
+###############################################################################
+
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name: (type, help)
+METRICS = {
+    "http_requests_total": (
+        "counter", "Requests by endpoint, method and status."
+    ),
+    "http_request_duration_seconds": (
+        "histogram", "Request latency by endpoint."
+    ),
+    "http_response_size_bytes": (
+        "histogram", "Response body size by endpoint."
+    ),
+    "db_pool_checkouts_total": (
+        "counter", "Connections checked out from the pool."
+    ),
+    "db_pool_overflow_checkouts_total": (
+        "counter", "Checkouts while the pool was beyond its size."
+    ),
+    "db_pool_connections_total": (
+        "counter", "Database connections opened."
+    ),
+    "db_pool_size": ("gauge", "Pool size."),
+    "db_pool_checked_out": ("gauge", "Connections currently checked out."),
+    "db_pool_overflow": ("gauge", "Connections open beyond the pool size."),
+    "pythonanywhere_api_requests_total": (
+        "counter", "PythonAnywhere API calls by action and outcome."
+    ),
+    "pythonanywhere_api_duration_seconds": (
+        "histogram", "PythonAnywhere API call latency by action."
+    ),
+}
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS samples (
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (name, labels)
+    )""",
+    """CREATE TABLE IF NOT EXISTS gauges (
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        value REAL NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (name, labels)
+    )""",
+]
+
+###############################################################################
+
+
+def escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(labels):
+    """Prometheus label string (e.g., `endpoint="show_home",method="GET"`)"""
+    return ",".join(
+        f'{name}="{escape(value)}"' for name, value in labels.items()
+    )
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def metric_name(sample_name):
+    """Metric name of a sample (e.g., of a histogram's `_bucket` samples)"""
+    if sample_name in METRICS:
+        return sample_name
+    for suffix in ["_bucket", "_sum", "_count"]:
+        if sample_name.endswith(suffix):
+            return sample_name[:-len(suffix)]
+    return sample_name
+
+
+def sort_key(sample):
+    """Order samples by name and labels, histogram buckets by bound"""
+    name, labels, _ = sample
+    labels, _, bound = labels.partition('le="')
+    return (
+        metric_name(name),
+        labels.rstrip(","),
+        0 if bound else 1,
+        float(bound.rstrip('"')) if bound else 0,
+        name,
+    )
+
+
+###############################################################################
+
+
+class Metrics:
+    """Count requests and pool usage, aggregated across processes"""
+
+    def __init__(self, app=None, db=None, path=None, interval=5,
+                 exclude_endpoints=("static",)):
+        self.interval = interval
+        self.exclude_endpoints = set(exclude_endpoints)
+        self.stale_after = max(3 * interval, 60)
+        self.app = None
+        self.engine = None
+        self.path = None
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        if app is not None:
+            self.init_app(app, db, path)
+
+    def init_app(self, app, db, path):
+        self.app = app
+        self.path = path
+        app.extensions["metrics"] = self
+
+        with self.connect() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        connection.close()
+
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, "checkout", self.on_checkout)
+        event.listen(self.engine, "connect", self.on_connect)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        atexit.register(self.flush)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # ----------------------------------------------------------------------- #
+
+    def inc(self, name, labels, value=1):
+        key = (name, format_labels(labels))
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        """Add `value` to the histogram `name` (cumulative buckets)"""
+        label_string = format_labels(labels)
+        separator = "," if label_string else ""
+        with self.lock:
+            for bound in [*buckets, float("inf")]:
+                if value <= bound:
+                    key = (
+                        f"{name}_bucket",
+                        f'{label_string}{separator}'
+                        f'le="{format_bound(bound)}"',
+                    )
+                    self.samples[key] = self.samples.get(key, 0) + 1
+            for key, increment in [
+                ((f"{name}_sum", label_string), value),
+                ((f"{name}_count", label_string), 1),
+            ]:
+                self.samples[key] = self.samples.get(key, 0) + increment
+
+    def label(self, **labels):
+        """Add labels to the current request's latency and size metrics"""
+        if has_request_context():
+            g.metrics_labels = {**g.get("metrics_labels", {}), **labels}
+
+    # ----------------------------------------------------------------------- #
+
+    def start_request(self):
+        g.metrics_start_time = time.perf_counter()
+        self.start()
+
+    def finish_request(self, response):
+        start_time = g.get("metrics_start_time")
+        endpoint = request.endpoint or ""
+        if start_time is None or endpoint in self.exclude_endpoints:
+            return response
+
+        self.inc(
+            "http_requests_total",
+            {
+                "endpoint": endpoint,
+                "method": request.method,
+                "status": response.status_code,
+            },
+        )
+        labels = {"endpoint": endpoint, **g.get("metrics_labels", {})}
+        self.observe(
+            "http_request_duration_seconds",
+            labels,
+            time.perf_counter() - start_time,
+            LATENCY_BUCKETS,
+        )
+        if response.content_length is not None:
+            self.observe(
+                "http_response_size_bytes",
+                labels,
+                response.content_length,
+                SIZE_BUCKETS,
+            )
+        return response
+
+    def on_checkout(self, dbapi_connection, connection_record,
+                    connection_proxy):
+        self.inc("db_pool_checkouts_total", {})
+        overflow = getattr(self.engine.pool, "overflow", None)
+        if overflow is not None and overflow() > 0:
+            self.inc("db_pool_overflow_checkouts_total", {})
+
+    def on_connect(self, dbapi_connection, connection_record):
+        self.inc("db_pool_connections_total", {})
+
+    # ----------------------------------------------------------------------- #
+
+    def start(self):
+        """Start the flush thread (once per process)"""
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.run, name="metrics", daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("Failed to write metrics.")
+
+    def pool_gauges(self):
+        pool = self.engine.pool
+        if not hasattr(pool, "checkedout"):
+            return {}
+        return {
+            "db_pool_size": pool.size(),
+            "db_pool_checked_out": pool.checkedout(),
+            "db_pool_overflow": max(pool.overflow(), 0),
+        }
+
+    def flush(self):
+        """Add counts of this process to the shared totals"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.samples = self.samples, {}
+            labels = format_labels({"pid": os.getpid()})
+            now = time.time()
+            try:
+                with self.connect() as connection:
+                    connection.executemany(
+                        "INSERT INTO samples (name, labels, value) "
+                        "VALUES (?, ?, ?) "
+                        "ON CONFLICT (name, labels) "
+                        "DO UPDATE SET value = value + excluded.value",
+                        [
+                            (name, label_string, value)
+                            for (name, label_string), value in batch.items()
+                        ],
+                    )
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO gauges "
+                        "(name, labels, value, updated) VALUES (?, ?, ?, ?)",
+                        [
+                            (name, labels, value, now)
+                            for name, value in self.pool_gauges().items()
+                        ],
+                    )
+                connection.close()
+            except Exception:
+                # keep the counts for the next attempt
+                with self.lock:
+                    for key, value in batch.items():
+                        self.samples[key] = self.samples.get(key, 0) + value
+                raise
+
+    # ----------------------------------------------------------------------- #
+
+    def collect(self):
+        """(name, labels, value) of all samples, in exposition order"""
+        self.flush()
+        with self.connect() as connection:
+            connection.execute(
+                "DELETE FROM gauges WHERE updated < ?",
+                (time.time() - self.stale_after,),
+            )
+            samples = connection.execute(
+                "SELECT name, labels, value FROM samples "
+                "UNION ALL SELECT name, labels, value FROM gauges"
+            ).fetchall()
+        connection.close()
+        return sorted(samples, key=sort_key)
+
+    def render(self):
+        """Metrics in the Prometheus text format"""
+        lines = []
+        current = None
+        for name, labels, value in self.collect():
+            metric = metric_name(name)
+            if metric != current:
+                current = metric
+                metric_type, help_text = METRICS.get(
+                    metric, ("untyped", "")
+                )
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} {metric_type}")
+            value = int(value) if float(value).is_integer() else value
+            lines.append(
+                f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+###############################################################################
@@ -0,0 +1,62 @@
+"""roles_users indexes
+
+Remove duplicate (user_id, role_id) rows, then add a unique index on
+(user_id, role_id) and an index on role_id.
+
+Databases created by `db.create_all()` (before or after this revision)
+can be upgraded; existing indexes are left as they are.
+
+Revision ID: 5b1f0c7e2a91
+Revises:
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c7e2a91'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_roles_users_user_id_role_id', ['user_id', 'role_id'], True),
+    ('ix_roles_users_role_id', ['role_id'], False),
+]
+
+
+def get_indexes():
+    inspector = sa.inspect(op.get_bind())
+    if 'roles_users' not in inspector.get_table_names():
+        return None
+    return {index['name'] for index in inspector.get_indexes('roles_users')}
+
+
+def upgrade():
+    existing = get_indexes()
+    if existing is None:
+        # table is yet to be created (by db.create_all)
+        return
+
+    # keep the first of duplicate rows (derived table for MySQL)
+    op.execute(
+        'DELETE FROM roles_users WHERE id NOT IN ('
+        ' SELECT keep_id FROM ('
+        '  SELECT MIN(id) AS keep_id FROM roles_users'
+        '  GROUP BY user_id, role_id'
+        ' ) AS keep'
+        ')'
+    )
+
+    for name, columns, unique in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'roles_users', columns, unique=unique)
+
+
+def downgrade():
+    existing = get_indexes() or set()
+    for name, _, _ in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name='roles_users')
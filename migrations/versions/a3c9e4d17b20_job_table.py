@@ -0,0 +1,55 @@
+"""job table
+
+Background jobs (`jobs.JobRunner`).
+
+Databases created by `db.create_all()` after this revision already have
+the table.
+
+Revision ID: a3c9e4d17b20
+Revises: 5b1f0c7e2a91
+Create Date: 2026-10-17 22:31:07.540129
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e4d17b20'
+down_revision = '5b1f0c7e2a91'
+branch_labels = None
+depends_on = None
+
+
+def has_table():
+    return 'job' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if has_table():
+        return
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('output', sa.Text(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['user_id'], ['user.id'], ondelete='SET NULL'
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_job_status', 'job', ['status'])
+    op.create_index('ix_job_created_at', 'job', ['created_at'])
+
+
+def downgrade():
+    if not has_table():
+        return
+    op.drop_index('ix_job_created_at', table_name='job')
+    op.drop_index('ix_job_status', table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,48 @@
+"""server_session table
+
+Server-side sessions (`sessions.SQLAlchemySessionStore`).
+
+A database created by `db.create_all()` (`init_database`) after this
+revision already has the table, in which case there is nothing to do.
+
+Revision ID: c7d2f58e1b64
+Revises: a3c9e4d17b20
+Create Date: 2026-10-17 23:12:48.204617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2f58e1b64'
+down_revision = 'a3c9e4d17b20'
+branch_labels = None
+depends_on = None
+
+
+def has_table():
+    return 'server_session' in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    if has_table():
+        return
+    op.create_table(
+        'server_session',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.String(length=16), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_server_session_expires_at', 'server_session', ['expires_at']
+    )
+
+
+def downgrade():
+    if not has_table():
+        return
+    op.drop_index('ix_server_session_expires_at', table_name='server_session')
+    op.drop_table('server_session')
@@ -0,0 +1,44 @@
+"""role version
+
+Add `role.version`, incremented by SQLAlchemy on every update of a role,
+so that other processes notice changes of the role hierarchy
+(`roles.RoleRegistry`).
+
+Revision ID: e4b81a6f3d07
+Revises: c7d2f58e1b64
+Create Date: 2026-10-18 09:41:27.530916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b81a6f3d07'
+down_revision = 'c7d2f58e1b64'
+branch_labels = None
+depends_on = None
+
+
+def get_columns():
+    inspector = sa.inspect(op.get_bind())
+    if 'role' not in inspector.get_table_names():
+        return None
+    return {column['name'] for column in inspector.get_columns('role')}
+
+
+def upgrade():
+    columns = get_columns()
+    if columns is None or 'version' in columns:
+        # table is yet to be created (by db.create_all), or up to date
+        return
+    op.add_column(
+        'role',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+    )
+
+
+def downgrade():
+    if 'version' not in (get_columns() or set()):
+        return
+    op.drop_column('role', 'version')
@@ -9,18 +9,19 @@ Created on Sat Feb 06 19:55:04 2021
 ###############################################################################
 
 import sqlite3
-from sqlalchemy import (Column, Integer, String, Boolean, DateTime, JSON,
-                        ForeignKey, event)
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import (Column, Integer, String, Text, Boolean, DateTime,
+                        JSON, ForeignKey, Index, event)
+from sqlalchemy import or_
+from sqlalchemy.orm import relationship, backref, contains_eager
 from sqlalchemy.engine import Engine
 
 
+from flask.signals import Namespace
 from flask_sqlalchemy import SQLAlchemy
 from flask_security import UserMixin, RoleMixin, SQLAlchemyUserDatastore
 from flask_security import AsaList
 from sqlalchemy.ext.mutable import MutableList
 from flask_security.forms import LoginForm, StringField, Required
-from flask_security.utils import lookup_identity
 
 ###############################################################################
 # Foreign Key Support for SQLite3
@@ -40,6 +41,17 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
 
 db = SQLAlchemy()
 
+###############################################################################
+# Signals
+
+signals = Namespace()
+
+# Sent when a user's roles, status or identity change through the datastore
+user_changed = signals.signal("user-changed")
+
+# Sent when roles or their permissions change through the datastore
+role_changed = signals.signal("role-changed")
+
 ###############################################################################
 # User Database Models
 
@@ -55,6 +67,10 @@ class Role(db.Model, RoleMixin):
     description = Column(String(255))
     level = Column(Integer)
     permissions = Column(MutableList.as_mutable(AsaList()), nullable=True)
+    # incremented on every update (see `roles.RoleRegistry`)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
 
 class User(db.Model, UserMixin):
@@ -74,18 +90,179 @@ class User(db.Model, UserMixin):
     roles = relationship('Role', secondary='roles_users',
                          backref=backref('users', lazy='dynamic'))
 
+    # Cached identity (roles, level, permissions), set by IdentityCache
+    identity = None
+
+    @property
+    def level(self):
+        """Highest level among the user's roles"""
+        if self.identity is not None:
+            return self.identity.level
+        return max((role.level or 0 for role in self.roles), default=0)
+
+    def has_role(self, role):
+        if self.identity is not None and isinstance(role, str):
+            return role in self.identity.roles
+        return super().has_role(role)
+
+    def has_permission(self, permission):
+        return self.has_permissions(permission)
+
+    def has_permissions(self, *permissions):
+        """Returns `True` if the user has all of the `permissions`"""
+        if self.identity is not None:
+            required = self.identity.hierarchy.permission_mask(permissions)
+            return (
+                required is not None
+                and required & ~self.identity.permission_mask == 0
+            )
+        return all(
+            super(User, self).has_permission(permission)
+            for permission in permissions
+        )
+
 
 class RolesUsers(db.Model):
     __tablename__ = 'roles_users'
+    __table_args__ = (
+        # also serves lookups by user_id alone
+        Index('ix_roles_users_user_id_role_id', 'user_id', 'role_id',
+              unique=True),
+        Index('ix_roles_users_role_id', 'role_id'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column('user_id', Integer, ForeignKey('user.id'))
     role_id = Column('role_id', Integer, ForeignKey('role.id'))
 
 
+###############################################################################
+# Background Jobs
+
+
+class Job(db.Model):
+    id = Column(Integer, primary_key=True)
+    name = Column(String(64), nullable=False)
+    # queued, running, succeeded or failed
+    status = Column(String(16), nullable=False, index=True)
+    output = Column(Text)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'))
+    created_at = Column(DateTime, nullable=False, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+###############################################################################
+# Server-side Sessions
+
+
+class ServerSession(db.Model):
+    __tablename__ = 'server_session'
+    # SHA-256 of the session id (the cookie value is not stored)
+    id = Column(String(64), primary_key=True)
+    version = Column(String(16), nullable=False)
+    data = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
 ###############################################################################
 # Setup Flask-Security
 
-user_datastore = SQLAlchemyUserDatastore(db, User, Role)
+
+class UserDatastore(SQLAlchemyUserDatastore):
+    """Datastore which sends `user_changed` and `role_changed` signals"""
+
+    def query_with_roles(self):
+        """Query of users, with their roles loaded by the same statement
+
+        Roles are joined flat rather than through `joinedload`, whose nested
+        join of `roles_users` and `role` is scanned in full by SQLite, so
+        that `roles_users` is searched through its (user_id, role_id) index.
+        Use `.all()`, as a LIMIT would apply to the joined rows.
+        """
+        user_model = self.user_model
+        role_model = self.role_model
+        return (
+            user_model.query
+            .outerjoin(RolesUsers, RolesUsers.user_id == user_model.id)
+            .outerjoin(role_model, role_model.id == RolesUsers.role_id)
+            .options(contains_eager(user_model.roles))
+        )
+
+    def find_user_by_identity(self, identity):
+        """Find a user by username or email, with roles, in a single query
+
+        Emails are matched as given, with a lowercase domain, or entirely
+        lowercase.
+        """
+        identity = (identity or "").strip()
+        if not identity:
+            return None
+
+        conditions = [self.user_model.username == identity]
+        if "@" in identity:
+            local, _, domain = identity.rpartition("@")
+            emails = {identity, f"{local}@{domain.lower()}", identity.lower()}
+            conditions.append(self.user_model.email.in_(emails))
+        users = self.query_with_roles().filter(or_(*conditions)).all()
+        return users[0] if users else None
+
+    def add_role_to_user(self, user, role):
+        changed = super().add_role_to_user(user, role)
+        if changed:
+            user_changed.send(self, user=user)
+        return changed
+
+    def remove_role_from_user(self, user, role):
+        changed = super().remove_role_from_user(user, role)
+        if changed:
+            user_changed.send(self, user=user)
+        return changed
+
+    def toggle_active(self, user):
+        changed = super().toggle_active(user)
+        if changed:
+            user_changed.send(self, user=user)
+        return changed
+
+    def activate_user(self, user):
+        changed = super().activate_user(user)
+        if changed:
+            user_changed.send(self, user=user)
+        return changed
+
+    def deactivate_user(self, user):
+        changed = super().deactivate_user(user)
+        if changed:
+            user_changed.send(self, user=user)
+        return changed
+
+    def set_uniquifier(self, user, uniquifier=None):
+        user_changed.send(self, user=user)
+        super().set_uniquifier(user, uniquifier)
+
+    def delete_user(self, user):
+        user_changed.send(self, user=user)
+        super().delete_user(user)
+
+    def create_role(self, **kwargs):
+        role = super().create_role(**kwargs)
+        role_changed.send(self, role=role)
+        return role
+
+    def add_permissions_to_role(self, role, permissions):
+        changed = super().add_permissions_to_role(role, permissions)
+        if changed:
+            role_changed.send(self, role=role)
+        return changed
+
+    def remove_permissions_from_role(self, role, permissions):
+        changed = super().remove_permissions_from_role(role, permissions)
+        if changed:
+            role_changed.send(self, role=role)
+        return changed
+
+
+user_datastore = UserDatastore(db, User, Role)
 
 ###############################################################################
 
@@ -94,7 +271,7 @@ class CustomLoginForm(LoginForm):
     email = StringField('Username or Email', validators=[Required()])
 
     def validate(self, **kwargs) -> bool:
-        self.user = lookup_identity(self.email.data)
+        self.user = user_datastore.find_user_by_identity(self.email.data)
         if self.user is None:
             self.email.errors = ["Invalid username or email"]
             return False
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Password Hashing
+
+Hashing scheme and cost are set by `PASSWORD_HASH` and
+`PASSWORD_HASH_OPTIONS` in `settings.py`. The options are pinned in the
+passlib context (for `rounds`, also as `min_rounds` and `max_rounds`), so
+that Flask-Security rehashes a stored password that uses another scheme or
+cost on the next successful login of its user.
+
+```
+$ flask passwords calibrate --target-ms 250
+$ flask passwords calibrate --target-ms 250 --login
+$ flask passwords status
+```
+
+`calibrate` measures hash verification time of candidate costs on this host
+(p50/p99) and suggests the highest cost within the target latency. With
+`--login`, it measures whole `POST /login` requests instead (form
+validation, user lookup, verification and session), for a temporary user
+whose password is hashed with each candidate cost. `status` counts stored
+hashes which will be updated.
+"""
+
+###############################################################################
+
+import time
+import uuid
+import statistics
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from flask_security.proxies import _security
+from flask_security.utils import hash_password
+from passlib.registry import get_crypt_handler
+
+from models_sqla import db, user_datastore
+
+###############################################################################
+
+# Flask-Security default for PASSWORD_HASH_PASSLIB_OPTIONS
+DEFAULT_PASSLIB_OPTIONS = {"argon2__rounds": 10}
+
+SAMPLE_PASSWORD = "correct horse battery staple"
+LINEAR_FACTORS = [0.25, 0.5, 0.75, 1.0, 1.25, 1.5]
+
+###############################################################################
+
+
+def passlib_options(scheme, options):
+    """Passlib context options pinning `options` of `scheme`"""
+    passlib = dict(DEFAULT_PASSLIB_OPTIONS)
+    for key, value in (options or {}).items():
+        passlib[f"{scheme}__{key}"] = value
+        if key == "rounds":
+            passlib[f"{scheme}__min_rounds"] = value
+            passlib[f"{scheme}__max_rounds"] = value
+    return passlib
+
+
+def measure(scheme, samples, **options):
+    """Verification times (in ms) of a hash created with `options`"""
+    handler = get_crypt_handler(scheme).using(**options)
+    password_hash = handler.hash(SAMPLE_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        start_time = time.perf_counter()
+        handler.verify(SAMPLE_PASSWORD, password_hash)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return timings
+
+
+@contextmanager
+def pinned_context(scheme, options):
+    """Hash (and verify) passwords with `options` of `scheme` meanwhile"""
+    app = current_app._get_current_object()
+    security = app.extensions["security"]
+    pwd_context = security.pwd_context
+    config_hash = app.config.get("SECURITY_PASSWORD_HASH")
+    security.pwd_context = pwd_context.copy(
+        default=scheme, **passlib_options(scheme, options)
+    )
+    app.config["SECURITY_PASSWORD_HASH"] = scheme
+    try:
+        yield
+    finally:
+        security.pwd_context = pwd_context
+        app.config["SECURITY_PASSWORD_HASH"] = config_hash
+
+
+def login_time(app, form):
+    """Time (in ms) of `POST /login` with `form` by a new client"""
+    client = app.test_client()
+    start_time = time.perf_counter()
+    response = client.post("/login", data=form)
+    elapsed = (time.perf_counter() - start_time) * 1000
+    if response.status_code != 302:
+        raise click.ClickException(f"Login failed ({response.status_code}).")
+    return elapsed
+
+
+def measure_login(scheme, samples, **options):
+    """Times (in ms) of `POST /login` of a user with a hash of `options`"""
+    app = current_app._get_current_object()
+    username = f"calibrate{uuid.uuid4().hex[:12]}"
+    form = {"email": username, "password": SAMPLE_PASSWORD}
+    csrf_enabled = app.config.get("WTF_CSRF_ENABLED", True)
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    timings = []
+    with pinned_context(scheme, options):
+        user = user_datastore.create_user(
+            username=username,
+            email=f"{username}@example.org",
+            password=hash_password(SAMPLE_PASSWORD),
+        )
+        db.session.commit()
+        # Requests are made from another thread, outside of this application
+        # context (whose `g` would keep the user logged in)
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # the first request also warms up the application
+                for index in range(samples + 1):
+                    elapsed = executor.submit(login_time, app, form).result()
+                    if index:
+                        timings.append(elapsed)
+        finally:
+            app.config["WTF_CSRF_ENABLED"] = csrf_enabled
+            db.session.rollback()
+            user_datastore.delete_user(db.session.merge(user))
+            db.session.commit()
+    return timings
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, round(p / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def candidate_rounds(scheme, target_ms, samples, measure=measure):
+    """Yield (rounds, timings) for increasing rounds around `target_ms`"""
+    handler = get_crypt_handler(scheme)
+    min_rounds = handler.min_rounds or 1
+    max_rounds = handler.max_rounds
+
+    if getattr(handler, "rounds_cost", "linear") == "log2":
+        rounds = max(min_rounds, 4)
+        while rounds <= max_rounds:
+            timings = measure(scheme, samples, rounds=rounds)
+            yield rounds, timings
+            if statistics.median(timings) > target_ms:
+                break
+            rounds += 1
+        return
+
+    default_rounds = handler.default_rounds
+    base_ms = statistics.median(
+        measure(scheme, 3, rounds=default_rounds)
+    )
+    estimate = default_rounds * target_ms / max(base_ms, 0.001)
+    candidates = sorted({
+        min(max_rounds, max(min_rounds, int(estimate * factor)))
+        for factor in LINEAR_FACTORS
+    })
+    for rounds in candidates:
+        yield rounds, measure(scheme, samples, rounds=rounds)
+
+
+###############################################################################
+# Command Line Interface
+
+passwords_cli = AppGroup("passwords", help="Password hashing.")
+
+
+@passwords_cli.command("calibrate")
+@click.option(
+    "--target-ms", type=float, default=250, show_default=True,
+    help="Latency budget for a single password verification.",
+)
+@click.option("--scheme", help="Hashing scheme (default: PASSWORD_HASH).")
+@click.option("--samples", type=int, default=10, show_default=True)
+@click.option(
+    "--login", is_flag=True,
+    help="Time POST /login requests instead of password verification.",
+)
+@with_appcontext
+def calibrate(target_ms, scheme, samples, login):
+    """Choose the hashing cost for a target login latency."""
+    scheme = scheme or _security.password_hash
+    try:
+        get_crypt_handler(scheme).hash(SAMPLE_PASSWORD)
+    except Exception as e:
+        raise click.ClickException(f"Scheme '{scheme}' is unavailable: {e}")
+
+    if login:
+        if scheme not in _security.pwd_context.schemes():
+            raise click.ClickException(
+                f"Scheme '{scheme}' is not in SECURITY_PASSWORD_SCHEMES."
+            )
+        click.echo(f"{scheme}: POST /login time per setting")
+        timer = measure_login
+    else:
+        click.echo(f"{scheme}: verification time per setting")
+        timer = measure
+    click.echo(f"{'rounds':>12} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    chosen = None
+    candidates = candidate_rounds(scheme, target_ms, samples, measure=timer)
+    for rounds, timings in candidates:
+        p50 = percentile(timings, 50)
+        p99 = percentile(timings, 99)
+        click.echo(f"{rounds:>12} {p50:>10.1f} {p99:>10.1f}")
+        if p50 <= target_ms:
+            chosen = rounds
+
+    if chosen is None:
+        raise click.ClickException(
+            f"No setting of '{scheme}' is within {target_ms:.0f} ms."
+        )
+    click.echo()
+    click.echo("Suggested settings.py values:")
+    click.echo(f'PASSWORD_HASH = "{scheme}"')
+    click.echo(f'PASSWORD_HASH_OPTIONS = {{"rounds": {chosen}}}')
+
+
+@passwords_cli.command("status")
+@with_appcontext
+def status():
+    """Count stored hashes by scheme, and those to be updated on login."""
+    pwd_context = _security.pwd_context
+    user_model = user_datastore.user_model
+    query = (
+        db.session.query(user_model.password)
+        .execution_options(stream_results=True)
+        .yield_per(1000)
+    )
+
+    schemes = {}
+    outdated = 0
+    for (password_hash,) in query:
+        if not password_hash:
+            continue
+        try:
+            scheme = pwd_context.identify(password_hash)
+        except ValueError:
+            scheme = "unknown"
+        schemes[scheme] = schemes.get(scheme, 0) + 1
+        if scheme == "unknown" or pwd_context.needs_update(password_hash):
+            outdated += 1
+
+    for scheme, count in sorted(schemes.items()):
+        click.echo(f"{scheme}: {count}")
+    click.echo(f"To be rehashed on next login: {outdated}")
+
+
+###############################################################################
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request Profiler
+
+Profiles (cProfile) a random sample of requests, and requests of owners
+carrying the profiling header (e.g., `X-Profile: 1`), while enabled.
+
+Each profile is written to `directory` as a gzip-compressed pstats file
+(`<name>.prof.gz`) along with a summary (`<name>.json`: request, duration
+and top functions by own time). The oldest profiles are removed once the
+profiles take more than `max_size` bytes.
+
+```
+$ gunzip -k <name>.prof.gz
+$ python -m pstats <name>.prof
+```
+
+Whether profiling is enabled (and the sample rate) can be changed at
+runtime. The state is kept in `directory`, so that it applies to all the
+processes of the application (within `check_interval` seconds).
+"""
+
+###############################################################################
+
+import os
+import gzip
+import json
+import time
+import uuid
+import pstats
+import random
+import marshal
+import logging
+import cProfile
+import threading
+
+from flask import g, request
+from flask_security import current_user
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+STATE_FILE = "profiler.json"
+PROFILE_SUFFIX = ".prof.gz"
+SUMMARY_SUFFIX = ".json"
+
+# Functions listed in a profile summary
+TOP_FUNCTIONS = 10
+
+###############################################################################
+
+
+def function_name(function):
+    """Short name of a pstats function key (file, line, name)"""
+    filename, line, name = function
+    if filename == "~":
+        # built-in
+        return name
+    parts = filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{'/'.join(parts[-2:])}:{line}({name})"
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    """Functions with the highest own time, as (name, calls, own, total)"""
+    functions = sorted(
+        stats.stats.items(), key=lambda item: item[1][2], reverse=True
+    )
+    return [
+        (function_name(function), calls, own * 1000, total * 1000)
+        for function, (_, calls, own, total, _) in functions[:limit]
+    ]
+
+
+###############################################################################
+
+
+class RequestProfiler:
+    """Profile sampled requests, keep a size-bounded set of profiles"""
+
+    def __init__(self, app=None, directory=None, enabled=False,
+                 sample_rate=0.01, header="X-Profile",
+                 max_size=50 * 1024 * 1024, check_interval=5,
+                 exclude_endpoints=("static",)):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.header = header
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.exclude_endpoints = set(exclude_endpoints)
+        self.directory = None
+        self._last_check = 0
+        self._state_mtime = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, directory)
+
+    def init_app(self, app, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        app.extensions["profiler"] = self
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.teardown_request)
+
+    # ----------------------------------------------------------------------- #
+    # Runtime State
+
+    @property
+    def state_file(self):
+        return os.path.join(self.directory, STATE_FILE)
+
+    def check(self, force=False):
+        """Load the runtime state if it has been modified"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.state_file)
+        except OSError:
+            return
+        if mtime == self._state_mtime:
+            return
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            LOGGER.exception("Invalid profiler state.")
+            return
+        self._state_mtime = mtime
+        self.enabled = bool(state["enabled"])
+        self.sample_rate = float(state["sample_rate"])
+
+    def configure(self, enabled, sample_rate=None):
+        """Change (and save) whether profiling is enabled, the sample rate"""
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError(f"Invalid sample rate {sample_rate}")
+            self.sample_rate = sample_rate
+        self.enabled = enabled
+        path = f"{self.state_file}.{os.getpid()}"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"enabled": self.enabled, "sample_rate": self.sample_rate}, f
+            )
+        os.replace(path, self.state_file)
+        self._state_mtime = os.path.getmtime(self.state_file)
+
+    # ----------------------------------------------------------------------- #
+    # Request Hooks
+
+    def should_profile(self):
+        if request.endpoint in self.exclude_endpoints:
+            return False
+        if request.headers.get(self.header):
+            return current_user.has_role("owner")
+        return random.random() < self.sample_rate
+
+    def start_request(self):
+        self.check()
+        if not self.enabled or not self.should_profile():
+            return
+        g.profile = cProfile.Profile()
+        g.profile_start_time = time.perf_counter()
+        g.profile.enable()
+
+    def finish_request(self, response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        profile.disable()
+        duration = time.perf_counter() - g.profile_start_time
+        try:
+            self.save(profile, duration, response.status_code)
+        except Exception:
+            LOGGER.exception("Failed to save profile.")
+        return response
+
+    def teardown_request(self, exception=None):
+        # requests which raised an exception skip `finish_request`
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile.disable()
+
+    # ----------------------------------------------------------------------- #
+    # Profiles
+
+    def save(self, profile, duration, status):
+        stats = pstats.Stats(profile)
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-"
+            f"{uuid.uuid4().hex[:8]}"
+        )
+        summary = {
+            "name": name,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": status,
+            "duration": duration * 1000,
+            "top": top_functions(stats),
+        }
+        path = os.path.join(self.directory, name)
+        with gzip.open(f"{path}{PROFILE_SUFFIX}", "wb") as f:
+            marshal.dump(stats.stats, f)
+        with open(f"{path}{SUMMARY_SUFFIX}", "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        self.rotate()
+
+    def profile_names(self):
+        """Names of saved profiles, newest first"""
+        return sorted(
+            (
+                filename[:-len(PROFILE_SUFFIX)]
+                for filename in os.listdir(self.directory)
+                if filename.endswith(PROFILE_SUFFIX)
+            ),
+            reverse=True,
+        )
+
+    def rotate(self):
+        """Remove the oldest profiles beyond `max_size` bytes"""
+        with self.lock:
+            total_size = 0
+            for name in self.profile_names():
+                paths = [
+                    os.path.join(self.directory, f"{name}{suffix}")
+                    for suffix in [PROFILE_SUFFIX, SUMMARY_SUFFIX]
+                ]
+                try:
+                    size = sum(os.path.getsize(path) for path in paths)
+                except OSError:
+                    continue
+                total_size += size
+                if total_size > self.max_size:
+                    for path in paths:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+
+    def slowest(self, limit=10, recent=200):
+        """Summaries of the slowest among the `recent` profiles"""
+        summaries = []
+        for name in self.profile_names()[:recent]:
+            path = os.path.join(self.directory, f"{name}{SUMMARY_SUFFIX}")
+            try:
+                with open(path, encoding="utf-8") as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        summaries.sort(key=lambda summary: summary["duration"], reverse=True)
+        return summaries[:limit]
+
+    def __len__(self):
+        return len(self.profile_names())
+
+
+###############################################################################
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PythonAnywhere API Client
+
+A shared `requests.Session` (connections are kept alive and reused) with
+connect/read timeouts and retries with exponential backoff on connection
+errors, 429 responses and (for GET requests) 5xx responses. A reload (POST)
+with a 5xx response may have been carried out, and is not retried. Waits
+follow `Retry-After`, up to `max_wait` seconds. Responses of read-only
+actions (`info`) are cached for `cache_ttl` seconds; a reload clears the
+cache.
+
+Every call is logged with its latency, and counted (`counters`, and in
+the metrics, if given).
+
+https://help.pythonanywhere.com/pages/API
+"""
+
+###############################################################################
+
+import time
+import logging
+import threading
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+RETRY_METHODS = ["GET"]
+# Requests which were not carried out, retried whatever the method
+REJECTED_STATUSES = [429]
+
+# Actions whose responses may be cached
+CACHEABLE_ACTIONS = ["info"]
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+###############################################################################
+
+
+class PythonAnywhereError(RuntimeError):
+    def __init__(self, action, status_code, text):
+        super().__init__(f"API error {status_code} ({action})\n{text}")
+        self.action = action
+        self.status_code = status_code
+
+
+###############################################################################
+
+
+class ApiRetry(Retry):
+    """Retry rejected requests of any method, wait at most `max_wait`
+
+    (urllib3 1.26 has no `backoff_max` argument, hence `max_wait`)
+    """
+
+    def __init__(self, *args, max_wait=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_wait = max_wait
+
+    def new(self, **kwargs):
+        kwargs.setdefault("max_wait", self.max_wait)
+        return super().new(**kwargs)
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code in REJECTED_STATUSES:
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if self.max_wait is None:
+            return backoff
+        return min(backoff, self.max_wait)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None or self.max_wait is None:
+            return retry_after
+        return min(retry_after, self.max_wait)
+
+
+###############################################################################
+
+
+class PythonAnywhereClient:
+    """Pooled, retrying, caching client for the PythonAnywhere API"""
+
+    def __init__(self, api_url, headers, actions, connect_timeout=5,
+                 read_timeout=30, retries=3, backoff=0.5, max_wait=10,
+                 cache_ttl=60, pool_size=2, metrics=None):
+        self.api_url = api_url.rstrip("/")
+        self.actions = actions
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache_ttl = cache_ttl
+        self.metrics = metrics
+        self.counters = Counter()
+        self.cache = {}
+        self.lock = threading.Lock()
+
+        # Connection errors and retryable statuses are retried; a read
+        # timeout is not (the request may be in progress, e.g., a reload)
+        retry = ApiRetry(
+            total=retries,
+            read=False,
+            backoff_factor=backoff,
+            max_wait=max_wait,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, action):
+        return f"{self.api_url}/{self.actions[action].lstrip('/')}"
+
+    # ----------------------------------------------------------------------- #
+
+    def count(self, action, outcome, duration=None):
+        self.counters[outcome] += 1
+        if self.metrics is None:
+            return
+        labels = {"action": action, "outcome": outcome}
+        self.metrics.inc("pythonanywhere_api_requests_total", labels)
+        if duration is not None:
+            self.metrics.observe(
+                "pythonanywhere_api_duration_seconds",
+                {"action": action},
+                duration,
+                LATENCY_BUCKETS,
+            )
+
+    def request(self, method, action):
+        """Call `action`, return the response (raise unless it is 200)"""
+        start_time = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.url(action), timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            duration = time.perf_counter() - start_time
+            LOGGER.warning(
+                "%s %s failed after %.1f ms: %s",
+                method, action, duration * 1000, e,
+            )
+            self.count(action, "error", duration)
+            raise
+
+        duration = time.perf_counter() - start_time
+        retries = len(response.raw.retries.history) if (
+            response.raw is not None and response.raw.retries
+        ) else 0
+        LOGGER.info(
+            "%s %s: %s in %.1f ms (%d retries)",
+            method, action, response.status_code, duration * 1000, retries,
+        )
+        self.counters["retries"] += retries
+        if response.status_code != 200:
+            self.count(action, "error", duration)
+            raise PythonAnywhereError(
+                action, response.status_code, response.text
+            )
+        self.count(action, "success", duration)
+        return response
+
+    def get_json(self, action):
+        """Response of a read-only `action` (cached for `cache_ttl`)"""
+        cacheable = self.cache_ttl and action in CACHEABLE_ACTIONS
+        if cacheable:
+            with self.lock:
+                expires, data = self.cache.get(action, (0, None))
+            if time.monotonic() < expires:
+                self.count(action, "cached")
+                return data
+
+        data = self.request("GET", action).json()
+        if cacheable:
+            with self.lock:
+                self.cache[action] = (time.monotonic() + self.cache_ttl, data)
+        return data
+
+    def clear_cache(self):
+        with self.lock:
+            self.cache.clear()
+
+    # ----------------------------------------------------------------------- #
+
+    def info(self):
+        """Web app information"""
+        return self.get_json("info")
+
+    def reload(self):
+        """Reload the web app"""
+        self.request("POST", "reload")
+        self.clear_cache()
+
+
+###############################################################################
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query Statistics
+
+Per-request SQL instrumentation using the engine's cursor events: number of
+queries, total database time and the number of executions of each
+statement shape (the statement with whitespace collapsed and expanded
+parameter lists reduced to a single placeholder).
+
+A shape executed `repeat_threshold` or more times in a request is reported
+as a likely N+1 pattern (e.g., a lazy-loaded relationship accessed in a
+loop).
+
+Likely N+1 patterns are logged as warnings. The numbers of every request can
+also be exposed (each if enabled) as a `Server-Timing` response header,
+
+    Server-Timing: db;dur=3.21;desc="4 queries", app;dur=18.40
+
+in the log, and in a debug panel on the admin page listing recent requests
+of the process.
+"""
+
+###############################################################################
+
+import re
+import time
+import logging
+from collections import deque
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+PLACEHOLDER_LIST_PATTERN = re.compile(
+    rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)"
+)
+
+# Length of statements in log messages and request summaries
+MAX_SHAPE_LENGTH = 500
+
+###############################################################################
+
+
+def statement_shape(statement):
+    """Statement with whitespace and parameter lists normalised"""
+    shape = WHITESPACE_PATTERN.sub(" ", statement).strip()
+    return PLACEHOLDER_LIST_PATTERN.sub("(?)", shape)
+
+
+###############################################################################
+
+
+class RequestQueries:
+    """Queries executed during a request"""
+
+    __slots__ = ("count", "duration", "shapes", "start_time")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # shape -> [count, duration]
+        self.shapes = {}
+        self.start_time = time.perf_counter()
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        shape = self.shapes.setdefault(statement_shape(statement), [0, 0.0])
+        shape[0] += 1
+        shape[1] += duration
+
+    def repeated(self, threshold):
+        """(shape, count, duration) of shapes run `threshold`+ times"""
+        return sorted(
+            (
+                (shape, count, duration)
+                for shape, (count, duration) in self.shapes.items()
+                if count >= threshold
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+
+###############################################################################
+
+
+class QueryStats:
+    """Record per-request query statistics, flag repeated statements"""
+
+    def __init__(self, app=None, db=None, repeat_threshold=5,
+                 server_timing=False, log=False, debug_panel=False,
+                 history_size=50):
+        self.repeat_threshold = repeat_threshold
+        self.server_timing = server_timing
+        self.log = log
+        self.debug_panel = debug_panel
+        self.history = deque(maxlen=history_size)
+        self.app = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        app.extensions["query_stats"] = self
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    # ----------------------------------------------------------------------- #
+
+    def current(self):
+        """Queries of the current request (None outside requests)"""
+        if not has_request_context():
+            return None
+        if "request_queries" not in g:
+            g.request_queries = RequestQueries()
+        return g.request_queries
+
+    def start_request(self):
+        self.current()
+
+    def before_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        if context is not None and has_request_context():
+            context._query_start_time = time.perf_counter()
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        start_time = getattr(context, "_query_start_time", None)
+        if start_time is None:
+            return
+        queries = self.current()
+        if queries is not None:
+            queries.add(statement, time.perf_counter() - start_time)
+
+    # ----------------------------------------------------------------------- #
+
+    def summary(self, queries, response=None):
+        """Request summary, as shown in the debug panel"""
+        return {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code if response else None,
+            "count": queries.count,
+            "duration": queries.duration * 1000,
+            "repeated": [
+                (shape[:MAX_SHAPE_LENGTH], count, duration * 1000)
+                for shape, count, duration in queries.repeated(
+                    self.repeat_threshold
+                )
+            ],
+        }
+
+    def finish_request(self, response):
+        queries = self.current()
+        total_ms = (time.perf_counter() - queries.start_time) * 1000
+
+        if self.server_timing:
+            response.headers.add(
+                "Server-Timing",
+                f'db;dur={queries.duration * 1000:.2f};'
+                f'desc="{queries.count} queries", app;dur={total_ms:.2f}',
+            )
+
+        if not queries.count:
+            return response
+
+        summary = self.summary(queries, response)
+        self.history.append(summary)
+        if self.log:
+            LOGGER.info(
+                "%s %s (%s): %d queries, %.2f ms in database, %.2f ms total",
+                request.method,
+                request.path,
+                response.status_code,
+                queries.count,
+                summary["duration"],
+                total_ms,
+            )
+        for shape, count, duration in summary["repeated"]:
+            LOGGER.warning(
+                "%s: statement run %d times (%.2f ms), possible N+1: %s",
+                request.endpoint,
+                count,
+                duration,
+                shape,
+            )
+        return response
+
+
+###############################################################################
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Role Hierarchy
+
+Roles and their permissions, compiled into an immutable table: roles are
+ordered by level, each permission is assigned a bit, and each role holds
+the bitmask of its permissions, so that the permissions of a user are held
+in a single integer.
+
+Role and permission checks then reduce to bitwise operations,
+
+    hierarchy.permission_mask(["view_acp"]) & ~user_permission_mask == 0
+
+The `Role` table remains the source of truth. The compiled table is
+rebuilt from it (lazily, on next use) whenever a role changes through the
+datastore (`role_changed`), or when the version of the table has changed
+(checked at most every `ttl` seconds, for changes made by other
+processes).
+"""
+
+###############################################################################
+
+import time
+import threading
+from functools import wraps
+from types import MappingProxyType
+from collections import namedtuple
+
+from flask_security import current_user
+from flask_security.proxies import _security
+from sqlalchemy import func
+
+from models_sqla import role_changed
+
+###############################################################################
+
+RoleInfo = namedtuple("RoleInfo", ["name", "level", "permission_mask"])
+
+###############################################################################
+
+
+class RoleHierarchy:
+    """Immutable table of roles, levels and permission bitmasks"""
+
+    __slots__ = ("roles", "order", "permission_bits")
+
+    def __init__(self, role_definitions):
+        """`role_definitions` are dicts with name, level and permissions"""
+        definitions = sorted(
+            role_definitions,
+            key=lambda role: (role["level"] or 0, role["name"]),
+        )
+        permissions = sorted(
+            {
+                permission
+                for role in definitions
+                for permission in role.get("permissions") or []
+            }
+        )
+        permission_bits = {
+            permission: 1 << i for i, permission in enumerate(permissions)
+        }
+
+        roles = {}
+        for role in definitions:
+            mask = 0
+            for permission in role.get("permissions") or []:
+                mask |= permission_bits[permission]
+            roles[role["name"]] = RoleInfo(
+                role["name"], role["level"] or 0, mask
+            )
+
+        self.roles = MappingProxyType(roles)
+        self.order = tuple(role["name"] for role in definitions)
+        self.permission_bits = MappingProxyType(permission_bits)
+
+    @classmethod
+    def from_models(cls, roles):
+        return cls(
+            {
+                "name": role.name,
+                "level": role.level,
+                "permissions": role.get_permissions(),
+            }
+            for role in roles
+        )
+
+    # ----------------------------------------------------------------------- #
+
+    def permission_mask(self, permissions):
+        """Bitmask of `permissions` (None if any of them is unknown)"""
+        mask = 0
+        for permission in permissions:
+            bit = self.permission_bits.get(permission)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def roles_permission_mask(self, role_names):
+        mask = 0
+        for name in role_names:
+            role = self.roles.get(name)
+            if role is not None:
+                mask |= role.permission_mask
+        return mask
+
+    def level(self, role_names):
+        """Highest level among `role_names` (0 if none)"""
+        return max(
+            (self.roles[name].level for name in role_names
+             if name in self.roles),
+            default=0,
+        )
+
+    def roles_below(self, level):
+        """Names of roles with a level below `level`, lowest first"""
+        return [name for name in self.order if self.roles[name].level < level]
+
+    def __contains__(self, name):
+        return name in self.roles
+
+    def __len__(self):
+        return len(self.roles)
+
+
+###############################################################################
+
+
+class RoleRegistry:
+    """Holds the current `RoleHierarchy`, rebuilt when roles change
+
+    Changes made through the datastore of this process take effect on next
+    use (`role_changed`). The version of the `Role` table (number of roles,
+    and the sum of their `version` columns) is checked at most every `ttl`
+    seconds, so that changes made by other processes take effect as well.
+
+    Until there are roles in the database (e.g., before `init_database`),
+    the hierarchy of `role_definitions` is used, and the database is checked
+    again on next use.
+    """
+
+    def __init__(self, app=None, datastore=None, role_definitions=(),
+                 ttl=30):
+        self.ttl = ttl
+        self.datastore = None
+        self._hierarchy = RoleHierarchy(role_definitions)
+        self.version = None
+        self.stale = True
+        self.expires = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, datastore)
+
+    def init_app(self, app, datastore):
+        self.datastore = datastore
+        app.extensions["role_registry"] = self
+        role_changed.connect(self.on_role_changed, weak=False)
+
+    @property
+    def hierarchy(self):
+        """Current hierarchy (requires app context when due for a check)"""
+        if self.stale or self.expires <= time.monotonic():
+            self.check()
+        return self._hierarchy
+
+    def get_version(self):
+        role_model = self.datastore.role_model
+        return tuple(
+            role_model.query.with_entities(
+                func.count(role_model.id),
+                func.max(role_model.id),
+                func.sum(role_model.version),
+            ).one()
+        )
+
+    def check(self):
+        """Rebuild the hierarchy if the roles have changed"""
+        with self.lock:
+            stale = self.stale
+            self.stale = False
+            try:
+                version = self.get_version()
+                if stale or version != self.version:
+                    self.refresh(version)
+            except Exception:
+                self.stale = True
+                raise
+            self.expires = time.monotonic() + self.ttl
+        return self._hierarchy
+
+    def refresh(self, version):
+        roles = self.datastore.role_model.query.all()
+        if not roles:
+            # not cached, roles are yet to be created
+            self.stale = True
+            return self._hierarchy
+        self._hierarchy = RoleHierarchy.from_models(roles)
+        self.version = version
+        return self._hierarchy
+
+    def on_role_changed(self, sender, **extra):
+        self.stale = True
+
+
+###############################################################################
+
+
+def permissions_required(*permissions):
+    """Require all `permissions`, as `flask_security.permissions_required`
+
+    Checks the current user's cached permission bitmask.
+    """
+
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_view(*args, **kwargs):
+            has_permissions = getattr(current_user, "has_permissions", None)
+            if has_permissions is None or not has_permissions(*permissions):
+                return _security._unauthz_handler(
+                    permissions_required.__name__, list(permissions)
+                )
+            return fn(*args, **kwargs)
+
+        return decorated_view
+
+    return wrapper
+
+
+###############################################################################
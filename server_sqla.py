@@ -33,13 +33,10 @@ __copyright__ = "Copyright (C) 2020-2021 Hrishikesh Terdalkar"
 
 import os
 import re
-import glob
 import json
-import logging
 import datetime
 
 import git
-import requests
 from flask import (
     Flask,
     render_template,
@@ -48,33 +45,61 @@ from flask import (
     flash,
     session,
     Response,
+    jsonify,
+    abort,
+    url_for,
 )
 from flask_security import (
     Security,
     auth_required,
-    permissions_required,
     hash_password,
     current_user,
     user_registered,
     user_authenticated,
 )
 from flask_security.utils import uia_email_mapper
+from sqlalchemy import or_, func, case
+from sqlalchemy.exc import IntegrityError
 from flask_babelex import Babel
 from flask_wtf import CSRFProtect
 from flask_mail import Mail
 from flask_migrate import Migrate
 
-from models_sqla import db, user_datastore, CustomLoginForm
+from models_sqla import db, user_datastore, CustomLoginForm, RolesUsers
+from themes import ThemeRegistry
+from assets import AssetManifest, AssetBundles
+from sutras import SutraIndex, parse_sutra_id
+from users import users_cli
+from passwords import passwords_cli, passlib_options
+from transliteration import Transliterator, transliteration_cli
+from identity import IdentityCache
+from tracking import LoginTracker
+from database import SQLiteProfile, engine_options
+from querystats import QueryStats
+from metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiler import RequestProfiler
+from logs import configure_logging, RequestLogging
+from jobs import JobRunner
+from pythonanywhere import PythonAnywhereClient
+from etags import PageETags
+from sessions import (
+    ServerSessionInterface,
+    SQLAlchemySessionStore,
+    FileSystemSessionStore,
+)
+from roles import RoleRegistry, permissions_required
 from settings import app
 import constants
 
 ###############################################################################
 
-logging.basicConfig(
-    format="[%(asctime)s] %(name)s %(levelname)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    level=logging.INFO,
-    handlers=[logging.FileHandler(app.log_file), logging.StreamHandler()],
+log_listener = configure_logging(
+    app.log_file,
+    level=app.logging["level"],
+    json_format=app.logging["json"],
+    max_bytes=app.logging["max_bytes"],
+    backup_count=app.logging["backup_count"],
+    when=app.logging["when"],
 )
 
 ###############################################################################
@@ -102,6 +127,10 @@ webapp.url_map.strict_slashes = False
 
 webapp.config["SECRET_KEY"] = app.secret_key
 webapp.config["SECURITY_PASSWORD_SALT"] = app.security_password_salt
+webapp.config["SECURITY_PASSWORD_HASH"] = app.password_hash["scheme"]
+webapp.config["SECURITY_PASSWORD_HASH_PASSLIB_OPTIONS"] = passlib_options(
+    app.password_hash["scheme"], app.password_hash["options"]
+)
 webapp.config["JSON_AS_ASCII"] = False
 webapp.config["JSON_SORT_KEYS"] = False
 
@@ -111,10 +140,25 @@ webapp.config["SQLALCHEMY_DATABASE_URI"] = app.sqla["database_uri"]
 webapp.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
+if app.sqla["database_uri"].startswith("sqlite:"):
+    webapp.config["SQLALCHEMY_ENGINE_OPTIONS"].update(
+        engine_options(app.sqlite["pragmas"])
+    )
+webapp.config["SQLITE_PROFILES"] = app.sqlite["profiles"]
 
 # CSRF Token Expiry
 webapp.config["WTF_CSRF_TIME_LIMIT"] = None
 
+# Static Assets
+webapp.config["ASSETS_MANIFEST_FILE"] = app.asset_manifest_file
+webapp.config["ASSETS_BUNDLE"] = app.assets_bundle
+webapp.config["ASSETS_SENDFILE"] = app.assets_sendfile
+webapp.config["ASSETS_ACCEL_REDIRECT_PREFIX"] = (
+    app.assets_accel_redirect_prefix
+)
+webapp.config["FONTAWESOME_SUBSET"] = app.fontawesome_subset
+webapp.config["FONTAWESOME_ICONS"] = app.fontawesome_icons
+
 ###############################################################################
 # Flask-Security-Too Configuration
 
@@ -127,7 +171,7 @@ webapp.config["SECURITY_USER_IDENTITY_ATTRIBUTES"] = [
 
 webapp.config["SECURITY_RECOVERABLE"] = app.smtp_enabled
 webapp.config["SECURITY_CHANGEABLE"] = True
-webapp.config["SECURITY_TRACKABLE"] = True
+webapp.config["SECURITY_TRACKABLE"] = not app.login_tracking["write_behind"]
 webapp.config['SECURITY_USERNAME_ENABLE'] = True
 webapp.config['SECURITY_USERNAME_REQUIRED'] = True
 webapp.config["SECURITY_POST_LOGIN_VIEW"] = "show_home"
@@ -153,6 +197,13 @@ if app.smtp_enabled:
 # Initialize standard Flask extensions
 
 db.init_app(webapp)
+sqlite_profile = SQLiteProfile(
+    webapp,
+    db,
+    pragmas=app.sqlite["pragmas"],
+    checkpoint_interval=app.sqlite["checkpoint_interval"],
+    checkpoint_mode=app.sqlite["checkpoint_mode"],
+)
 
 csrf = CSRFProtect(webapp)
 security = Security(webapp, user_datastore, login_form=CustomLoginForm)
@@ -161,6 +212,166 @@ mail = Mail(webapp)
 migrate = Migrate(webapp, db)
 babel = Babel(webapp)
 
+webapp.cli.add_command(users_cli)
+webapp.cli.add_command(passwords_cli)
+webapp.cli.add_command(transliteration_cli)
+
+request_logging = RequestLogging(webapp, access_log=app.logging["access"])
+
+###############################################################################
+# Server-side Sessions
+
+if app.sessions["backend"] != "cookie":
+    if app.sessions["backend"] == "filesystem":
+        session_store = FileSystemSessionStore(app.sessions["directory"])
+    else:
+        session_store = SQLAlchemySessionStore(db)
+    server_sessions = ServerSessionInterface(
+        webapp,
+        session_store,
+        cache_size=app.sessions["cache_size"],
+        cache_ttl=app.sessions["cache_ttl"],
+        cleanup_interval=app.sessions["cleanup_interval"],
+        cleanup_batch=app.sessions["cleanup_batch"],
+        anonymous_lifetime=app.sessions["anonymous_lifetime"],
+    )
+
+###############################################################################
+# Query Statistics
+
+if app.query_stats["enabled"]:
+    query_stats = QueryStats(
+        webapp,
+        db,
+        repeat_threshold=app.query_stats["repeat_threshold"],
+        server_timing=app.query_stats["server_timing"],
+        log=app.query_stats["log"],
+        debug_panel=app.query_stats["debug_panel"],
+    )
+
+###############################################################################
+# Metrics
+
+if app.metrics["enabled"]:
+    metrics = Metrics(
+        webapp,
+        db,
+        app.metrics["database"],
+        interval=app.metrics["flush_interval"],
+    )
+
+###############################################################################
+# Profiler
+
+profiler = RequestProfiler(
+    webapp,
+    app.profiler["directory"],
+    enabled=app.profiler["enabled"],
+    sample_rate=app.profiler["sample_rate"],
+    header=app.profiler["header"],
+    max_size=app.profiler["max_size"],
+)
+
+###############################################################################
+# Background Jobs
+
+job_runner = JobRunner(
+    webapp,
+    db,
+    workers=app.jobs["workers"],
+    retention_days=app.jobs["retention_days"],
+)
+
+###############################################################################
+# PythonAnywhere API Client
+
+pa_client = PythonAnywhereClient(
+    app.pa_api_url,
+    app.pa_headers,
+    app.pa_api_actions,
+    connect_timeout=app.pa_api["connect_timeout"],
+    read_timeout=app.pa_api["read_timeout"],
+    retries=app.pa_api["retries"],
+    backoff=app.pa_api["backoff"],
+    max_wait=app.pa_api["max_wait"],
+    cache_ttl=app.pa_api["cache_ttl"],
+    pool_size=app.jobs["workers"],
+    metrics=metrics if app.metrics["enabled"] else None,
+)
+
+###############################################################################
+# Role Hierarchy and Identity Cache
+
+role_registry = RoleRegistry(
+    webapp,
+    user_datastore,
+    app.role_definitions,
+    ttl=app.role_hierarchy["ttl"],
+)
+identity_cache = IdentityCache(
+    webapp,
+    user_datastore,
+    role_registry,
+    ttl=app.identity_cache["ttl"],
+    size=app.identity_cache["size"],
+)
+
+###############################################################################
+# Login Tracking (write-behind)
+
+if app.login_tracking["write_behind"]:
+    login_tracker = LoginTracker(
+        webapp,
+        db,
+        user_datastore,
+        interval=app.login_tracking["flush_interval"],
+        max_pending=app.login_tracking["flush_size"],
+    )
+
+###############################################################################
+# Theme Registry
+
+theme_registry = ThemeRegistry(
+    os.path.join(app.dir, "static"),
+    check_interval=app.theme_check_interval,
+)
+
+###############################################################################
+# Static Assets
+
+asset_manifest = AssetManifest(webapp)
+asset_bundles = AssetBundles(webapp, theme_registry)
+
+###############################################################################
+# Conditional GET
+
+page_etags = PageETags(
+    webapp,
+    files=[app.asset_manifest_file],
+    check_interval=app.page_etags["check_interval"],
+    enabled=app.page_etags["enabled"],
+)
+
+
+@page_etags.state
+def page_state():
+    theme_registry.check()
+    return theme_registry.names, theme_registry.names_js, asset_bundles.enabled
+
+
+###############################################################################
+# Sutra Index
+
+sutra_index = SutraIndex(os.path.join(app.dir, "static", "data", "index.js"))
+
+###############################################################################
+# Transliteration
+
+transliterator = Transliterator(
+    os.path.join(app.dir, "static", "plugins", "js", "schemes"),
+    cache_size=app.transliteration["cache_size"],
+)
+
 ###############################################################################
 # Hooks
 
@@ -212,27 +423,17 @@ def _after_authentication_hook(sender, user, **extra):
 
 @webapp.context_processor
 def inject_global_constants():
-    theme_files = glob.glob(
-        os.path.join(app.dir, "static", "themes", "css", "bootstrap.*.min.css")
-    )
-    theme_js_files = glob.glob(
-        os.path.join(app.dir, "static", "themes", "js", "bootstrap.*.min.js")
-    )
-    themes = sorted(
-        [os.path.basename(theme).split(".")[1] for theme in theme_files]
-    )
-    themes_js = sorted(
-        [os.path.basename(theme).split(".")[1] for theme in theme_js_files]
-    )
-
+    theme_registry.check()
     return {
         "title": app.title,
         "author": app.author,
         "copyright_begin_year": app.year,
         "now": datetime.datetime.utcnow(),
         "constants": vars(constants),
-        "themes": themes,
-        "themes_js": themes_js,
+        "themes": theme_registry.names,
+        "themes_js": theme_registry.names_js,
+        "theme_registry": theme_registry,
+        "asset_bundles": asset_bundles,
         "config": app.config,
     }
 
@@ -241,25 +442,46 @@ def inject_global_constants():
 # Views
 
 
+def admin_page_cacheable():
+    """Admin page without live statistics or a pending action result"""
+    return not (
+        current_user.has_role("owner")
+        or (app.query_stats["enabled"] and query_stats.debug_panel)
+        or "admin_result" in session
+    )
+
+
 @webapp.route("/admin")
 @permissions_required("view_acp")
 @auth_required()
+@page_etags.conditional(
+    lambda: role_registry.hierarchy.roles_below(current_user.level),
+    condition=admin_page_cacheable,
+)
 def show_admin():
     data = {}
     data["title"] = "Admin"
 
-    user_level = max([role.level for role in current_user.roles])
-    user_model = user_datastore.user_model
-    role_model = user_datastore.role_model
-    user_query = user_model.query
-    role_query = role_model.query
-
-    data["users"] = [user.username for user in user_query.all()]
-    data["roles"] = [
-        role.name
-        for role in role_query.order_by(role_model.level).all()
-        if role.level < user_level
-    ]
+    data["roles"] = role_registry.hierarchy.roles_below(current_user.level)
+    if current_user.has_role("owner"):
+        if sqlite_profile.enabled:
+            data["database"] = sqlite_profile.stats()
+        profiler.check()
+        data["profiler"] = {
+            "enabled": profiler.enabled,
+            "sample_rate": profiler.sample_rate,
+            "header": profiler.header,
+            "count": len(profiler),
+            "slowest": profiler.slowest(),
+        }
+    if app.query_stats["enabled"] and query_stats.debug_panel:
+        data["queries"] = {
+            "current": query_stats.summary(query_stats.current()),
+            "recent": list(reversed(query_stats.history)),
+            "repeat_threshold": query_stats.repeat_threshold,
+        }
+
+    data["job"] = request.args.get("job", type=int)
 
     admin_result = session.get("admin_result", None)
     if admin_result:
@@ -268,9 +490,64 @@ def show_admin():
     return render_template("admin.html", data=data)
 
 
+@webapp.route("/metrics")
+@auth_required("token", "session", "basic")
+@permissions_required(app.metrics["permission"])
+def show_metrics():
+    if not app.metrics["enabled"]:
+        abort(404)
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@webapp.route("/api/jobs/<int:job_id>")
+@auth_required()
+def api_job(job_id):
+    if not current_user.has_role("owner"):
+        abort(403)
+    job = job_runner.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+
+@webapp.route("/api/users")
+@permissions_required("view_acp")
+@auth_required()
+def api_user_search():
+    """Search users by username/email prefix with keyset pagination"""
+    query = request.args.get("q", "").strip()
+    after = request.args.get("after", "")
+    limit = request.args.get("limit", app.user_search_limit, type=int)
+    limit = max(1, min(limit, app.user_search_limit))
+
+    user_model = user_datastore.user_model
+    user_query = db.session.query(user_model.username, user_model.email)
+    if query:
+        pattern = re.sub(r"([\\%_])", r"\\\1", query) + "%"
+        user_query = user_query.filter(
+            or_(
+                user_model.username.like(pattern, escape="\\"),
+                user_model.email.like(pattern, escape="\\"),
+            )
+        )
+    if after:
+        user_query = user_query.filter(user_model.username > after)
+
+    rows = user_query.order_by(user_model.username).limit(limit + 1).all()
+    users = [
+        {"username": username, "email": email}
+        for username, email in rows[:limit]
+    ]
+    return jsonify({
+        "users": users,
+        "next": users[-1]["username"] if len(rows) > limit else None,
+    })
+
+
 @webapp.route("/settings")
 @permissions_required("view_ucp")
 @auth_required()
+@page_etags.conditional()
 def show_settings():
     data = {}
     data["title"] = "Settings"
@@ -279,12 +556,219 @@ def show_settings():
 
 @webapp.route("/")
 @auth_required()
+@page_etags.conditional()
 def show_home():
     data = {}
     data["title"] = "Home"
     return render_template("home.html", data=data)
 
 
+###############################################################################
+# Sutra API
+
+
+@webapp.route("/api/sutras/search")
+def api_sutra_search():
+    query = request.args.get("q", "")
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 20, type=int)
+    prefix = request.args.get("prefix", "0") not in ["0", "false", ""]
+    return jsonify(
+        sutra_index.search(query, page=page, per_page=per_page, prefix=prefix)
+    )
+
+
+@webapp.route("/api/sutras/<sutra_id>")
+def api_sutra(sutra_id):
+    sutra_id = parse_sutra_id(sutra_id)
+    text = sutra_index.get(sutra_id)
+    if text is None:
+        abort(404)
+    return jsonify({"id": sutra_id, "text": text})
+
+
+@webapp.route("/api/sutras/chapter/<int:chapter>")
+def api_sutra_chapter(chapter):
+    sutras = sutra_index.chapter(chapter)
+    if not sutras:
+        abort(404)
+    response = jsonify(sutras)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.sutra_cache_max_age
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+###############################################################################
+# Transliteration API
+
+
+@webapp.route("/api/transliterate/schemes")
+def api_transliteration_schemes():
+    return jsonify({
+        "schemes": transliterator.scheme_names,
+        "roman": sorted(transliterator.roman_schemes),
+    })
+
+
+@webapp.route("/api/transliterate", methods=["POST"])
+@auth_required()
+def api_transliterate():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Request body must be a JSON object."}), 400
+    texts = payload.get("texts")
+    from_scheme = payload.get("from")
+    to_scheme = payload.get("to")
+    options = payload.get("options", {})
+
+    if not isinstance(options, dict):
+        return jsonify({"error": "'options' must be an object."}), 400
+    if not isinstance(texts, list) or not all(
+        isinstance(text, str) for text in texts
+    ):
+        return jsonify({"error": "'texts' must be a list of strings."}), 400
+    if len(texts) > app.transliteration["max_batch_size"]:
+        return jsonify({"error": "Too many texts in one request."}), 400
+    for scheme in [from_scheme, to_scheme]:
+        if scheme not in transliterator.schemes:
+            return jsonify({"error": f"Unknown scheme '{scheme}'."}), 400
+
+    result = transliterator.transliterate_batch(
+        texts,
+        from_scheme,
+        to_scheme,
+        skip_sgml=bool(options.get("skip_sgml", False)),
+        syncope=bool(options.get("syncope", False)),
+    )
+    return jsonify({"from": from_scheme, "to": to_scheme, "texts": result})
+
+
+###############################################################################
+# Bulk Role Management
+
+BULK_CHUNK_SIZE = 500
+
+
+def chunked(items, size=BULK_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def parse_usernames(text):
+    """Usernames from text with one user per line (or CSV first column)"""
+    usernames = []
+    for line in text.splitlines():
+        if "," in line:
+            candidates = line.split(",")[:1]
+        else:
+            candidates = line.split()
+        for username in candidates:
+            username = username.strip().strip('"')
+            if username and username.lower() != "username":
+                usernames.append(username)
+    return list(dict.fromkeys(usernames))
+
+
+def bulk_update_roles(usernames, role, add=True, retry=True):
+    """Add (or remove) a role for many users in a single transaction
+
+    Level rules are the same as those of the single-user action, but are
+    checked using one aggregate query per chunk of usernames. If another
+    request adds the role to some of the users in the meantime, the
+    transaction is rolled back and the update is made once more.
+
+    Returns a mapping of username to one of `added`, `removed`,
+    `unchanged`, `not_found` or `forbidden`.
+    """
+    user_model = user_datastore.user_model
+    role_model = user_datastore.role_model
+    user_level = current_user.level
+
+    results = {username: "not_found" for username in usernames}
+    if role.level >= user_level:
+        return {username: "forbidden" for username in usernames}
+
+    changes = []
+    for chunk in chunked(usernames):
+        rows = (
+            db.session.query(
+                user_model.id,
+                user_model.username,
+                func.max(role_model.level),
+                func.max(case((role_model.id == role.id, 1), else_=0)),
+            )
+            .outerjoin(RolesUsers, RolesUsers.user_id == user_model.id)
+            .outerjoin(role_model, role_model.id == RolesUsers.role_id)
+            .filter(user_model.username.in_(chunk))
+            .group_by(user_model.id, user_model.username)
+            .all()
+        )
+        for user_id, username, target_level, has_role in rows:
+            target_level = target_level or 0
+            if user_id == current_user.id:
+                allowed = role.level != user_level
+            else:
+                allowed = user_level > target_level
+
+            if not allowed:
+                results[username] = "forbidden"
+            elif bool(has_role) == add:
+                results[username] = "unchanged"
+            else:
+                results[username] = "added" if add else "removed"
+                changes.append(user_id)
+
+    roles_users = RolesUsers.__table__
+    try:
+        for chunk in chunked(changes):
+            if add:
+                db.session.execute(
+                    roles_users.insert(),
+                    [
+                        {"user_id": user_id, "role_id": role.id}
+                        for user_id in chunk
+                    ],
+                )
+            else:
+                db.session.execute(
+                    roles_users.delete().where(
+                        roles_users.c.role_id == role.id,
+                        roles_users.c.user_id.in_(chunk),
+                    )
+                )
+        db.session.commit()
+    except IntegrityError:
+        # unique (user_id, role_id), added by a concurrent request
+        db.session.rollback()
+        if not retry:
+            raise
+        return bulk_update_roles(usernames, role, add=add, retry=False)
+    identity_cache.invalidate(changes)
+    return results
+
+
+###############################################################################
+# Background Jobs
+
+
+@job_runner.register("application_info")
+def application_info():
+    return json.dumps(pa_client.info(), indent=2)
+
+
+@job_runner.register("application_update")
+def application_update():
+    repo = git.cmd.Git(app.dir)
+    return repo.pull(kill_after_timeout=app.git_pull_timeout)
+
+
+@job_runner.register("application_reload")
+def application_reload():
+    pa_client.reload()
+    return "Application has been reloaded."
+
+
 ###############################################################################
 
 
@@ -306,10 +790,17 @@ def action():
             "application_info",
             "application_update",
             "application_reload",
+            "profiler_toggle",
         ],
         "admin": [
             "user_role_add",
-            "user_role_remove"
+            "user_role_remove",
+            "user_role_bulk_add",
+            "user_role_bulk_remove",
+            "theme_refresh",
+        ],
+        "member": [
+            "update_settings",
         ],
     }
     valid_actions = [
@@ -320,6 +811,9 @@ def action():
         flash("Invalid action.")
         return redirect(request.referrer)
 
+    if app.metrics["enabled"]:
+        metrics.label(action=action)
+
     for role, actions in role_actions.items():
         if action in actions and not current_user.has_role(role):
             flash("You are not authorized to perform that action.", "danger")
@@ -336,47 +830,42 @@ def action():
         flash("PythonAnywhere configuration incomplete or missing.")
         return redirect(request.referrer)
 
-    if action == "application_info":
-        info_url = app.pa_api_url + app.pa_api_actions["info"]
-        response = requests.get(info_url, headers=app.pa_headers)
-        if response.status_code == 200:
-            pretty_info = json.dumps(
-                json.loads(response.content.decode()), indent=2
-            )
-            session["admin_result"] = pretty_info
-        else:
-            print(response.content.decode())
-            flash("Something went wrong.")
-        return redirect(request.referrer)
+    # Application information, git-pull and reload run as background jobs
+    if action in [
+        "application_info", "application_update", "application_reload"
+    ]:
+        job_id = job_runner.submit(action, user_id=current_user.id)
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify({"job": job_id})
+        return redirect(url_for("show_admin", job=job_id))
+
+    # ----------------------------------------------------------------------- #
+    # Enable/Disable Profiler
 
-    # Perform git-pull
-    if action == "application_update":
+    if action == "profiler_toggle":
         try:
-            repo = git.cmd.Git(app.dir)
-            result = repo.pull()
-        except Exception as e:
-            result = f"Error\n{e}"
-        session["admin_result"] = result
-
-        if result == "Already up-to-date.":
-            flash("Already up-to-date.")
-        elif "Updating" in result and "changed," in result:
-            flash("Application code has been updated.", "success")
+            sample_rate = float(request.form["sample_rate"]) / 100
+        except (KeyError, ValueError):
+            sample_rate = None
+        if "enabled" in request.form:
+            # as shown on the page, whichever process rendered it
+            enabled = request.form["enabled"] == "1"
         else:
-            flash("Something went wrong.")
-        return redirect(request.referrer)
-
-    # API App Reload
-    if action == "application_reload":
-        reload_url = app.pa_api_url + app.api_actions["reload"]
-        response = requests.post(reload_url, headers=app.pa_headers)
-        if response.status_code == 200:
-            flash("Application has been reloaded.", "success")
-            return Response("Success")
+            # the state may have been changed by another process
+            profiler.check(force=True)
+            enabled = not profiler.enabled
+        try:
+            profiler.configure(enabled, sample_rate)
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(request.referrer)
+        if profiler.enabled:
+            flash(
+                f"Profiling {profiler.sample_rate:.2%} of requests.", "info"
+            )
         else:
-            print(response.content.decode())
-            flash("Something went wrong.")
-            return Response("Failure")
+            flash("Profiling disabled.", "info")
+        return redirect(request.referrer)
 
     # ----------------------------------------------------------------------- #
     # Manage User Role
@@ -388,9 +877,12 @@ def action():
 
         _user = user_datastore.find_user(username=target_user)
         _role = user_datastore.find_role(target_role)
+        if _user is None or _role is None:
+            flash("Invalid user or role.", "danger")
+            return redirect(request.referrer)
 
-        user_level = max([role.level for role in current_user.roles])
-        target_level = max([role.level for role in _user.roles])
+        user_level = current_user.level
+        target_level = _user.level
 
         valid_update = True
         if _user == current_user:
@@ -411,13 +903,67 @@ def action():
                 message = "Removed role '{}' from user '{}'."
 
             if status:
-                db.session.commit()
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # role added by a concurrent request
+                    db.session.rollback()
+                    status = False
+            if status:
                 flash(message.format(target_role, target_user), "info")
             else:
                 flash("No changes were made.")
 
         return redirect(request.referrer)
 
+    # ----------------------------------------------------------------------- #
+    # Manage User Role (Bulk)
+
+    if action in ["user_role_bulk_add", "user_role_bulk_remove"]:
+        target_role = request.form["target_role"]
+        target_action = action.split("_")[-1]
+
+        text = request.form.get("target_users", "")
+        target_file = request.files.get("target_users_file")
+        if target_file and target_file.filename:
+            text += "\n" + target_file.read().decode("utf-8", "replace")
+        usernames = parse_usernames(text)
+
+        _role = user_datastore.find_role(target_role)
+        if _role is None or not usernames:
+            flash("Insufficient paremeters in request.")
+            return redirect(request.referrer)
+
+        results = bulk_update_roles(
+            usernames, _role, add=(target_action == "add")
+        )
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(results)
+
+        summary = {}
+        for username, result in results.items():
+            summary.setdefault(result, []).append(username)
+        session["admin_result"] = "\n".join(
+            f"{result} ({len(names)}): " + ", ".join(names[:50])
+            + (f", ... ({len(names) - 50} more)" if len(names) > 50 else "")
+            for result, names in summary.items()
+        )
+        flash(
+            f"Role '{target_role}': "
+            + ", ".join(f"{len(v)} {k}" for k, v in summary.items())
+            + ".",
+            "info",
+        )
+        return redirect(request.referrer)
+
+    # ----------------------------------------------------------------------- #
+    # Refresh Theme Registry
+
+    if action == "theme_refresh":
+        themes = theme_registry.refresh()
+        flash(f"Theme registry refreshed ({len(themes)} themes).", "info")
+        return redirect(request.referrer)
+
     # ----------------------------------------------------------------------- #
     # Update Settings
 
@@ -425,9 +971,15 @@ def action():
         display_name = request.form["display_name"]
         theme = request.form["theme"]
 
+        theme_registry.check()
+        if theme not in theme_registry:
+            flash(f"Invalid theme '{theme}'.", "danger")
+            return redirect(request.referrer)
+
         settings = {"display_name": display_name, "theme": theme}
         current_user.settings = settings
         db.session.commit()
+        identity_cache.invalidate([current_user.id])
         return redirect(request.referrer)
 
     # ----------------------------------------------------------------------- #
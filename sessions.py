@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server-side Sessions
+
+Session data is kept on the server, in a `SessionStore`, instead of the
+signed session cookie. The cookie only carries a random session id and the
+version of the session (`<id>.<version>`).
+
+* `SQLAlchemySessionStore`: `server_session` table of the database
+* `FileSystemSessionStore`: a file per session in a directory
+
+Session data is serialized as in Flask's cookie sessions (tagged JSON).
+Only the SHA-256 of a session id is stored.
+
+Recently used sessions are cached in memory (per process, LRU). A session
+gets a new version whenever it is saved, and a cached session is used only
+if it has the version of the cookie, so that a session saved by another
+process is loaded again. A session deleted by another process (e.g., on
+logout) may, however, be served from the cache for up to `cache_ttl`
+seconds.
+
+Sessions expire `PERMANENT_SESSION_LIFETIME` after they were last saved,
+or `anonymous_lifetime` seconds if no user is logged in (e.g., a session
+holding only the CSRF token of an anonymous visitor); a session which is
+only read is saved again once half of that has passed.
+Expired sessions are removed every `cleanup_interval` seconds, in batches
+of `cleanup_batch`.
+
+The session id is changed on login and on logout.
+"""
+
+###############################################################################
+
+import os
+import time
+import secrets
+import hashlib
+import logging
+import datetime
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SecureCookieSession
+from flask_login import user_logged_in, user_logged_out
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models_sqla import ServerSession
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+# `data` is serialized, `expires` is a UNIX timestamp
+StoredSession = namedtuple("StoredSession", ["version", "data", "expires"])
+
+###############################################################################
+
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+
+def new_version():
+    return secrets.token_urlsafe(6)
+
+
+def session_key(sid):
+    """Key of a session in the store"""
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+def to_datetime(timestamp):
+    """Naive UTC datetime of a UNIX timestamp"""
+    return datetime.datetime.utcfromtimestamp(timestamp)
+
+
+def to_timestamp(value):
+    """UNIX timestamp of a naive UTC datetime"""
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+###############################################################################
+
+
+class SessionStore:
+    """Serialized sessions by key"""
+
+    def init_app(self, app):
+        pass
+
+    def load(self, key):
+        """StoredSession of `key` (None if there is no such session)"""
+        raise NotImplementedError
+
+    def save(self, key, stored):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_expired(self, now, limit):
+        """Remove up to `limit` sessions expired at `now`, return how many"""
+        raise NotImplementedError
+
+
+class SQLAlchemySessionStore(SessionStore):
+    """Sessions in the `server_session` table"""
+
+    def __init__(self, db):
+        self.db = db
+        self.table = ServerSession.__table__
+        self.engine = None
+
+    def init_app(self, app):
+        with app.app_context():
+            self.engine = self.db.engine
+
+    def load(self, key):
+        table = self.table
+        try:
+            with self.engine.connect() as connection:
+                row = connection.execute(
+                    select(table.c.version, table.c.data, table.c.expires_at)
+                    .where(table.c.id == key)
+                ).first()
+        except (OperationalError, ProgrammingError):
+            # sessions are opened before `init_database` creates the tables
+            # (`flask db upgrade` for existing databases)
+            if inspect(self.engine).has_table(table.name):
+                raise
+            return None
+        if row is None:
+            return None
+        return StoredSession(
+            row.version, row.data, to_timestamp(row.expires_at)
+        )
+
+    def save(self, key, stored):
+        table = self.table
+        values = {
+            "version": stored.version,
+            "data": stored.data,
+            "expires_at": to_datetime(stored.expires),
+        }
+        with self.engine.begin() as connection:
+            updated = connection.execute(
+                table.update().where(table.c.id == key).values(values)
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(id=key, **values))
+
+    def delete(self, key):
+        with self.engine.begin() as connection:
+            connection.execute(
+                self.table.delete().where(self.table.c.id == key)
+            )
+
+    def delete_expired(self, now, limit):
+        table = self.table
+        expired = table.c.expires_at < to_datetime(now)
+        with self.engine.begin() as connection:
+            keys = connection.execute(
+                select(table.c.id).where(expired).limit(limit)
+            ).scalars().all()
+            if keys:
+                # unless saved again in the meantime
+                connection.execute(
+                    table.delete().where(table.c.id.in_(keys), expired)
+                )
+        return len(keys)
+
+
+class FileSystemSessionStore(SessionStore):
+    """Sessions in files of `directory`, expiring at their mtime"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def init_app(self, app):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        try:
+            with open(self.path(key), encoding="utf-8") as f:
+                expires = os.fstat(f.fileno()).st_mtime
+                version, _, data = f.read().partition("\n")
+        except FileNotFoundError:
+            return None
+        return StoredSession(version, data, expires)
+
+    def save(self, key, stored):
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".", suffix=".tmp", dir=self.directory
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f"{stored.version}\n{stored.data}")
+            os.utime(temp_path, (stored.expires, stored.expires))
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_expired(self, now, limit):
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if removed >= limit:
+                    break
+                if entry.name.startswith("."):
+                    # being written
+                    continue
+                try:
+                    if entry.stat().st_mtime < now:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+###############################################################################
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session stored on the server, under `sid`"""
+
+    def __init__(self, initial=None, sid=None, version=None, expires=None,
+                 cookie=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.version = version
+        self.expires = expires
+        # cookie of the request, and the id replaced by `regenerate()`
+        self.cookie = cookie
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the session to a new id"""
+        if self.sid is not None and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keep sessions in a `SessionStore`, their ids in the cookie"""
+
+    session_class = ServerSideSession
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, app=None, store=None, cache_size=1000, cache_ttl=30,
+                 cleanup_interval=300, cleanup_batch=500,
+                 anonymous_lifetime=3600):
+        self.anonymous_lifetime = anonymous_lifetime
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch = cleanup_batch
+        self.store = None
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        if app is not None:
+            self.init_app(app, store)
+
+    def init_app(self, app, store):
+        self.store = store
+        store.init_app(app)
+        app.session_interface = self
+        app.extensions["server_sessions"] = self
+
+        # against session fixation
+        user_logged_in.connect_via(app)(self.on_login_changed)
+        user_logged_out.connect_via(app)(self.on_login_changed)
+
+    # ----------------------------------------------------------------------- #
+
+    def cache_get(self, key, version):
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            stored, cached_until = entry
+            if stored.version != version or cached_until < time.monotonic():
+                del self.cache[key]
+                return None
+            self.cache.move_to_end(key)
+        return stored
+
+    def cache_put(self, key, stored):
+        if not self.cache_size:
+            return
+        with self.lock:
+            self.cache.pop(key, None)
+            self.cache[key] = (stored, time.monotonic() + self.cache_ttl)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def cache_remove(self, key):
+        with self.lock:
+            self.cache.pop(key, None)
+
+    def delete(self, sid):
+        key = session_key(sid)
+        self.store.delete(key)
+        self.cache_remove(key)
+
+    def lifetime(self, app, session):
+        """Seconds a session is kept after it was saved"""
+        if session.get("_user_id") is None:
+            return self.anonymous_lifetime
+        return app.permanent_session_lifetime.total_seconds()
+
+    # ----------------------------------------------------------------------- #
+
+    def open_session(self, app, request):
+        self.start()
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self.session_class()
+
+        sid, _, version = cookie.partition(".")
+        key = session_key(sid)
+        stored = self.cache_get(key, version)
+        if stored is None:
+            stored = self.store.load(key)
+            if stored is not None:
+                self.cache_put(key, stored)
+        if stored is None or stored.expires <= time.time():
+            return self.session_class(cookie=cookie)
+
+        return self.session_class(
+            self.serializer.loads(stored.data),
+            sid=sid,
+            version=stored.version,
+            expires=stored.expires,
+            cookie=cookie,
+        )
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.previous_sid is not None:
+            self.delete(session.previous_sid)
+
+        if not session:
+            if session.sid is not None:
+                self.delete(session.sid)
+            if session.cookie:
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=secure,
+                    samesite=samesite,
+                    httponly=httponly,
+                )
+                response.vary.add("Cookie")
+            return
+
+        now = time.time()
+        lifetime = self.lifetime(app, session)
+        if (
+            session.modified
+            or session.sid is None
+            or session.expires - now < lifetime / 2
+        ):
+            if session.sid is None:
+                session.sid = new_sid()
+            session.version = new_version()
+            session.expires = now + lifetime
+            stored = StoredSession(
+                session.version,
+                self.serializer.dumps(dict(session)),
+                session.expires,
+            )
+            key = session_key(session.sid)
+            self.store.save(key, stored)
+            self.cache_put(key, stored)
+
+        cookie = f"{session.sid}.{session.version}"
+        if cookie != session.cookie:
+            response.set_cookie(
+                name,
+                cookie,
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+            response.vary.add("Cookie")
+
+    # ----------------------------------------------------------------------- #
+
+    def on_login_changed(self, sender, user=None, **extra):
+        if isinstance(session._get_current_object(), ServerSideSession):
+            session.regenerate()
+
+    # ----------------------------------------------------------------------- #
+
+    def start(self):
+        """Start the cleanup thread (once per process)"""
+        if not self.cleanup_interval:
+            return
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.run, name="sessions", daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.cleanup_interval)
+            try:
+                self.cleanup()
+            except Exception:
+                LOGGER.exception("Failed to remove expired sessions.")
+
+    def cleanup(self):
+        """Remove expired sessions, in batches, return how many"""
+        removed = 0
+        while True:
+            count = self.store.delete_expired(time.time(), self.cleanup_batch)
+            removed += count
+            if count < self.cleanup_batch:
+                break
+        if removed:
+            LOGGER.info("Removed %d expired sessions.", removed)
+        return removed
+
+
+###############################################################################
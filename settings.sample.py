@@ -23,11 +23,64 @@ APP_AUTHOR = "Hrishikesh Terdalkar"
 APP_DIR = os.path.dirname(os.path.realpath(__file__))
 LOG_FILE = os.path.join(APP_DIR, "flask.log")
 
+# Log files are rotated at LOG_MAX_BYTES, or at LOG_ROTATE_WHEN (e.g.,
+# "midnight", see logging.handlers.TimedRotatingFileHandler) if set
+LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_WHEN = None
+LOG_BACKUP_COUNT = 10
+# JSON lines (with request id, user id and elapsed time) instead of text
+LOG_JSON = False
+# Log every request (method, path, status, duration)
+LOG_ACCESS = False
+
 # DB_DIR is used for specifying directory containing SQLite3 database
 
 DB_DIR = "db"
 DATA_DIR = "data"
 
+# Fingerprinted static asset manifest (inside DATA_DIR)
+# Build using: flask assets manifest
+ASSET_MANIFEST_FILE = "assets.json"
+
+# Use concatenated CSS/JS bundles instead of individual static files
+# Build using: flask assets build
+ASSETS_BUNDLE = False
+
+# Hand static files off to the front server instead of streaming them
+# None, "x-sendfile" (Apache, lighttpd) or "x-accel-redirect" (nginx)
+# For nginx, ASSETS_ACCEL_REDIRECT_PREFIX must be an `internal` location
+# aliased to the static directory
+ASSETS_SENDFILE = None
+ASSETS_ACCEL_REDIRECT_PREFIX = "/static-internal/"
+
+# Use FontAwesome trimmed to the icons used in templates and FONTAWESOME_ICONS
+# Build using: flask assets fontawesome (requires fonttools, brotli)
+FONTAWESOME_SUBSET = False
+# Icons added by JavaScript (defaults are used by bootstrap-table)
+FONTAWESOME_ICONS = [
+    "caret-square-down", "caret-square-up", "sync", "toggle-off",
+    "toggle-on", "th-list", "plus", "minus", "arrows-alt", "search", "trash",
+]
+
+# Number of users per page in the admin panel user search
+USER_SEARCH_LIMIT = 50
+
+# Cache lifetime (seconds) of per-chapter sutra JSON shards
+SUTRA_CACHE_MAX_AGE = 24 * 60 * 60
+
+# Server-side transliteration (batch API)
+TRANSLITERATION_CACHE_SIZE = 4096
+TRANSLITERATION_MAX_BATCH_SIZE = 1000
+
+# Theme directories are rescanned (if modified) at most once in these seconds
+THEME_CHECK_INTERVAL = 5
+
+# Pages are sent with ETags, unchanged pages are answered with 304
+# Templates are rechecked for changes at most once in CHECK_INTERVAL seconds
+PAGE_ETAGS_ENABLED = True
+PAGE_ETAGS_CHECK_INTERVAL = 5
+
 # --------------------------------------------------------------------------- #
 
 APPLICATION_CONFIG = {}
@@ -44,6 +97,52 @@ SECURITY_PASSWORD_SALT = os.environ.get(
     "SECURITY_PASSWORD_SALT", "301721846670564486948773381866193921949"
 )
 
+# Password hashing scheme ("bcrypt", or "argon2" with argon2-cffi installed)
+# and options, e.g. {"rounds": 12}; empty options use the library defaults
+# Calibrate using: flask passwords calibrate --target-ms 250
+# Stored passwords using another scheme or options are rehashed on login
+PASSWORD_HASH = "bcrypt"
+PASSWORD_HASH_OPTIONS = {}
+
+# Login tracking (last/current login time and IP, login count) is buffered
+# and written in batches, at most FLUSH_INTERVAL seconds later, or as soon as
+# FLUSH_SIZE users have logged in; set to False to write on every login
+LOGIN_TRACKING_WRITE_BEHIND = True
+LOGIN_TRACKING_FLUSH_INTERVAL = 5
+LOGIN_TRACKING_FLUSH_SIZE = 100
+
+# Logged-in users' roles and permissions are cached (per process)
+# Role changes made in another process take effect after at most TTL seconds
+IDENTITY_CACHE_TTL = 300
+IDENTITY_CACHE_SIZE = 10000
+
+# The role hierarchy (levels and permissions) is rebuilt when roles change
+# Changes made in another process are noticed after at most TTL seconds
+ROLE_HIERARCHY_TTL = 30
+
+# --------------------------------------------------------------------------- #
+# Sessions
+
+# Session data is kept on the server, the cookie only carries the session id
+# "sqlalchemy" (database), "filesystem" (SESSION_DIRECTORY, inside DATA_DIR)
+# or "cookie" (Flask's signed cookie sessions)
+SESSION_BACKEND = "sqlalchemy"
+SESSION_DIRECTORY = "sessions"
+
+# Recently used sessions are cached (per process)
+# A session deleted in another process (e.g., on logout) may still be used
+# in this process for at most CACHE_TTL seconds
+SESSION_CACHE_SIZE = 1000
+SESSION_CACHE_TTL = 30
+
+# Sessions without a logged-in user (e.g., the CSRF token of a visitor)
+# expire after ANONYMOUS_LIFETIME seconds instead of PERMANENT_SESSION_LIFETIME
+SESSION_ANONYMOUS_LIFETIME = 3600
+
+# Expired sessions are removed every CLEANUP_INTERVAL seconds, in batches
+SESSION_CLEANUP_INTERVAL = 600
+SESSION_CLEANUP_BATCH = 500
+
 # --------------------------------------------------------------------------- #
 # First User
 
@@ -58,6 +157,28 @@ PA_DOMAIN = os.environ.get("PA_DOMAIN", "")
 PA_USERNAME = os.environ.get("PA_USERNAME", "")
 PA_TOKEN = os.environ.get("PA_TOKEN", "")
 
+# PythonAnywhere API calls: timeouts (seconds), retries (with exponential
+# backoff of BACKOFF seconds, on 429 and 5xx responses; a reload only on 429),
+# the longest wait between retries, also if asked for by `Retry-After`
+# (seconds), and how long the web app information is cached (seconds)
+PA_API_CONNECT_TIMEOUT = 5
+PA_API_READ_TIMEOUT = 30
+PA_API_RETRIES = 3
+PA_API_BACKOFF = 0.5
+PA_API_MAX_WAIT = 10
+PA_API_CACHE_TTL = 60
+
+# Timeout (seconds) of `git pull`
+GIT_PULL_TIMEOUT = 120
+
+# --------------------------------------------------------------------------- #
+# Background Jobs
+
+# Threads (per process) running slow admin actions, e.g., application update
+# Jobs are recorded in the database, and removed after RETENTION_DAYS
+JOBS_WORKERS = 2
+JOBS_RETENTION_DAYS = 30
+
 # --------------------------------------------------------------------------- #
 # SMTP Config
 
@@ -93,6 +214,67 @@ MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE", "")
 
 SQLITE_DATABASE = os.environ.get("SQLITE_DATABASE", "test.db")
 
+# PRAGMAs applied to every connection ("default" keeps SQLite defaults)
+# "wal" lets readers proceed while a writer is active (several workers)
+# Compare using: flask database benchmark
+SQLITE_PROFILE = "wal"
+SQLITE_PROFILES = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -16384,
+        "busy_timeout": 5000,
+    },
+}
+
+# Checkpoint the WAL every these seconds (0 to rely on auto-checkpoints)
+SQLITE_CHECKPOINT_INTERVAL = 300
+SQLITE_CHECKPOINT_MODE = "TRUNCATE"
+
+# --------------------------------------------------------------------------- #
+# Query Statistics
+
+# Per-request query count and database time; statements run REPEAT_THRESHOLD
+# or more times in a request are logged as possible N+1 queries
+QUERY_STATS_ENABLED = True
+QUERY_STATS_REPEAT_THRESHOLD = 5
+
+# Also send them in a Server-Timing header (to every client), and log them
+# for every request; for debugging only
+QUERY_STATS_SERVER_TIMING = False
+QUERY_STATS_LOG = False
+
+# Show the recent requests of the process on the admin page
+QUERY_STATS_DEBUG_PANEL = False
+
+# --------------------------------------------------------------------------- #
+# Metrics
+
+# Request counts, latency histograms and pool statistics, served at /metrics
+# (Prometheus text format) to users with METRICS_PERMISSION
+# Counts of all processes are added up in METRICS_DATABASE (in DB_DIR),
+# every FLUSH_INTERVAL seconds
+METRICS_ENABLED = True
+METRICS_DATABASE = "metrics.db"
+METRICS_FLUSH_INTERVAL = 5
+METRICS_PERMISSION = "view_acp"
+
+# --------------------------------------------------------------------------- #
+# Profiler
+
+# Profile a random sample (SAMPLE_RATE) of requests, and requests of owners
+# carrying the PROFILER_HEADER (e.g., "X-Profile: 1")
+# Profiles are written to PROFILER_DIRECTORY (inside DATA_DIR), the oldest
+# are removed beyond PROFILER_MAX_SIZE bytes
+# Can be enabled or disabled at runtime from the admin panel
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 0.01
+PROFILER_HEADER = "X-Profile"
+PROFILER_DIRECTORY = "profiles"
+PROFILER_MAX_SIZE = 50 * 1024 * 1024
+
 # --------------------------------------------------------------------------- #
 
 USE_MONGO = False
@@ -149,11 +331,79 @@ app.db_dir = os.path.join(APP_DIR, DB_DIR)
 app.data_dir = os.path.join(APP_DIR, DATA_DIR)
 
 app.log_file = LOG_FILE
+app.logging = {
+    "level": LOG_LEVEL,
+    "max_bytes": LOG_MAX_BYTES,
+    "when": LOG_ROTATE_WHEN,
+    "backup_count": LOG_BACKUP_COUNT,
+    "json": LOG_JSON,
+    "access": LOG_ACCESS,
+}
+
+# Assets
+
+app.asset_manifest_file = os.path.join(app.data_dir, ASSET_MANIFEST_FILE)
+app.assets_bundle = ASSETS_BUNDLE
+app.assets_sendfile = ASSETS_SENDFILE
+app.assets_accel_redirect_prefix = ASSETS_ACCEL_REDIRECT_PREFIX
+app.fontawesome_subset = FONTAWESOME_SUBSET
+app.fontawesome_icons = FONTAWESOME_ICONS
+
+# Admin
+
+app.user_search_limit = USER_SEARCH_LIMIT
+
+# Sutras
+
+app.sutra_cache_max_age = SUTRA_CACHE_MAX_AGE
+
+# Transliteration
+
+app.transliteration = {
+    "cache_size": TRANSLITERATION_CACHE_SIZE,
+    "max_batch_size": TRANSLITERATION_MAX_BATCH_SIZE,
+}
+
+# Themes
+
+app.theme_check_interval = THEME_CHECK_INTERVAL
+
+# Conditional GET
+
+app.page_etags = {
+    "enabled": PAGE_ETAGS_ENABLED,
+    "check_interval": PAGE_ETAGS_CHECK_INTERVAL,
+}
 
 # Security
 
 app.secret_key = SECRET_KEY
 app.security_password_salt = SECURITY_PASSWORD_SALT
+app.password_hash = {
+    "scheme": PASSWORD_HASH,
+    "options": PASSWORD_HASH_OPTIONS,
+}
+app.login_tracking = {
+    "write_behind": LOGIN_TRACKING_WRITE_BEHIND,
+    "flush_interval": LOGIN_TRACKING_FLUSH_INTERVAL,
+    "flush_size": LOGIN_TRACKING_FLUSH_SIZE,
+}
+app.identity_cache = {
+    "ttl": IDENTITY_CACHE_TTL,
+    "size": IDENTITY_CACHE_SIZE,
+}
+app.role_hierarchy = {
+    "ttl": ROLE_HIERARCHY_TTL,
+}
+app.sessions = {
+    "backend": SESSION_BACKEND,
+    "directory": os.path.join(app.data_dir, SESSION_DIRECTORY),
+    "cache_size": SESSION_CACHE_SIZE,
+    "cache_ttl": SESSION_CACHE_TTL,
+    "cleanup_interval": SESSION_CLEANUP_INTERVAL,
+    "cleanup_batch": SESSION_CLEANUP_BATCH,
+    "anonymous_lifetime": SESSION_ANONYMOUS_LIFETIME,
+}
 
 # Users
 
@@ -178,6 +428,22 @@ app.pa_api_url = f"https://www.pythonanywhere.com/api/v0/user/{PA_USERNAME}/"
 app.pa_headers = {
     "Authorization": f"Token {PA_TOKEN}"
 }
+app.pa_api = {
+    "connect_timeout": PA_API_CONNECT_TIMEOUT,
+    "read_timeout": PA_API_READ_TIMEOUT,
+    "retries": PA_API_RETRIES,
+    "backoff": PA_API_BACKOFF,
+    "max_wait": PA_API_MAX_WAIT,
+    "cache_ttl": PA_API_CACHE_TTL,
+}
+app.git_pull_timeout = GIT_PULL_TIMEOUT
+
+# Background Jobs
+
+app.jobs = {
+    "workers": JOBS_WORKERS,
+    "retention_days": JOBS_RETENTION_DAYS,
+}
 
 # MongoDB
 
@@ -225,4 +491,40 @@ if USE_SQLITE:
         )
     }
 
+app.sqlite = {
+    "profiles": SQLITE_PROFILES,
+    "pragmas": SQLITE_PROFILES[SQLITE_PROFILE],
+    "checkpoint_interval": SQLITE_CHECKPOINT_INTERVAL,
+    "checkpoint_mode": SQLITE_CHECKPOINT_MODE,
+}
+
+# Query Statistics
+
+app.query_stats = {
+    "enabled": QUERY_STATS_ENABLED,
+    "server_timing": QUERY_STATS_SERVER_TIMING,
+    "log": QUERY_STATS_LOG,
+    "repeat_threshold": QUERY_STATS_REPEAT_THRESHOLD,
+    "debug_panel": QUERY_STATS_DEBUG_PANEL,
+}
+
+# Metrics
+
+app.metrics = {
+    "enabled": METRICS_ENABLED,
+    "database": os.path.join(app.db_dir, METRICS_DATABASE),
+    "flush_interval": METRICS_FLUSH_INTERVAL,
+    "permission": METRICS_PERMISSION,
+}
+
+# Profiler
+
+app.profiler = {
+    "enabled": PROFILER_ENABLED,
+    "sample_rate": PROFILER_SAMPLE_RATE,
+    "header": PROFILER_HEADER,
+    "directory": os.path.join(app.data_dir, PROFILER_DIRECTORY),
+    "max_size": PROFILER_MAX_SIZE,
+}
+
 ###############################################################################
@@ -0,0 +1,37 @@
+/*
+ * Lazy access to the sutra index through the server-side API
+ * (replaces including the monolithic `static/data/index.js`)
+ *
+ * Include using the `sutra_script()` macro (`macros.html`), which passes the
+ * API URLs (generated by `url_for`) as `data-` attributes.
+ *
+ * get_sutra("11001").then(function(text) { ... });
+ * search_sutras("गुण", 1).then(function(result) { ... });
+ */
+
+var sutra_api = {
+    search_url: document.currentScript.dataset.searchUrl,
+    chapter_url: document.currentScript.dataset.chapterUrl
+};
+var sutra_chapters = {};
+
+function get_sutra_chapter(chapter) {
+    if (!(chapter in sutra_chapters)) {
+        sutra_chapters[chapter] = $.getJSON(sutra_api.chapter_url + chapter);
+    }
+    return sutra_chapters[chapter];
+}
+
+function get_sutra(sutra_id) {
+    return get_sutra_chapter(sutra_id.charAt(0)).then(function(sutras) {
+        return sutras[sutra_id];
+    });
+}
+
+function search_sutras(query, page, per_page) {
+    return $.getJSON(sutra_api.search_url, {
+        q: query,
+        page: page || 1,
+        per_page: per_page || 20
+    });
+}
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sutra Index
+
+Server-side index over `static/data/index.js`, which defines the global
+`sutra_index` object mapping sutra ids to their text.
+
+Sutra ids are five digit strings `APSSS` (adhyaya, pada, sutra number),
+e.g. `11001` for 1.1.1. Ids may also be queried in dotted notation.
+
+Text fragments of length `NGRAM_SIZE` or more are matched using a
+character n-gram index; shorter fragments fall back to a scan.
+"""
+
+###############################################################################
+
+import re
+import json
+import bisect
+import unicodedata
+from collections import defaultdict
+
+###############################################################################
+
+NGRAM_SIZE = 3
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+JS_OBJECT_PATTERN = re.compile(r"^\s*(?:const|var|let)\s+\w+\s*=\s*|;\s*$")
+DOTTED_ID_PATTERN = re.compile(
+    r"^([1-8])\.([1-4])(?:\.([0-9]{1,3}))?$"
+)
+ID_PATTERN = re.compile(r"^[0-9]{1,5}$")
+
+###############################################################################
+
+
+def normalize(text):
+    """Search key of a text (or query)"""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def parse_sutra_id(query):
+    """Convert dotted sutra ids (or `A.P` prefixes) to the `APSSS` form"""
+    match = DOTTED_ID_PATTERN.match(query)
+    if match:
+        adhyaya, pada, sutra = match.groups()
+        if sutra is None:
+            return f"{adhyaya}{pada}"
+        return f"{adhyaya}{pada}{int(sutra):03d}"
+    return query
+
+
+###############################################################################
+
+
+class SutraIndex:
+    """In-memory id, prefix and n-gram index of sutras"""
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.sutras = {}
+        # normalized texts, which are searched (`sutras` are served as is)
+        self.keys = {}
+        self.chapters = defaultdict(list)
+        self.ngrams = defaultdict(set)
+        self.sorted_ids = []
+        self.sorted_texts = []
+        self.load()
+
+    def load(self):
+        with open(self.index_file, encoding="utf-8") as f:
+            content = JS_OBJECT_PATTERN.sub("", f.read())
+
+        sutras = json.loads(content)
+        keys = {sutra_id: normalize(text) for sutra_id, text in sutras.items()}
+
+        chapters = defaultdict(list)
+        index = defaultdict(set)
+        for sutra_id, key in keys.items():
+            chapters[int(sutra_id[0])].append(sutra_id)
+            for ngram in ngrams(key):
+                index[ngram].add(sutra_id)
+
+        self.sutras = sutras
+        self.keys = keys
+        self.chapters = chapters
+        self.ngrams = index
+        self.sorted_ids = sorted(sutras)
+        self.sorted_texts = sorted(
+            (key, sutra_id) for sutra_id, key in keys.items()
+        )
+
+    # ----------------------------------------------------------------------- #
+
+    def get(self, sutra_id):
+        return self.sutras.get(parse_sutra_id(sutra_id))
+
+    def chapter(self, chapter):
+        return {
+            sutra_id: self.sutras[sutra_id]
+            for sutra_id in self.chapters.get(chapter, [])
+        }
+
+    def find_ids(self, prefix):
+        """Sutra ids starting with `prefix`"""
+        start = bisect.bisect_left(self.sorted_ids, prefix)
+        end = bisect.bisect_left(self.sorted_ids, prefix + "\uffff")
+        return self.sorted_ids[start:end]
+
+    def find_prefix(self, prefix):
+        """Sutra ids of sutras whose text starts with `prefix`"""
+        start = bisect.bisect_left(self.sorted_texts, (prefix,))
+        end = bisect.bisect_left(self.sorted_texts, (prefix + "\uffff",))
+        return sorted(
+            sutra_id for _, sutra_id in self.sorted_texts[start:end]
+        )
+
+    def find_text(self, fragment):
+        """Sutra ids of sutras containing `fragment`"""
+        if len(fragment) < NGRAM_SIZE:
+            candidates = self.keys
+        else:
+            postings = sorted(
+                (self.ngrams.get(ngram, set()) for ngram in ngrams(fragment)),
+                key=len,
+            )
+            candidates = set.intersection(*postings)
+        return sorted(
+            sutra_id
+            for sutra_id in candidates
+            if fragment in self.keys[sutra_id]
+        )
+
+    def search(self, query, page=1, per_page=DEFAULT_PER_PAGE, prefix=False):
+        """Search by id (or id prefix) or text fragment, paginated
+
+        If `prefix` is True, text is matched only at the start of sutras.
+        """
+        query = normalize(query)
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        page = max(1, page)
+
+        sutra_id = parse_sutra_id(query)
+        if ID_PATTERN.match(sutra_id):
+            ids = self.find_ids(sutra_id)
+        elif query:
+            ids = self.find_prefix(query) if prefix else self.find_text(query)
+        else:
+            ids = []
+
+        offset = (page - 1) * per_page
+        return {
+            "query": query,
+            "total": len(ids),
+            "page": page,
+            "per_page": per_page,
+            "results": [
+                {"id": sutra_id, "text": self.sutras[sutra_id]}
+                for sutra_id in ids[offset:offset + per_page]
+            ],
+        }
+
+    def __len__(self):
+        return len(self.sutras)
+
+
+###############################################################################
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test Fixtures
+
+The application is imported once per test session, with a `settings.py`
+generated from `settings.sample.py` in a temporary directory, which also
+holds the database, the data directory and the log file.
+
+```
+$ python -m pytest
+```
+"""
+
+###############################################################################
+
+import os
+import re
+import sys
+
+import pytest
+
+###############################################################################
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+###############################################################################
+
+
+def write_settings(directory):
+    with open(os.path.join(ROOT, "settings.sample.py"), encoding="utf-8") as f:
+        settings = f.read()
+    values = {
+        "APP_DIR": ROOT,
+        "LOG_FILE": os.path.join(directory, "flask.log"),
+        "DB_DIR": os.path.join(directory, "db"),
+        "DATA_DIR": os.path.join(directory, "data"),
+    }
+    for name, value in values.items():
+        settings = re.sub(
+            rf"^{name} = .*$", f"{name} = {value!r}", settings, flags=re.M
+        )
+    with open(os.path.join(directory, "settings.py"), "w") as f:
+        f.write(settings)
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The `server_sqla` module, with an initialized database"""
+    directory = str(tmp_path_factory.mktemp("app"))
+    write_settings(directory)
+    sys.path[:0] = [directory, ROOT]
+    # templates are found relative to the working directory
+    os.chdir(ROOT)
+
+    import server_sqla
+
+    server_sqla.webapp.config.update(
+        {"TESTING": True, "WTF_CSRF_ENABLED": False}
+    )
+    with server_sqla.webapp.app_context():
+        server_sqla.init_database()
+    return server_sqla
+
+
+@pytest.fixture(scope="session")
+def webapp(server):
+    return server.webapp
+
+
+@pytest.fixture
+def client(webapp):
+    return webapp.test_client()
+
+
+@pytest.fixture
+def create_user(server):
+    """Create a user (once per test session), return its id"""
+    datastore = server.user_datastore
+
+    def create(username, email, password, roles=("member",)):
+        with server.webapp.app_context():
+            user = datastore.find_user(username=username)
+            if user is None:
+                user = datastore.create_user(
+                    username=username,
+                    email=email,
+                    password=server.hash_password(password),
+                    roles=list(roles),
+                )
+                server.db.session.commit()
+            return user.id
+
+    return create
+
+
+@pytest.fixture
+def login(client):
+    """Log `client` in, return the response"""
+
+    def log_in(identity, password):
+        return client.post(
+            "/login", data={"email": identity, "password": password}
+        )
+
+    return log_in
+
+
+###############################################################################
@@ -0,0 +1,120 @@
+#!/usr/bin/env node
+/*
+ * Record Sanscript.t() output for tests/test_transliteration.py
+ *
+ * Loads static/plugins/js/sanscript.js with the scheme files, as the browser
+ * does, and writes the cases (text, from, to, options, expected) to
+ * tests/data/transliteration.json.
+ *
+ * Usage (from the repository root):
+ *     node tests/data/transliteration.js
+ */
+
+"use strict";
+
+const fs = require("fs");
+const path = require("path");
+
+const ROOT = path.resolve(__dirname, "..", "..");
+const SCHEME_DIR = path.join(ROOT, "static", "plugins", "js", "schemes");
+const OUTPUT = path.join(__dirname, "transliteration.json");
+
+// Sample of sutras, every STEP-th of static/data/index.js
+const STEP = 500;
+const ROMAN_TARGETS = [
+    "devanagari", "iast", "hk", "itrans", "slp1",
+    "tamil", "tamil_superscripted", "kannada",
+];
+const OPTIONS = [{}, {"skip_sgml": true}, {"syncope": true}];
+// Markup, ITRANS escapes and edge cases, given in every roman scheme
+const EXTRA = [
+    "<b>rAma</b> ##raw## kRSNa", "\\m+ aaa .h x", "a##b", "k", "'", "##",
+    "agnim ILe purohitaM", "kSatriya jJAna", "ka\\'", "OM namaH",
+];
+// sanscript.js reads input in UTF-16 code units, so it does not transliterate
+// from scripts outside the Basic Multilingual Plane (unlike transliteration.py)
+const ASTRAL = /[\u{10000}-\u{10FFFF}]/u;
+const SUPERSCRIPTED = ["क²", "கா²", "ஸ்ரீ", "கோ³பால"];
+
+function loadSchemes () {
+    const schemes = {};
+    for (const kind of ["brahmic", "roman"]) {
+        const kindDir = path.join(SCHEME_DIR, kind);
+        for (const filename of fs.readdirSync(kindDir).sort()) {
+            if (filename.endsWith(".json")) {
+                const data = fs.readFileSync(path.join(kindDir, filename));
+                schemes[filename.slice(0, -5)] = JSON.parse(data);
+            }
+        }
+    }
+    return schemes;
+}
+
+function loadSanscript (schemes) {
+    const file = path.join(ROOT, "static", "plugins", "js", "sanscript.js");
+    const module = {"exports": {}};
+    const run = new Function("module", "exports", "schemes",
+        fs.readFileSync(file, "utf8"));
+    run.call(globalThis, module, module.exports, schemes);
+    return module.exports;
+}
+
+function loadTexts () {
+    const file = path.join(ROOT, "static", "data", "index.js");
+    const source = fs.readFileSync(file, "utf8")
+        .replace(/^\s*const\s+\w+\s*=\s*/, "")
+        .replace(/;\s*$/, "");
+    const texts = Object.values(JSON.parse(source));
+    return texts.filter((text, index) => index % STEP === 0);
+}
+
+function main () {
+    const schemes = loadSchemes();
+    const Sanscript = loadSanscript(schemes);
+    const names = Object.keys(Sanscript.schemes).sort();
+    const romanNames = names.filter(name => Sanscript.isRomanScheme(name));
+    const texts = loadTexts();
+    // "transliteration from tamil_superscripted not fully implemented!"
+    console.error = () => {};
+
+    const cases = [];
+    const add = (text, from, to, options) => {
+        const expected = Sanscript.t(text, from, to, {...options});
+        cases.push([text, from, to, options, expected]);
+    };
+
+    for (const text of texts) {
+        for (const to of names) {
+            add(text, "devanagari", to, {});
+        }
+    }
+    for (const from of names.filter(name => !romanNames.includes(name))) {
+        for (const text of texts.slice(0, 3)) {
+            const source = Sanscript.t(text, "devanagari", from);
+            if (!ASTRAL.test(source)) {
+                add(source, from, "iast", {});
+            }
+        }
+    }
+    for (const from of romanNames) {
+        const romanTexts = texts.slice(0, 5).map(
+            text => Sanscript.t(text, "devanagari", from)
+        );
+        for (const text of romanTexts.concat(EXTRA)) {
+            for (const to of ROMAN_TARGETS) {
+                for (const options of OPTIONS) {
+                    add(text, from, to, options);
+                }
+            }
+        }
+    }
+    for (const text of SUPERSCRIPTED) {
+        add(text, "tamil_superscripted", "devanagari", {});
+    }
+
+    const lines = cases.map(item => JSON.stringify(item));
+    fs.writeFileSync(OUTPUT, "[\n" + lines.join(",\n") + "\n]\n");
+    console.log(`${cases.length} cases written to ${OUTPUT}`);
+}
+
+main();
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite profile: PRAGMAs of pooled connections, connections after a fork
+"""
+
+###############################################################################
+
+import os
+
+import pytest
+
+###############################################################################
+
+
+def test_pragmas(server):
+    profile = server.webapp.extensions["sqlite_profile"]
+    if not profile.enabled:
+        pytest.skip("not using an SQLite database")
+    with server.webapp.app_context():
+        stats = profile.stats()
+    pragmas = profile.pragmas
+    if "journal_mode" in pragmas:
+        assert stats["journal_mode"] == pragmas["journal_mode"].lower()
+    if "busy_timeout" in pragmas:
+        assert stats["busy_timeout"] == int(pragmas["busy_timeout"])
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_fork(server):
+    """A forked child does not reuse the connections of its parent"""
+    with server.webapp.app_context():
+        engine = server.db.engine
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+    assert engine.pool.checkedin() >= 1
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            inherited = engine.pool.checkedin()
+            with engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+            os.write(write_fd, str(inherited).encode())
+            status = 0
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        inherited = f.read()
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert inherited == "0"
+
+    # the parent's connections are still usable
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+
+
+###############################################################################
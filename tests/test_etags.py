@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conditional GET of rendered pages (ETag, 304 Not Modified)
+"""
+
+###############################################################################
+
+import pytest
+from flask import template_rendered
+
+###############################################################################
+
+
+@pytest.fixture
+def page_etags(webapp):
+    page_etags = webapp.extensions["page_etags"]
+    if not page_etags.enabled:
+        pytest.skip("page ETags are disabled")
+    return page_etags
+
+
+@pytest.fixture
+def member(client, login, create_user):
+    create_user("etaguser", "etag.user@example.org", "etag-password")
+    response = login("etaguser", "etag-password")
+    assert response.status_code == 302
+    # consume the messages flashed on login, if any
+    client.get("/settings")
+    return client
+
+
+@pytest.fixture
+def rendered(webapp):
+    """Names of the templates rendered"""
+    templates = []
+
+    def on_template_rendered(sender, template, context, **extra):
+        templates.append(template.name)
+
+    template_rendered.connect(on_template_rendered, webapp)
+    yield templates
+    template_rendered.disconnect(on_template_rendered, webapp)
+
+
+def get(client, etag=None):
+    headers = {"If-None-Match": f'W/"{etag}"'} if etag else {}
+    return client.get("/settings", headers=headers)
+
+
+###############################################################################
+
+
+def test_not_modified(member, page_etags, rendered):
+    response = get(member)
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag and weak
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    counts = page_etags.rendered, page_etags.not_modified
+    del rendered[:]
+    response = get(member, etag)
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, True)
+    assert not response.get_data()
+    # the view did not run
+    assert not rendered
+    assert page_etags.rendered == counts[0]
+    assert page_etags.not_modified == counts[1] + 1
+
+
+def test_stale_etag(member, page_etags, rendered):
+    response = get(member, "0" * 32)
+    assert response.status_code == 200
+    assert "settings.html" in rendered
+
+
+def test_user_settings_change_etag(server, member, page_etags):
+    etag, _ = get(member).get_etag()
+
+    themes = server.theme_registry.names
+    member.post(
+        "/action",
+        data={
+            "action": "update_settings",
+            "display_name": "ETag User",
+            "theme": themes[-1],
+        },
+        headers={"Referer": "/settings"},
+    )
+    response = get(member, etag)
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_themes_change_etag(server, member, page_etags, monkeypatch):
+    etag, _ = get(member).get_etag()
+
+    theme_registry = server.theme_registry
+    monkeypatch.setattr(theme_registry, "check", lambda: None)
+    monkeypatch.setattr(
+        theme_registry, "names", theme_registry.names + ["newtheme"]
+    )
+    response = get(member, etag)
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_flashed_messages_not_stored(member, page_etags, rendered):
+    etag, _ = get(member).get_etag()
+
+    with member.session_transaction() as session:
+        session["_flashes"] = [("info", "Settings saved.")]
+    response = get(member, etag)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    assert response.get_etag() == (None, None)
+    assert "Settings saved." in response.get_data(as_text=True)
+
+    # shown once
+    response = get(member, etag)
+    assert response.status_code == 304
+
+
+###############################################################################
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Indexes used by `roles_users` lookups (SQLite query plans)
+"""
+
+###############################################################################
+
+import pytest
+from sqlalchemy import select, text
+
+###############################################################################
+
+
+def query_plan(server, statement):
+    """Details of `EXPLAIN QUERY PLAN` of a statement"""
+    with server.webapp.app_context():
+        engine = server.db.engine
+        if engine.dialect.name != "sqlite":
+            pytest.skip("query plans are checked on SQLite")
+        sql = str(
+            statement.compile(
+                dialect=engine.dialect,
+                compile_kwargs={"literal_binds": True},
+            )
+        )
+        with engine.connect() as connection:
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+            return [row.detail for row in rows]
+
+
+def test_roles_of_user(server):
+    """Roles of a user (identity cache, login), by user_id"""
+    datastore = server.user_datastore
+    user_model = datastore.user_model
+    with server.webapp.app_context():
+        statement = (
+            datastore.query_with_roles()
+            .filter(user_model.fs_uniquifier == "x")
+            .statement
+        )
+    plan = query_plan(server, statement)
+    assert any("ix_roles_users_user_id_role_id" in row for row in plan), plan
+
+
+def test_role_of_user(server):
+    """A role of a user (role changes), by (user_id, role_id)"""
+    roles_users = server.RolesUsers.__table__
+    statement = select(roles_users.c.id).where(
+        roles_users.c.user_id == 1, roles_users.c.role_id == 2
+    )
+    plan = query_plan(server, statement)
+    assert any("ix_roles_users_user_id_role_id" in row for row in plan), plan
+
+
+def test_users_of_role(server):
+    """Users of a role (admin page, role counts), by role_id"""
+    roles_users = server.RolesUsers.__table__
+    statement = select(roles_users.c.user_id).where(
+        roles_users.c.role_id == 2
+    )
+    plan = query_plan(server, statement)
+    assert any("ix_roles_users_role_id" in row for row in plan), plan
+
+
+###############################################################################
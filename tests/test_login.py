@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Login by username or email, with a single query for the user and roles
+"""
+
+###############################################################################
+
+import pytest
+from sqlalchemy import event
+
+###############################################################################
+
+
+@pytest.fixture
+def identity_queries(server, monkeypatch):
+    """Statements run by each `find_user_by_identity` call (with roles)"""
+    datastore = server.user_datastore
+    find_user_by_identity = datastore.find_user_by_identity
+    calls = []
+
+    def counting_find_user_by_identity(identity):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = server.db.engine
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            user = find_user_by_identity(identity)
+            if user is not None:
+                # already loaded
+                [role.name for role in user.roles]
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        calls.append(statements)
+        return user
+
+    monkeypatch.setattr(
+        datastore, "find_user_by_identity", counting_find_user_by_identity
+    )
+    return calls
+
+
+@pytest.fixture
+def user(create_user):
+    create_user("loginuser", "login.user@example.org", "login-password")
+    return "loginuser", "login.user@example.org", "login-password"
+
+
+@pytest.mark.parametrize(
+    "identity",
+    [
+        "loginuser",
+        "login.user@example.org",
+        "login.user@EXAMPLE.ORG",
+        "LOGIN.USER@EXAMPLE.ORG",
+    ],
+)
+def test_login(client, login, user, identity_queries, identity):
+    _, _, password = user
+    response = login(identity, password)
+    assert response.status_code == 302
+    assert len(identity_queries) == 1
+    assert len(identity_queries[0]) == 1
+
+    response = client.get("/settings")
+    assert response.status_code == 200
+
+
+def test_roles_loaded(server, create_user, identity_queries):
+    create_user(
+        "rolesuser", "roles.user@example.org", "roles-password",
+        roles=["member", "admin"],
+    )
+    with server.webapp.app_context():
+        user = server.user_datastore.find_user_by_identity("rolesuser")
+        assert sorted(role.name for role in user.roles) == ["admin", "member"]
+    assert [len(statements) for statements in identity_queries] == [1]
+
+
+@pytest.mark.parametrize(
+    "identity, password",
+    [
+        ("loginuser", "wrong-password"),
+        ("nosuchuser", "login-password"),
+        ("no.such.user@example.org", "login-password"),
+    ],
+)
+def test_login_failure(login, user, identity_queries, identity, password):
+    response = login(identity, password)
+    assert response.status_code == 200
+    assert [len(statements) for statements in identity_queries] == [1]
+
+
+###############################################################################
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Password hashing: rehash on login, calibration
+"""
+
+###############################################################################
+
+import pytest
+from passlib.registry import get_crypt_handler
+
+from passwords import passlib_options
+from users import prepare_password
+
+###############################################################################
+
+
+@pytest.fixture
+def pinned_rounds(webapp, monkeypatch):
+    """Pin the bcrypt cost (kept low, for speed) of the password context"""
+    security = webapp.extensions["security"]
+    if security.password_hash != "bcrypt":
+        pytest.skip("PASSWORD_HASH is not bcrypt")
+    pwd_context = security.pwd_context.copy(
+        **passlib_options("bcrypt", {"rounds": 5})
+    )
+    monkeypatch.setattr(security, "pwd_context", pwd_context)
+    return 5
+
+
+def stored_password(server, username):
+    with server.webapp.app_context():
+        user = server.user_datastore.find_user(username=username)
+        return user.password
+
+
+###############################################################################
+
+
+def test_outdated_cost_rehashed(server, client, create_user, login,
+                                pinned_rounds):
+    with server.webapp.app_context():
+        password_hash = get_crypt_handler("bcrypt").using(rounds=4).hash(
+            prepare_password("rehash-password")
+        )
+    create_user("rehashuser", "rehash.user@example.org", "rehash-password")
+    with server.webapp.app_context():
+        user = server.user_datastore.find_user(username="rehashuser")
+        user.password = password_hash
+        server.db.session.commit()
+
+    # a failed login leaves the hash as is
+    response = login("rehashuser", "wrong-password")
+    assert response.status_code == 200
+    assert stored_password(server, "rehashuser") == password_hash
+
+    response = login("rehashuser", "rehash-password")
+    assert response.status_code == 302
+    new_hash = stored_password(server, "rehashuser")
+    assert new_hash.startswith(f"$2b${pinned_rounds:02d}$")
+
+    # and the new hash is kept
+    client.get("/logout")
+    response = login("rehashuser", "rehash-password")
+    assert response.status_code == 302
+    assert stored_password(server, "rehashuser") == new_hash
+
+
+def test_calibrate_login(server, webapp, pinned_rounds):
+    runner = webapp.test_cli_runner()
+    result = runner.invoke(args=[
+        "passwords", "calibrate", "--login",
+        "--target-ms", "50", "--samples", "2",
+    ])
+    assert result.exit_code == 0, result.output
+    assert "POST /login time per setting" in result.output
+    assert "PASSWORD_HASH_OPTIONS = {\"rounds\": " in result.output
+
+    # the temporary user is removed
+    with webapp.app_context():
+        user_model = server.user_datastore.user_model
+        query = user_model.query.filter(
+            user_model.username.startswith("calibrate")
+        )
+        assert query.count() == 0
+
+
+###############################################################################
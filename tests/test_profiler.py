@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Enabling and disabling the profiler from the admin page
+"""
+
+###############################################################################
+
+import os
+import json
+
+import pytest
+
+###############################################################################
+
+
+@pytest.fixture
+def profiler(server):
+    profiler = server.profiler
+    enabled, sample_rate = profiler.enabled, profiler.sample_rate
+    yield profiler
+    profiler.configure(enabled, sample_rate)
+
+
+@pytest.fixture
+def owner(server, client, login):
+    admin = server.app.admin
+    response = login(admin["username"], admin["password"])
+    assert response.status_code == 302
+    return client
+
+
+def toggle(client, **form):
+    return client.post(
+        "/action",
+        data={"action": "profiler_toggle", "sample_rate": "10", **form},
+        headers={"Referer": "/admin"},
+    )
+
+
+def test_enable_disable(owner, profiler):
+    toggle(owner, enabled="1")
+    assert profiler.enabled
+    assert profiler.sample_rate == pytest.approx(0.1)
+
+    # submitted again (e.g., a page rendered before the first submission)
+    toggle(owner, enabled="1")
+    assert profiler.enabled
+
+    toggle(owner, enabled="0")
+    assert not profiler.enabled
+
+
+def test_toggle_changed_elsewhere(owner, profiler):
+    profiler.configure(False)
+    profiler.check(force=True)
+
+    # enabled by another process
+    mtime = os.stat(profiler.state_file).st_mtime_ns
+    with open(profiler.state_file, "w", encoding="utf-8") as f:
+        json.dump({"enabled": True, "sample_rate": 0.5}, f)
+    os.utime(profiler.state_file, ns=(mtime + 10**9, mtime + 10**9))
+
+    toggle(owner)
+    assert not profiler.enabled
+
+
+###############################################################################
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PythonAnywhere API client against a local HTTP server
+"""
+
+###############################################################################
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from urllib3.util.retry import RequestHistory
+
+from pythonanywhere import PythonAnywhereClient, PythonAnywhereError
+
+###############################################################################
+
+ACTIONS = {"info": "/", "reload": "/reload/"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers with the queued (status, headers) first, then with 200"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self):
+        server = self.server
+        server.requests.append((self.command, self.path))
+        server.ports.add(self.client_address[1])
+        if server.responses:
+            status, headers = server.responses.pop(0)
+        else:
+            status, headers = 200, {}
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = reply
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    server.ports = set()
+    server.responses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub):
+    return PythonAnywhereClient(
+        f"http://127.0.0.1:{stub.server_port}/api/v0/user/u/webapps/app/",
+        {"Authorization": "Token test"},
+        ACTIONS,
+        connect_timeout=1,
+        read_timeout=2,
+        retries=3,
+        backoff=0.01,
+        max_wait=0.2,
+        cache_ttl=60,
+    )
+
+
+###############################################################################
+
+
+def test_pooling(stub, client):
+    for _ in range(5):
+        client.request("GET", "info")
+    assert len(stub.requests) == 5
+    # a single kept-alive connection
+    assert len(stub.ports) == 1
+
+
+def test_cache(stub, client):
+    assert client.info() == {"path": "/api/v0/user/u/webapps/app/"}
+    client.info()
+    assert len(stub.requests) == 1
+    assert client.counters["cached"] == 1
+
+    # a reload clears the cache
+    client.reload()
+    client.info()
+    assert stub.requests[1:] == [
+        ("POST", "/api/v0/user/u/webapps/app/reload/"),
+        ("GET", "/api/v0/user/u/webapps/app/"),
+    ]
+
+
+def test_get_retried(stub, client):
+    stub.responses = [(503, {}), (502, {}), (429, {})]
+    client.info()
+    assert len(stub.requests) == 4
+    assert client.counters["retries"] == 3
+    assert client.counters["success"] == 1
+
+
+def test_get_retries_exhausted(stub, client):
+    stub.responses = [(503, {})] * 4
+    with pytest.raises(PythonAnywhereError) as e:
+        client.info()
+    assert e.value.status_code == 503
+    assert len(stub.requests) == 4
+
+
+def test_reload_not_retried_on_server_error(stub, client):
+    stub.responses = [(500, {})]
+    with pytest.raises(PythonAnywhereError) as e:
+        client.reload()
+    assert e.value.status_code == 500
+    assert len(stub.requests) == 1
+
+
+def test_reload_retried_when_rate_limited(stub, client):
+    stub.responses = [(429, {"Retry-After": "0"})]
+    client.reload()
+    assert [method for method, _ in stub.requests] == ["POST", "POST"]
+
+
+def test_backoff_capped(client):
+    retry = client.session.get_adapter("http://").max_retries
+    # as after several failures
+    error = RequestHistory("GET", "/", None, 503, None)
+    retry = retry.new(history=(error,) * 20)
+    assert retry.max_wait == 0.2
+    assert retry.get_backoff_time() == 0.2
+
+
+def test_retry_after_capped(stub, client):
+    stub.responses = [(429, {"Retry-After": "3600"})]
+    start_time = time.monotonic()
+    client.info()
+    assert time.monotonic() - start_time < 2
+    assert len(stub.requests) == 2
+
+
+###############################################################################
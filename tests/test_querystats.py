@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query statistics: Server-Timing header and request log are opt-in
+"""
+
+###############################################################################
+
+import logging
+
+import pytest
+
+###############################################################################
+
+
+@pytest.fixture
+def query_stats(webapp):
+    query_stats = webapp.extensions.get("query_stats")
+    if query_stats is None:
+        pytest.skip("query statistics are disabled")
+    return query_stats
+
+
+def test_defaults(client, login, create_user, query_stats, caplog):
+    create_user("statsuser", "stats.user@example.org", "stats-password")
+    login("statsuser", "stats-password")
+
+    with caplog.at_level(logging.INFO, logger="querystats"):
+        response = client.get("/settings")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert not [r for r in caplog.records if r.name == "querystats"]
+
+
+def test_server_timing(client, query_stats, monkeypatch):
+    monkeypatch.setattr(query_stats, "server_timing", True)
+    response = client.get("/login")
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert "app;dur=" in response.headers["Server-Timing"]
+
+
+###############################################################################
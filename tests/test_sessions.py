@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server-side sessions: lifetime of anonymous and logged-in sessions
+"""
+
+###############################################################################
+
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from sessions import SQLAlchemySessionStore, session_key
+
+###############################################################################
+
+
+@pytest.fixture
+def server_sessions(webapp):
+    server_sessions = webapp.extensions.get("server_sessions")
+    if server_sessions is None:
+        pytest.skip("server-side sessions are disabled")
+    return server_sessions
+
+
+def stored_session(webapp, server_sessions, client):
+    name = webapp.config["SESSION_COOKIE_NAME"]
+    cookie = next(
+        cookie.value for cookie in client.cookie_jar if cookie.name == name
+    )
+    sid, _, _ = cookie.partition(".")
+    return sid, server_sessions.store.load(session_key(sid))
+
+
+def test_anonymous_lifetime(webapp, server_sessions, client):
+    # the login form has a CSRF token, kept in the session
+    webapp.config["WTF_CSRF_ENABLED"] = True
+    try:
+        response = client.get("/login")
+    finally:
+        webapp.config["WTF_CSRF_ENABLED"] = False
+    assert response.status_code == 200
+
+    _, stored = stored_session(webapp, server_sessions, client)
+    assert stored is not None
+    assert stored.expires <= time.time() + server_sessions.anonymous_lifetime
+
+
+def test_login_lifetime(webapp, server_sessions, client, login, create_user):
+    create_user("sessionuser", "session.user@example.org", "session-pass")
+    client.get("/login")
+    with client.session_transaction() as session:
+        session["visited"] = True
+    anonymous_sid, _ = stored_session(webapp, server_sessions, client)
+
+    start_time = time.time()
+    response = login("sessionuser", "session-pass")
+    assert response.status_code == 302
+
+    sid, stored = stored_session(webapp, server_sessions, client)
+    assert sid != anonymous_sid
+    lifetime = webapp.permanent_session_lifetime.total_seconds()
+    assert stored.expires >= start_time + lifetime
+
+
+def test_missing_table():
+    """Sessions are loaded before `init_database` creates the table"""
+    store = SQLAlchemySessionStore(None)
+    store.engine = create_engine("sqlite://")
+    assert store.load(session_key("sid")) is None
+
+
+###############################################################################
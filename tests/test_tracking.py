@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Write-behind login tracking: merging pending logins, failed writes
+"""
+
+###############################################################################
+
+import datetime
+
+import pytest
+from flask import Flask
+
+from tracking import LoginTracker, PendingLogin, merge
+
+###############################################################################
+
+T1 = datetime.datetime(2026, 1, 1, 10, 0)
+T2 = datetime.datetime(2026, 1, 1, 11, 0)
+T3 = datetime.datetime(2026, 1, 1, 12, 0)
+
+
+def login(at, ip):
+    return PendingLogin(1, at, ip, None, None)
+
+
+def test_merge():
+    merged = merge(login(T1, "10.0.0.1"), login(T2, "10.0.0.2"))
+    assert merged == PendingLogin(2, T2, "10.0.0.2", T1, "10.0.0.1")
+
+    merged = merge(merged, login(T3, "10.0.0.3"))
+    assert merged == PendingLogin(3, T3, "10.0.0.3", T2, "10.0.0.2")
+
+
+def test_merge_multiple():
+    earlier = merge(login(T1, "10.0.0.1"), login(T2, "10.0.0.2"))
+    later = merge(login(T3, "10.0.0.3"), login(T3, "10.0.0.4"))
+    merged = merge(earlier, later)
+    # counts add up, the latest login and the one before it are kept
+    assert merged == PendingLogin(4, T3, "10.0.0.4", T3, "10.0.0.3")
+
+
+def test_merge_none():
+    pending = login(T1, "10.0.0.1")
+    assert merge(None, pending) is pending
+    assert merge(pending, None) is pending
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = LoginTracker()
+    tracker.app = Flask(__name__)
+    # no background thread
+    monkeypatch.setattr(tracker, "start", lambda: None)
+    return tracker
+
+
+def test_failed_write_keeps_logins(tracker, monkeypatch):
+    def write(batch):
+        # a login arrives while the batch is being written
+        tracker.record(2, T3, "10.0.0.3")
+        raise RuntimeError("database is locked")
+
+    tracker.record(1, T1, "10.0.0.1")
+    tracker.record(1, T2, "10.0.0.2")
+    tracker.record(2, T1, "10.0.0.1")
+    monkeypatch.setattr(tracker, "write", write)
+    with pytest.raises(RuntimeError):
+        tracker.flush()
+
+    assert tracker.pending == {
+        1: PendingLogin(2, T2, "10.0.0.2", T1, "10.0.0.1"),
+        2: PendingLogin(2, T3, "10.0.0.3", T1, "10.0.0.1"),
+    }
+
+    written = []
+    monkeypatch.setattr(tracker, "write", written.append)
+    assert tracker.flush() == 2
+    assert written == [
+        {
+            1: PendingLogin(2, T2, "10.0.0.2", T1, "10.0.0.1"),
+            2: PendingLogin(2, T3, "10.0.0.3", T1, "10.0.0.1"),
+        }
+    ]
+    assert not tracker.pending
+
+
+###############################################################################
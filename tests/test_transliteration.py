@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transliteration: output of `Sanscript.t()` and the API
+
+`data/transliteration.json` is recorded from `static/plugins/js/sanscript.js`
+by `data/transliteration.js` (run it again when either changes).
+"""
+
+###############################################################################
+
+import os
+import json
+from collections import defaultdict
+
+import pytest
+
+from transliteration import Transliterator
+
+###############################################################################
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEME_DIR = os.path.join(ROOT, "static", "plugins", "js", "schemes")
+CASES_FILE = os.path.join(ROOT, "tests", "data", "transliteration.json")
+
+###############################################################################
+
+
+@pytest.fixture(scope="module")
+def transliterator():
+    return Transliterator(SCHEME_DIR)
+
+
+@pytest.fixture(scope="module")
+def cases():
+    with open(CASES_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def member(client, login, create_user):
+    create_user("scriptuser", "script.user@example.org", "script-password")
+    response = login("scriptuser", "script-password")
+    assert response.status_code == 302
+    return client
+
+
+def post(client, payload):
+    return client.post("/api/transliterate", json=payload)
+
+
+###############################################################################
+
+
+def test_matches_sanscript(transliterator, cases):
+    mismatches = [
+        (text, from_name, to_name, options, expected, result)
+        for text, from_name, to_name, options, expected in cases
+        for result in [
+            transliterator.transliterate(text, from_name, to_name, **options)
+        ]
+        if result != expected
+    ]
+    assert not mismatches[:10]
+
+
+def test_batch(transliterator, cases):
+    batches = defaultdict(list)
+    for text, from_name, to_name, options, expected in cases:
+        key = from_name, to_name, tuple(sorted(options.items()))
+        batches[key].append((text, expected))
+
+    transliterator.transliterate.cache_clear()
+    for (from_name, to_name, options), items in batches.items():
+        texts, expected = zip(*items)
+        result = transliterator.transliterate_batch(
+            list(texts), from_name, to_name, **dict(options)
+        )
+        assert result == list(expected)
+
+
+def test_unknown_scheme(transliterator):
+    with pytest.raises(KeyError):
+        transliterator.transliterate("rAma", "hk", "klingon")
+
+
+def test_api(member):
+    response = post(member, {
+        "texts": ["rAma", "<b>kRSNa</b>"],
+        "from": "hk",
+        "to": "iast",
+        "options": {"skip_sgml": True},
+    })
+    assert response.status_code == 200
+    assert response.get_json()["texts"] == ["rāma", "<b>kṛṣṇa</b>"]
+
+
+@pytest.mark.parametrize("payload", [
+    ["rAma"],
+    "rAma",
+    {"texts": "rAma", "from": "hk", "to": "iast"},
+    {"texts": ["rAma"], "from": "hk", "to": "klingon"},
+    {"texts": ["rAma"], "from": "hk", "to": "iast", "options": "x"},
+    {"texts": ["rAma"], "from": "hk", "to": "iast", "options": ["x"]},
+])
+def test_api_invalid(member, payload):
+    response = post(member, payload)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_api_login_required(client):
+    response = post(client, {"texts": ["rAma"], "from": "hk", "to": "iast"})
+    assert response.status_code in [302, 401]
+
+
+###############################################################################
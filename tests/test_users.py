@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk user import: duplicates within and across chunks, existing users
+"""
+
+###############################################################################
+
+import users
+
+###############################################################################
+
+
+def write_csv(path, rows):
+    lines = ["username,email,password,roles"]
+    lines.extend(",".join(row) for row in rows)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def import_users(webapp, filename, *args):
+    runner = webapp.test_cli_runner()
+    result = runner.invoke(args=[
+        "users", "import", filename, "--workers", "1", *args
+    ])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def find_user(server, username):
+    with server.webapp.app_context():
+        user = server.user_datastore.find_user(username=username)
+        if user is not None:
+            return user.email, sorted(role.name for role in user.roles)
+
+
+###############################################################################
+
+
+def test_import(server, webapp, tmp_path):
+    filename = write_csv(tmp_path / "users.csv", [
+        ("importone", "import.one@example.org", "password1", ""),
+        ("importone", "import.two@example.org", "password2", ""),
+        ("importtwo", "import.two@example.org", "password3", "member;admin"),
+        ("importthree", "import.one@example.org", "password4", ""),
+        ("importfour", "import.four@example.org", "password5", "nosuchrole"),
+    ])
+    output = import_users(webapp, filename, "--chunk-size", "3")
+    assert "Imported 2 users (3 skipped)" in output
+    # within a chunk
+    assert "importone: duplicate in input" in output
+    # across chunks, found in the database
+    assert "importthree: already exists" in output
+    assert "importfour: unknown roles nosuchrole" in output
+
+    assert find_user(server, "importone") == (
+        "import.one@example.org", ["member"]
+    )
+    assert find_user(server, "importtwo") == (
+        "import.two@example.org", ["admin", "member"]
+    )
+    assert find_user(server, "importthree") is None
+
+    # imported again
+    output = import_users(webapp, filename)
+    assert "Imported 0 users (5 skipped)" in output
+
+
+def test_import_conflict(server, webapp, create_user, tmp_path, monkeypatch):
+    """A chunk failing on a unique constraint is inserted row by row"""
+    create_user("importtaken", "import.taken@example.org", "password")
+    # as if the user were created after the chunk was checked
+    monkeypatch.setattr(users, "find_existing", lambda records: set())
+
+    filename = write_csv(tmp_path / "users.csv", [
+        ("importfive", "import.five@example.org", "password1", ""),
+        ("importtaken", "import.six@example.org", "password2", ""),
+        ("importseven", "import.taken@example.org", "password3", ""),
+    ])
+    output = import_users(webapp, filename)
+    assert "Imported 1 users (2 skipped)" in output
+    assert "importtaken: already exists" in output
+    assert "importseven: already exists" in output
+
+    assert find_user(server, "importfive") == (
+        "import.five@example.org", ["member"]
+    )
+    assert find_user(server, "importseven") is None
+
+
+###############################################################################
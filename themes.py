@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Theme Registry
+
+Bootswatch themes live as `static/themes/css/bootstrap.<theme>.min.css`,
+with an optional `static/themes/js/bootstrap.<theme>.min.js` companion.
+The registry scans these directories once and rescans only when the
+modification time of either directory changes (checked at most once every
+`check_interval` seconds), or when `refresh()` is called explicitly.
+"""
+
+###############################################################################
+
+import os
+import time
+import threading
+from collections import namedtuple
+
+###############################################################################
+
+Theme = namedtuple("Theme", ["name", "css", "js"])
+
+DEFAULT_THEME = Theme(
+    name="default", css="bootstrap/css/bootstrap.min.css", js=None
+)
+
+###############################################################################
+
+
+class ThemeRegistry:
+    """Cached mapping of theme names to their static asset paths
+
+    Asset paths are relative to the static directory, i.e. suitable for
+    `url_for('static', filename=...)`.
+    """
+
+    CSS_PATTERN = ("bootstrap.", ".min.css")
+    JS_PATTERN = ("bootstrap.", ".min.js")
+
+    def __init__(self, static_dir, check_interval=5):
+        self.static_dir = static_dir
+        self.css_dir = os.path.join(static_dir, "themes", "css")
+        self.js_dir = os.path.join(static_dir, "themes", "js")
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._last_check = 0
+        self._themes = {}
+        self.names = []
+        self.names_js = []
+        self.refresh()
+
+    # ----------------------------------------------------------------------- #
+
+    @staticmethod
+    def _scan(directory, pattern):
+        prefix, suffix = pattern
+        names = {}
+        try:
+            entries = os.listdir(directory)
+        except FileNotFoundError:
+            return names
+        for filename in entries:
+            if filename.startswith(prefix) and filename.endswith(suffix):
+                name = filename[len(prefix):-len(suffix)]
+                if name and "." not in name:
+                    names[name] = filename
+        return names
+
+    def _directory_mtimes(self):
+        mtimes = []
+        for directory in [self.css_dir, self.js_dir]:
+            try:
+                mtimes.append(os.stat(directory).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    # ----------------------------------------------------------------------- #
+
+    def refresh(self):
+        """Rescan theme directories unconditionally"""
+        with self._lock:
+            mtimes = self._directory_mtimes()
+            css_files = self._scan(self.css_dir, self.CSS_PATTERN)
+            js_files = self._scan(self.js_dir, self.JS_PATTERN)
+
+            themes = {}
+            for name, filename in css_files.items():
+                js_filename = js_files.get(name)
+                themes[name] = Theme(
+                    name=name,
+                    css=f"themes/css/{filename}",
+                    js=f"themes/js/{js_filename}" if js_filename else None,
+                )
+
+            self._themes = themes
+            self.names = sorted(css_files)
+            self.names_js = sorted(js_files)
+            self._mtimes = mtimes
+            self._last_check = time.monotonic()
+        return self.names
+
+    def check(self):
+        """Rescan theme directories if they have been modified"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        if self._directory_mtimes() != self._mtimes:
+            self.refresh()
+            return True
+        return False
+
+    # ----------------------------------------------------------------------- #
+
+    def get(self, name):
+        if name == DEFAULT_THEME.name:
+            return DEFAULT_THEME
+        return self._themes.get(name)
+
+    def css(self, name):
+        theme = self.get(name)
+        return theme.css if theme else DEFAULT_THEME.css
+
+    def js(self, name):
+        theme = self.get(name)
+        return theme.js if theme else None
+
+    def __contains__(self, name):
+        return name == DEFAULT_THEME.name or name in self._themes
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.names})"
+
+
+###############################################################################
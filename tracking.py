@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Login Tracking
+
+Write-behind replacement for `SECURITY_TRACKABLE`. Logins are buffered in
+memory, merged per user, and written in batched UPDATEs by a background
+thread every `interval` seconds, as soon as `max_pending` users have
+pending logins, and at exit.
+
+The resulting `last_login_*`, `current_login_*` and `login_count` values
+are the same as those of tracking each login synchronously.
+"""
+
+###############################################################################
+
+import os
+import atexit
+import logging
+import threading
+from collections import namedtuple
+
+from flask import request
+from flask_security import user_authenticated
+from flask_security.utils import config_value
+from sqlalchemy import bindparam, func
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+# `count` logins, the latest at `at` from `ip`; `previous_*` are those of
+# the login before it (None if count == 1, i.e., taken from the database)
+PendingLogin = namedtuple(
+    "PendingLogin", ["count", "at", "ip", "previous_at", "previous_ip"]
+)
+
+###############################################################################
+
+
+def merge(earlier, later):
+    """Combine pending logins of a user (either may be None)"""
+    if earlier is None:
+        return later
+    if later is None:
+        return earlier
+    if later.count > 1:
+        previous_at, previous_ip = later.previous_at, later.previous_ip
+    else:
+        previous_at, previous_ip = earlier.at, earlier.ip
+    return PendingLogin(
+        earlier.count + later.count,
+        later.at,
+        later.ip,
+        previous_at,
+        previous_ip,
+    )
+
+
+###############################################################################
+
+
+class LoginTracker:
+    """Buffer login tracking updates and flush them in batches"""
+
+    def __init__(self, app=None, db=None, datastore=None, interval=5,
+                 max_pending=100):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.app = None
+        self.db = None
+        self.datastore = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pid = None
+        if app is not None:
+            self.init_app(app, db, datastore)
+
+    def init_app(self, app, db, datastore):
+        self.app = app
+        self.db = db
+        self.datastore = datastore
+        app.extensions["login_tracker"] = self
+        user_authenticated.connect_via(app)(self.on_authenticated)
+        atexit.register(self.flush)
+
+    # ----------------------------------------------------------------------- #
+
+    def on_authenticated(self, sender, user, **extra):
+        self.record(
+            user.id,
+            config_value("DATETIME_FACTORY")(),
+            request.remote_addr or None,
+        )
+
+    def record(self, user_id, at, ip):
+        login = PendingLogin(1, at, ip, None, None)
+        with self.lock:
+            self.pending[user_id] = merge(self.pending.get(user_id), login)
+            full = len(self.pending) >= self.max_pending
+        self.start()
+        if full:
+            self.wakeup.set()
+
+    def start(self):
+        """Start the flush thread (once per process)"""
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.run, name="login-tracker", daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("Failed to write login tracking data.")
+
+    # ----------------------------------------------------------------------- #
+
+    def flush(self):
+        """Write pending logins, return the number of users updated"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            try:
+                with self.app.app_context():
+                    self.write(batch)
+            except Exception:
+                # keep the logins for the next attempt
+                with self.lock:
+                    for user_id, login in batch.items():
+                        self.pending[user_id] = merge(
+                            login, self.pending.get(user_id)
+                        )
+                raise
+            return len(batch)
+
+    def write(self, batch):
+        table = self.datastore.user_model.__table__
+        columns = table.c
+        at_type = columns.current_login_at.type
+        ip_type = columns.current_login_ip.type
+        at = bindparam("b_at", type_=at_type)
+        ip = bindparam("b_ip", type_=ip_type)
+
+        single = []
+        multiple = []
+        for user_id, login in batch.items():
+            params = {
+                "b_id": user_id,
+                "b_count": login.count,
+                "b_at": login.at,
+                "b_ip": login.ip,
+                "b_previous_at": login.previous_at,
+                "b_previous_ip": login.previous_ip,
+            }
+            (single if login.count == 1 else multiple).append(params)
+
+        def update(last_at, last_ip):
+            # last_* are assigned first, as MySQL evaluates assignments in
+            # order (using the updated values of earlier columns)
+            return (
+                table.update()
+                .where(columns.id == bindparam("b_id"))
+                .ordered_values(
+                    (columns.last_login_at, last_at),
+                    (columns.last_login_ip, last_ip),
+                    (columns.current_login_at, at),
+                    (columns.current_login_ip, ip),
+                    (
+                        columns.login_count,
+                        func.coalesce(columns.login_count, 0)
+                        + bindparam("b_count"),
+                    ),
+                )
+            )
+
+        with self.db.engine.begin() as connection:
+            if single:
+                connection.execute(
+                    update(
+                        func.coalesce(columns.current_login_at, at),
+                        columns.current_login_ip,
+                    ),
+                    single,
+                )
+            if multiple:
+                connection.execute(
+                    update(
+                        bindparam("b_previous_at", type_=at_type),
+                        bindparam("b_previous_ip", type_=ip_type),
+                    ),
+                    multiple,
+                )
+
+    def __len__(self):
+        return len(self.pending)
+
+
+###############################################################################
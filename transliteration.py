@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transliteration
+
+Python port of `static/plugins/js/sanscript.js`, using the same scheme
+files under `static/plugins/js/schemes`. Output matches that of
+`Sanscript.t()` for the same input, source and target scheme and options,
+except for input in scripts outside the Basic Multilingual Plane (e.g.
+Brahmi, Sharada), which sanscript.js reads in UTF-16 code units and does
+not transliterate.
+
+Schemes are loaded once. The mapping between a pair of schemes is compiled
+(on first use) into lookup tables, with a trie for longest-match
+tokenization of roman input. Results of `transliterate()` are cached in an
+LRU cache.
+
+```
+$ flask transliteration benchmark --from devanagari --to iast
+```
+
+`benchmark` times `transliterate_batch()` over the sutra texts, with a cold
+and with a warm cache.
+"""
+
+###############################################################################
+
+import os
+import re
+import copy
+import json
+import time
+from functools import lru_cache
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from sutras import SutraIndex
+
+###############################################################################
+
+ROMAN_SCHEMES = [
+    "iast", "itrans", "hk", "kolkata", "slp1", "velthuis", "wx", "cyrillic"
+]
+KOLKATA_VOWELS = [
+    "a", "ā", "i", "ī", "u", "ū", "ṛ", "ṝ", "ḷ", "ḹ",
+    "e", "ē", "ai", "o", "ō", "au",
+]
+ITRANS_DRAVIDIAN_VOWELS = [
+    "a", "A", "i", "I", "u", "U", "Ri", "RRI", "LLi", "LLi",
+    "e", "E", "ai", "o", "O", "au",
+]
+
+MARK_GROUPS = ["vowel_marks", "virama"]
+CONSONANT_GROUPS = ["consonants", "other"]
+
+# Terminal key of trie nodes
+TOKEN = ""
+
+###############################################################################
+
+
+def load_schemes(scheme_dir):
+    """Load scheme files and set up derived schemes, as sanscript.js does"""
+    schemes = {}
+    for kind in sorted(os.listdir(scheme_dir)):
+        kind_dir = os.path.join(scheme_dir, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        for filename in sorted(os.listdir(kind_dir)):
+            name, ext = os.path.splitext(filename)
+            if ext != ".json":
+                continue
+            with open(os.path.join(kind_dir, filename), encoding="utf-8") as f:
+                schemes[name] = json.load(f)
+
+    roman = set()
+
+    def add_roman_scheme(name, scheme):
+        if "vowel_marks" not in scheme:
+            scheme["vowel_marks"] = scheme["vowels"][1:]
+        schemes[name] = scheme
+        roman.add(name)
+
+    kolkata = copy.deepcopy(schemes["iast"])
+    kolkata["vowels"] = list(KOLKATA_VOWELS)
+    schemes["kolkata"] = kolkata
+    for name in ROMAN_SCHEMES:
+        if name in schemes:
+            add_roman_scheme(name, schemes[name])
+
+    itrans_dravidian = copy.deepcopy(schemes["itrans"])
+    itrans_dravidian["vowels"] = list(ITRANS_DRAVIDIAN_VOWELS)
+    itrans_dravidian["vowel_marks"] = itrans_dravidian["vowels"][1:]
+    add_roman_scheme("itrans_dravidian", itrans_dravidian)
+
+    return schemes, frozenset(roman)
+
+
+def build_trie(tokens):
+    trie = {}
+    for token in tokens:
+        node = trie
+        for char in token:
+            node = node.setdefault(char, {})
+        node[TOKEN] = token
+    return trie
+
+
+def longest_match(trie, data, start):
+    """Longest token in `trie` which `data` has at `start` (or None)"""
+    node = trie
+    match = None
+    for i in range(start, len(data)):
+        node = node.get(data[i])
+        if node is None:
+            break
+        match = node.get(TOKEN, match)
+    return match
+
+
+###############################################################################
+
+
+class SchemeMap:
+    """Compiled mapping from one scheme to another (`makeMap()`)"""
+
+    def __init__(self, from_scheme, to_scheme, from_roman, to_roman):
+        alternates = from_scheme.get("alternates", {})
+
+        # `None` marks tokens mapped to nothing, which still count as
+        # consonants and still shadow earlier mappings of the same token
+        self.letters = {}
+        self.marks = {}
+        self.consonants = set()
+
+        for group, from_group in from_scheme.items():
+            to_group = to_scheme.get(group)
+            if to_group is None or isinstance(from_group, dict):
+                continue
+            for i, token in enumerate(from_group):
+                target = to_group[i] if i < len(to_group) else None
+                tokens = [token] + alternates.get(token, [])
+                for alternate in tokens:
+                    if group in MARK_GROUPS:
+                        self.marks[alternate] = target
+                    else:
+                        self.letters[alternate] = target
+                        if group in CONSONANT_GROUPS:
+                            self.consonants.add(alternate)
+
+        self.from_roman = from_roman
+        self.to_roman = to_roman
+        self.virama = ",".join(to_scheme["virama"])
+        self.to_scheme_a = to_scheme["vowels"][0]
+        self.from_scheme_a = from_scheme["vowels"][0]
+        self.max_token_length = max(
+            len(token) for token in list(self.letters) + list(self.marks)
+        )
+        self.trie = build_trie(
+            token for token, target in self.letters.items()
+            if target is not None
+        )
+
+    # ----------------------------------------------------------------------- #
+
+    def transliterate_roman(self, data, skip_sgml=False, syncope=False):
+        buf = []
+        letters = self.letters
+        marks = self.marks
+        consonants = self.consonants
+        virama = self.virama
+
+        had_consonant = False
+        skipping_sgml = False
+        toggled = False
+
+        i = 0
+        length = len(data)
+        while i < length:
+            token = None
+            if not (skipping_sgml or toggled):
+                token = longest_match(self.trie, data, i)
+
+            if (
+                (token is None or len(token) <= 2)
+                and self.max_token_length >= 2
+                and not skipping_sgml
+                and data.startswith("##", i)
+            ):
+                toggled = not toggled
+                i += 2
+                continue
+
+            if token is None:
+                char = data[i]
+                if skipping_sgml:
+                    skipping_sgml = char != ">"
+                elif char == "<":
+                    skipping_sgml = skip_sgml
+                if not (skipping_sgml or toggled):
+                    if letters.get(char) is not None:
+                        token = char
+
+            if token is not None:
+                letter = letters[token]
+                if self.to_roman:
+                    buf.append(letter)
+                else:
+                    if had_consonant:
+                        mark = marks.get(token)
+                        if mark:
+                            buf.append(mark)
+                        elif token != self.from_scheme_a:
+                            buf.append(virama)
+                            buf.append(letter)
+                    else:
+                        buf.append(letter)
+                    had_consonant = token in consonants
+                i += len(token)
+            else:
+                if had_consonant:
+                    had_consonant = False
+                    if not syncope:
+                        buf.append(virama)
+                buf.append(data[i])
+                i += 1
+
+        if had_consonant and not syncope:
+            buf.append(virama)
+        return "".join(buf)
+
+    def transliterate_brahmic(self, data):
+        buf = []
+        letters = self.letters
+        marks = self.marks
+        consonants = self.consonants
+
+        dangling_hash = False
+        had_roman_consonant = False
+        skipping = False
+
+        for char in data:
+            if char == "#":
+                if dangling_hash:
+                    skipping = not skipping
+                    dangling_hash = False
+                else:
+                    dangling_hash = True
+                if had_roman_consonant:
+                    buf.append(self.to_scheme_a)
+                    had_roman_consonant = False
+                continue
+            elif skipping:
+                buf.append(char)
+                continue
+
+            mark = marks.get(char)
+            if mark is not None:
+                buf.append(mark)
+                had_roman_consonant = False
+            else:
+                if dangling_hash:
+                    buf.append("#")
+                    dangling_hash = False
+                if had_roman_consonant:
+                    buf.append(self.to_scheme_a)
+                    had_roman_consonant = False
+
+                letter = letters.get(char)
+                if letter:
+                    buf.append(letter)
+                    had_roman_consonant = self.to_roman and char in consonants
+                else:
+                    buf.append(char)
+
+        if had_roman_consonant:
+            buf.append(self.to_scheme_a)
+        return "".join(buf)
+
+
+###############################################################################
+
+
+class Transliterator:
+    """Transliterate text between Sanscript schemes"""
+
+    def __init__(self, scheme_dir, cache_size=4096):
+        self.scheme_dir = scheme_dir
+        self.schemes, self.roman_schemes = load_schemes(scheme_dir)
+        self.get_map = lru_cache(maxsize=None)(self._make_map)
+        self.transliterate = lru_cache(maxsize=cache_size)(
+            self._transliterate
+        )
+
+    def _make_map(self, from_name, to_name):
+        return SchemeMap(
+            self.schemes[from_name],
+            self.schemes[to_name],
+            from_name in self.roman_schemes,
+            to_name in self.roman_schemes,
+        )
+
+    def _superscript_pattern(self, marks_first):
+        scheme = self.schemes["tamil_superscripted"]
+        marks = "".join(scheme["vowel_marks"]) + ",".join(scheme["virama"])
+        marks = f"([{re.escape(marks + '॒॑')}]+)"
+        digits = "([²³⁴])"
+        return marks + digits if marks_first else digits + marks
+
+    def _transliterate(self, data, from_name, to_name, skip_sgml=False,
+                       syncope=False):
+        if from_name not in self.schemes:
+            raise KeyError(f"Unknown scheme '{from_name}'")
+        if to_name not in self.schemes:
+            raise KeyError(f"Unknown scheme '{to_name}'")
+
+        scheme_map = self.get_map(from_name, to_name)
+
+        if from_name == "itrans":
+            data = data.replace("{\\m+}", ".h.N")
+            data = data.replace(".h", "")
+            data = re.sub(r"\\([^'`_]|$)", r"##\1##", data)
+        if from_name == "tamil_superscripted":
+            data = re.sub(self._superscript_pattern(True), r"\2\1", data)
+
+        if scheme_map.from_roman:
+            result = scheme_map.transliterate_roman(
+                data, skip_sgml=skip_sgml, syncope=syncope
+            )
+        else:
+            result = scheme_map.transliterate_brahmic(data)
+
+        if to_name == "tamil_superscripted":
+            result = re.sub(self._superscript_pattern(False), r"\2\1", result)
+        return result
+
+    def transliterate_batch(self, texts, from_name, to_name, **options):
+        return [
+            self.transliterate(text, from_name, to_name, **options)
+            for text in texts
+        ]
+
+    @property
+    def scheme_names(self):
+        return sorted(self.schemes)
+
+
+###############################################################################
+# Command Line Interface
+
+transliteration_cli = AppGroup("transliteration", help="Transliteration.")
+
+
+@transliteration_cli.command("benchmark")
+@click.option("--from", "from_name", default="devanagari", show_default=True)
+@click.option("--to", "to_name", default="iast", show_default=True)
+@click.option("--batch-size", type=int, default=100, show_default=True)
+@click.option("--syncope", is_flag=True, help="Transliterate with syncope.")
+@with_appcontext
+def benchmark(from_name, to_name, batch_size, syncope):
+    """Time batch transliteration of the sutra texts."""
+    static_dir = current_app.static_folder
+    transliterator = Transliterator(
+        os.path.join(static_dir, "plugins", "js", "schemes")
+    )
+    for name in [from_name, to_name]:
+        if name not in transliterator.schemes:
+            raise click.ClickException(f"Unknown scheme '{name}'.")
+
+    sutras = SutraIndex(os.path.join(static_dir, "data", "index.js")).sutras
+    texts = list(sutras.values())
+    if from_name != "devanagari":
+        texts = transliterator.transliterate_batch(
+            texts, "devanagari", from_name
+        )
+    transliterator.transliterate.cache_clear()
+    batches = [
+        texts[i:i + batch_size] for i in range(0, len(texts), batch_size)
+    ]
+
+    click.echo(
+        f"{from_name} -> {to_name}: {len(texts)} texts, "
+        f"{len(batches)} batches of up to {batch_size}"
+    )
+    click.echo(f"{'cache':>8} {'texts/s':>10} {'ms/batch':>10}")
+    for label in ["cold", "warm"]:
+        start_time = time.perf_counter()
+        for batch in batches:
+            transliterator.transliterate_batch(
+                batch, from_name, to_name, syncope=syncope
+            )
+        elapsed = time.perf_counter() - start_time
+        click.echo(
+            f"{label:>8} {len(texts) / elapsed:>10.0f} "
+            f"{elapsed * 1000 / len(batches):>10.2f}"
+        )
+
+
+###############################################################################
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk User Import / Export
+
+```
+$ flask users import users.csv
+$ flask users export users.jsonl
+```
+
+Files are CSV (with a header row) or JSON lines, chosen by extension or
+`--format`. Imported records have `username`, `email`, `password` and,
+optionally, `roles` (a list, or names separated by `;`). Exported records
+have `id`, `username`, `email`, `active`, `confirmed_at` and `roles`.
+
+Both commands stream records in chunks, so memory use does not depend on
+the number of users. Each chunk is inserted before the next one is checked
+against existing users; duplicates within a chunk are checked in memory,
+and the unique constraints catch the rest (a chunk failing on them is
+inserted row by row). Passwords are hashed in a process pool while the
+next chunk is being read.
+"""
+
+###############################################################################
+
+import csv
+import json
+import time
+import os
+import uuid
+import multiprocessing
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from flask_security.proxies import _security
+from flask_security.utils import get_hmac, use_double_hash, config_value
+from passlib.context import CryptContext
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from models_sqla import db, user_datastore, RolesUsers, DEFAULT_SETTING
+
+###############################################################################
+
+CHUNK_SIZE = 1000
+FORMATS = ["csv", "jsonl"]
+EXPORT_FIELDS = ["id", "username", "email", "active", "confirmed_at", "roles"]
+
+###############################################################################
+# Password Hashing (worker processes)
+
+_worker_context = None
+_worker_options = None
+
+
+def _init_hash_worker(context_string, options):
+    global _worker_context, _worker_options
+    _worker_context = CryptContext.from_string(context_string)
+    _worker_options = options
+
+
+def _hash_passwords(passwords):
+    return [
+        _worker_context.hash(password, **_worker_options)
+        for password in passwords
+    ]
+
+
+def prepare_password(password):
+    """Apply the HMAC step of `hash_password()` (requires app context)"""
+    if use_double_hash():
+        return get_hmac(password).decode("ascii")
+    return password
+
+
+###############################################################################
+# Readers / Writers
+
+
+def detect_format(filename, file_format=None):
+    if file_format:
+        return file_format
+    if filename.endswith((".jsonl", ".json", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def read_records(f, file_format):
+    if file_format == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunked(iterable, size=CHUNK_SIZE):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_roles(roles, default_role):
+    if roles is None or roles == "":
+        return [default_role] if default_role else []
+    if isinstance(roles, str):
+        roles = roles.split(";")
+    return [role.strip() for role in roles if role.strip()]
+
+
+###############################################################################
+# Import
+
+
+def validate_chunk(records, existing, default_role, role_ids):
+    """Split a chunk of records into valid users and error messages"""
+    users = []
+    errors = []
+    seen = set()
+    for record in records:
+        username = (record.get("username") or "").strip()
+        email = (record.get("email") or "").strip()
+        password = record.get("password") or ""
+        if not username or not email or not password:
+            errors.append(f"{username or '?'}: missing required fields")
+            continue
+        if username in existing or email in existing:
+            errors.append(f"{username}: already exists")
+            continue
+        if username in seen or email in seen:
+            errors.append(f"{username}: duplicate in input")
+            continue
+        roles = parse_roles(record.get("roles"), default_role)
+        unknown = [role for role in roles if role not in role_ids]
+        if unknown:
+            errors.append(f"{username}: unknown roles {', '.join(unknown)}")
+            continue
+        seen.update([username, email])
+        users.append((username, email, password, roles))
+    return users, errors
+
+
+def find_existing(records):
+    user_model = user_datastore.user_model
+    usernames = [record.get("username") for record in records]
+    emails = [record.get("email") for record in records]
+    rows = db.session.query(user_model.username, user_model.email).filter(
+        or_(
+            user_model.username.in_(usernames), user_model.email.in_(emails)
+        )
+    )
+    return {value for row in rows for value in row}
+
+
+def insert_users(users, hashes, role_ids):
+    """Insert users with their roles, return the number inserted and errors
+
+    A chunk failing on a unique constraint (e.g., a user created meanwhile)
+    is inserted again row by row, skipping the conflicting rows.
+    """
+    rows = list(zip(users, hashes))
+    try:
+        insert_rows(rows, role_ids)
+        db.session.commit()
+        return len(rows), []
+    except IntegrityError:
+        db.session.rollback()
+
+    errors = []
+    for row in rows:
+        try:
+            insert_rows([row], role_ids)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            errors.append(f"{row[0][0]}: already exists")
+    return len(rows) - len(errors), errors
+
+
+def insert_rows(rows, role_ids):
+    user_model = user_datastore.user_model
+    user_table = user_model.__table__
+    db.session.execute(
+        user_table.insert(),
+        [
+            {
+                "username": username,
+                "email": email,
+                "password": password_hash,
+                "active": True,
+                "fs_uniquifier": uuid.uuid4().hex,
+                "settings": dict(DEFAULT_SETTING),
+            }
+            for (username, email, _, _), password_hash in rows
+        ],
+    )
+    user_ids = dict(
+        db.session.query(user_model.username, user_model.id).filter(
+            user_model.username.in_([user[0] for user, _ in rows])
+        )
+    )
+    roles_users = [
+        {"user_id": user_ids[username], "role_id": role_ids[role]}
+        for (username, _, _, roles), _ in rows
+        for role in roles
+    ]
+    if roles_users:
+        db.session.execute(RolesUsers.__table__.insert(), roles_users)
+
+
+###############################################################################
+# Command Line Interface
+
+users_cli = AppGroup("users", help="Bulk user management.")
+
+
+@users_cli.command("import")
+@click.argument("input_file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "file_format", type=click.Choice(FORMATS))
+@click.option(
+    "--default-role", default="member", show_default=True,
+    help="Role assigned to users without roles.",
+)
+@click.option(
+    "--workers", type=int, default=None,
+    help="Password hashing processes (default: CPU count).",
+)
+@click.option("--chunk-size", type=int, default=CHUNK_SIZE, show_default=True)
+@with_appcontext
+def import_users(input_file, file_format, default_role, workers, chunk_size):
+    """Import users from a CSV or JSON lines file."""
+    file_format = detect_format(input_file.name, file_format)
+    role_model = user_datastore.role_model
+    role_ids = dict(db.session.query(role_model.name, role_model.id))
+
+    pwd_context = _security.pwd_context
+    hash_options = config_value("PASSWORD_HASH_OPTIONS", default={}).get(
+        config_value("PASSWORD_HASH"), {}
+    )
+
+    imported = 0
+    skipped = 0
+    start_time = time.perf_counter()
+
+    workers = workers or os.cpu_count() or 1
+    pool = multiprocessing.Pool(
+        processes=workers,
+        initializer=_init_hash_worker,
+        initargs=(pwd_context.to_string(), hash_options),
+    )
+    try:
+        pending = None
+        records = read_records(input_file, file_format)
+        for chunk in chunked(records, chunk_size):
+            # the previous chunk is inserted first, to be found as existing
+            if pending is not None:
+                inserted, failed = finish_chunk(*pending, role_ids, start_time)
+                imported += inserted
+                skipped += failed
+                pending = None
+
+            users, errors = validate_chunk(
+                chunk, find_existing(chunk), default_role, role_ids
+            )
+            for error in errors:
+                click.echo(error, err=True)
+            skipped += len(errors)
+
+            passwords = [prepare_password(user[2]) for user in users]
+            batch_size = max(1, len(passwords) // (4 * workers))
+            result = pool.map_async(
+                _hash_passwords,
+                [
+                    passwords[i:i + batch_size]
+                    for i in range(0, len(passwords), batch_size)
+                ],
+            )
+            # the next chunk is read while this one is being hashed
+            pending = (users, result)
+
+        if pending is not None:
+            inserted, failed = finish_chunk(*pending, role_ids, start_time)
+            imported += inserted
+            skipped += failed
+    finally:
+        pool.close()
+        pool.join()
+
+    elapsed = time.perf_counter() - start_time
+    rate = imported / elapsed if elapsed else 0
+    click.echo(
+        f"Imported {imported} users ({skipped} skipped) "
+        f"in {elapsed:.1f}s ({rate:.1f} users/s)"
+    )
+
+
+def finish_chunk(users, result, role_ids, start_time):
+    """Insert a hashed chunk, return the number of users inserted and failed"""
+    if not users:
+        return 0, 0
+    hashes = [
+        password_hash
+        for batch in result.get()
+        for password_hash in batch
+    ]
+    inserted, errors = insert_users(users, hashes, role_ids)
+    for error in errors:
+        click.echo(error, err=True)
+    click.echo(
+        f"... {inserted} users inserted "
+        f"({time.perf_counter() - start_time:.1f}s)",
+        err=True,
+    )
+    return inserted, len(errors)
+
+
+# --------------------------------------------------------------------------- #
+# Export
+
+
+def iter_export_records(chunk_size=CHUNK_SIZE):
+    user_model = user_datastore.user_model
+    role_model = user_datastore.role_model
+    query = (
+        db.session.query(
+            user_model.id,
+            user_model.username,
+            user_model.email,
+            user_model.active,
+            user_model.confirmed_at,
+        )
+        .order_by(user_model.id)
+        .execution_options(stream_results=True)
+        .yield_per(chunk_size)
+    )
+    for chunk in chunked(query, chunk_size):
+        user_ids = [row.id for row in chunk]
+        roles = {}
+        role_rows = (
+            db.session.query(RolesUsers.user_id, role_model.name)
+            .join(role_model, role_model.id == RolesUsers.role_id)
+            .filter(RolesUsers.user_id.in_(user_ids))
+        )
+        for user_id, role_name in role_rows:
+            roles.setdefault(user_id, []).append(role_name)
+
+        for row in chunk:
+            yield {
+                "id": row.id,
+                "username": row.username,
+                "email": row.email,
+                "active": row.active,
+                "confirmed_at": (
+                    row.confirmed_at.isoformat() if row.confirmed_at else None
+                ),
+                "roles": sorted(roles.get(row.id, [])),
+            }
+
+
+@users_cli.command("export")
+@click.argument("output_file", type=click.File("w", encoding="utf-8"))
+@click.option("--format", "file_format", type=click.Choice(FORMATS))
+@click.option("--chunk-size", type=int, default=CHUNK_SIZE, show_default=True)
+@with_appcontext
+def export_users(output_file, file_format, chunk_size):
+    """Export users to a CSV or JSON lines file."""
+    file_format = detect_format(output_file.name, file_format)
+    if file_format == "csv":
+        writer = csv.DictWriter(output_file, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    exported = 0
+    start_time = time.perf_counter()
+    for record in iter_export_records(chunk_size):
+        if file_format == "csv":
+            record["roles"] = ";".join(record["roles"])
+            writer.writerow(record)
+        else:
+            output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        exported += 1
+
+    elapsed = time.perf_counter() - start_time
+    rate = exported / elapsed if elapsed else 0
+    click.echo(
+        f"Exported {exported} users in {elapsed:.1f}s ({rate:.1f} users/s)",
+        err=True,
+    )
+
+
+###############################################################################